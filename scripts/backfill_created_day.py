@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Backfill de atributos de índice para incidentes creados antes de los índices
+``createdDay-index``, ``updatedDay-index`` y ``assignedTo-status-index``:
+
+- agrega ``createdDay`` (y normaliza ``createdAt`` a epoch numérico)
+- agrega ``updatedDay`` (y normaliza ``updatedAt`` a epoch numérico)
+- elimina ``assignedTo`` cuando es NULL (DynamoDB rechaza claves de índice NULL)
+
+Requisitos:
+- Credenciales AWS configuradas
+- Exportar INCIDENTS_TABLE, por ejemplo:
+    export INCIDENTS_TABLE=alertautec-auth-incidents-dev
+
+Uso:
+    python scripts/backfill_created_day.py
+"""
+
+import os
+import sys
+
+import boto3
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.common.dynamodb import day_bucket  # noqa: E402
+from src.common.frame import to_epoch  # noqa: E402
+
+
+def main() -> int:
+    table = boto3.resource("dynamodb").Table(os.environ["INCIDENTS_TABLE"])
+    kwargs = {
+        "ProjectionExpression": "incidentId, createdAt, createdDay, updatedAt, updatedDay, assignedTo",
+    }
+    updated = 0
+    while True:
+        response = table.scan(**kwargs)
+        for item in response.get("Items", []):
+            set_parts = []
+            values = {}
+            created_at = to_epoch(item.get("createdAt"))
+            if created_at and not item.get("createdDay"):
+                set_parts.append("createdDay = :day, createdAt = :createdAt")
+                values[":day"] = day_bucket(created_at)
+                values[":createdAt"] = created_at
+            updated_at = to_epoch(item.get("updatedAt"))
+            if updated_at and not item.get("updatedDay"):
+                set_parts.append("updatedDay = :updatedDay, updatedAt = :updatedAt")
+                values[":updatedDay"] = day_bucket(updated_at)
+                values[":updatedAt"] = updated_at
+            remove_assigned = "assignedTo" in item and item["assignedTo"] is None
+            if not set_parts and not remove_assigned:
+                continue
+
+            expression = ""
+            if set_parts:
+                expression = "SET " + ", ".join(set_parts)
+            if remove_assigned:
+                expression += " REMOVE assignedTo"
+            update_kwargs = {
+                "Key": {"incidentId": item["incidentId"]},
+                "UpdateExpression": expression.strip(),
+            }
+            if values:
+                update_kwargs["ExpressionAttributeValues"] = values
+            table.update_item(**update_kwargs)
+            updated += 1
+        last_key = response.get("LastEvaluatedKey")
+        if not last_key:
+            break
+        kwargs["ExclusiveStartKey"] = last_key
+
+    print(f"Incidentes actualizados: {updated}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
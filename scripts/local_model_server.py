@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Modelo local que imita la API de invocación de SageMaker Runtime para probar
+las predicciones sin un endpoint desplegado.
+
+Responde ``POST /endpoints/<nombre>/invocations`` con una predicción por
+instancia, estimada con los conteos históricos que recibe en ``features``.
+``--delay`` y ``--fail-rate`` simulan un endpoint lento o inestable para
+verificar los timeouts y el circuit breaker.
+
+Uso:
+    python scripts/local_model_server.py [--port 8080] [--delay 0] [--fail-rate 0]
+
+    export SAGEMAKER_ENDPOINT_NAME=local
+    export SAGEMAKER_RUNTIME_URL=http://localhost:8080
+    (botocore exige credenciales aunque el servidor no las valida)
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+
+def _shares(counts: List[Dict[str, Any]], key: str) -> Dict[Any, float]:
+    total = sum(item["count"] for item in counts) or 1
+    return {item[key]: item["count"] / total for item in counts}
+
+
+def predict(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Incidentes esperados por semana para cada (ubicación, hora, día)."""
+    stats = (payload.get("features") or {}).get("historicalStats") or {}
+    locations = {item["location"]: item["count"] for item in stats.get("countsByLocation", [])}
+    hours = _shares(stats.get("countsByHour", []), "hour")
+    days = _shares(stats.get("countsByDayOfWeek", []), "day")
+    types = {
+        item["location"]: item["topTypes"][0]["type"] if item["topTypes"] else None
+        for item in stats.get("countsByLocationAndType", [])
+    }
+
+    predictions = []
+    for instance in payload.get("instances") or []:
+        expected = (
+            locations.get(instance.get("location"), 0)
+            * hours.get(instance.get("hour"), 0)
+            * days.get(instance.get("dayOfWeek"), 0)
+        )
+        predictions.append({
+            "expectedIncidents": round(expected, 4),
+            "likelyType": types.get(instance.get("location")),
+        })
+    return {"predictions": predictions, "source": "local-model"}
+
+
+def make_handler(delay: float, fail_rate: float):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self) -> None:
+            parts = self.path.strip("/").split("/")
+            if len(parts) != 3 or parts[0] != "endpoints" or parts[2] != "invocations":
+                self._reply(404, {"message": f"Ruta no soportada: {self.path}"})
+                return
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                payload = json.loads(self.rfile.read(length) or b"{}")
+            except json.JSONDecodeError:
+                self._reply(400, {"message": "Body must be JSON"})
+                return
+
+            time.sleep(delay)
+            if random.random() < fail_rate:
+                self._reply(500, {"message": "Fallo simulado del modelo"})
+                return
+            self._reply(200, predict(payload))
+
+        def _reply(self, status: int, body: Dict[str, Any]) -> None:
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--delay", type=float, default=0.0,
+                        help="segundos de espera antes de responder")
+    parser.add_argument("--fail-rate", type=float, default=0.0,
+                        help="fracción de invocaciones que responden 500")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(args.delay, args.fail_rate))
+    print(f"Modelo local en http://127.0.0.1:{args.port}/endpoints/<nombre>/invocations")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
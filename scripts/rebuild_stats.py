@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Reconstruye los agregados de la tabla de estadísticas: sketches diarios del
+campus (índice por día) y contadores de carga por personal (índice
+assignedTo+status).
+
+Requisitos:
+- Credenciales AWS configuradas
+- Exportar INCIDENTS_TABLE, USERS_TABLE y STATS_TABLE
+- Haber ejecutado antes scripts/backfill_created_day.py si hay datos antiguos
+
+Uso:
+    python scripts/rebuild_stats.py [from] [to]
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.common.dynamodb import list_users_by_role  # noqa: E402
+from src.common.stats import rebuild_campus_sketches, rebuild_staff_workload  # noqa: E402
+from src.common.time_range import history_start, resolve_time_range  # noqa: E402
+
+
+def main() -> int:
+    args = sys.argv[1:]
+    start, end = resolve_time_range({
+        "from": args[0] if len(args) > 0 else None,
+        "to": args[1] if len(args) > 1 else None,
+    })
+    if start is None:
+        start = history_start()
+    days = rebuild_campus_sketches(start, end)
+    print(f"Días reconstruidos: {days}")
+    staff = [user["email"] for user in list_users_by_role("personal")]
+    print(f"Personal reconstruido: {rebuild_staff_workload(staff)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,377 @@
+"""
+Utilidades para ejecutar queries de Athena en paralelo.
+
+Todas las queries se envían a la vez y se consultan juntas con
+``batch_get_query_execution`` usando un backoff adaptativo; los resultados se
+recogen a medida que cada query termina.
+
+De cada ejecución se conservan las estadísticas de Athena (bytes escaneados,
+tiempos de cola, planificación y ejecución) y se puede fijar un presupuesto de
+bytes escaneados por query.
+"""
+import hashlib
+import json
+import os
+import time
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import boto3
+from botocore.exceptions import BotoCoreError, ClientError
+
+INITIAL_POLL_SECONDS = 0.25
+MAX_POLL_SECONDS = 2.0
+BACKOFF_FACTOR = 1.5
+BATCH_GET_LIMIT = 50
+CACHE_PREFIX = "query-cache"
+RESULTS_PAGE_SIZE = 1000
+INTEGER_TYPES = {"tinyint", "smallint", "integer", "int", "bigint"}
+FLOAT_TYPES = {"float", "real", "double"}
+FINAL_STATES = {"SUCCEEDED", "FAILED", "CANCELLED"}
+# Precio de Athena por TB escaneado (mínimo facturable de 10 MB por query)
+PRICE_PER_TB_USD = 5.0
+MIN_BILLED_BYTES = 10 * 1024 ** 2
+# (campo de la respuesta, campo de QueryExecution.Statistics)
+STATISTICS_FIELDS = (
+    ("dataScannedBytes", "DataScannedInBytes"),
+    ("engineExecutionTimeMs", "EngineExecutionTimeInMillis"),
+    ("queryQueueTimeMs", "QueryQueueTimeInMillis"),
+    ("queryPlanningTimeMs", "QueryPlanningTimeInMillis"),
+    ("serviceProcessingTimeMs", "ServiceProcessingTimeInMillis"),
+    ("totalExecutionTimeMs", "TotalExecutionTimeInMillis"),
+)
+
+
+class AthenaQueryError(Exception):
+    """Raised when an Athena query fails, is cancelled or times out."""
+
+
+@lru_cache(maxsize=1)
+def _client():
+    return boto3.client("athena")
+
+
+@lru_cache(maxsize=1)
+def _s3():
+    return boto3.client("s3")
+
+
+def start_query(
+    query: str,
+    database: str,
+    output_location: str,
+    parameters: Optional[List[str]] = None,
+) -> str:
+    """
+    Inicia un query. ``parameters`` se enlazan a los ``?`` del SQL en orden
+    (ExecutionParameters), sin interpolar valores en el texto.
+    """
+    kwargs: Dict[str, Any] = {
+        "QueryString": query,
+        "QueryExecutionContext": {"Database": database},
+        "ResultConfiguration": {"OutputLocation": output_location},
+    }
+    # El workgroup aplica el límite de bytes escaneados del lado de Athena
+    workgroup = os.environ.get("ATHENA_WORKGROUP")
+    if workgroup:
+        kwargs["WorkGroup"] = workgroup
+    if parameters:
+        kwargs["ExecutionParameters"] = [str(value) for value in parameters]
+    response = _client().start_query_execution(**kwargs)
+    return response["QueryExecutionId"]
+
+
+def query_statistics(execution: Dict[str, Any]) -> Dict[str, Any]:
+    """Estadísticas de una QueryExecution (parciales si aún está en curso)."""
+    raw = execution.get("Statistics") or {}
+    statistics: Dict[str, Any] = {
+        "queryExecutionId": execution["QueryExecutionId"],
+        "state": execution["Status"]["State"],
+    }
+    for name, field in STATISTICS_FIELDS:
+        statistics[name] = int(raw.get(field, 0))
+    billed = max(statistics["dataScannedBytes"], MIN_BILLED_BYTES)
+    statistics["estimatedCostUsd"] = round(billed / 1024 ** 4 * PRICE_PER_TB_USD, 8)
+    return statistics
+
+
+def _stop(query_id: str) -> None:
+    try:
+        _client().stop_query_execution(QueryExecutionId=query_id)
+    except Exception:
+        pass
+
+
+def _converter(athena_type: str) -> Callable[[str], Any]:
+    """Conversión de una celda según el tipo declarado en ResultSetMetadata."""
+    athena_type = athena_type.lower()
+    if athena_type in INTEGER_TYPES:
+        return int
+    if athena_type in FLOAT_TYPES or athena_type.startswith("decimal"):
+        return float
+    if athena_type == "boolean":
+        return lambda value: value == "true"
+    return str
+
+
+def iter_results(query_execution_id: str) -> Iterator[Dict[str, Any]]:
+    """
+    Recorre todas las páginas de resultados (NextToken) y produce una fila a
+    la vez, convirtiendo cada columna con el tipo declarado por Athena.
+    """
+    paginator = _client().get_paginator("get_query_results")
+    pages = paginator.paginate(
+        QueryExecutionId=query_execution_id,
+        PaginationConfig={"PageSize": RESULTS_PAGE_SIZE},
+    )
+    columns: Optional[List[Tuple[str, Callable[[str], Any]]]] = None
+    for page in pages:
+        rows = page["ResultSet"]["Rows"]
+        if columns is None:
+            column_info = page["ResultSet"]["ResultSetMetadata"]["ColumnInfo"]
+            columns = [(col["Name"], _converter(col["Type"])) for col in column_info]
+            # La primera fila de la primera página repite los headers
+            rows = rows[1:]
+        for row in rows:
+            row_data = {}
+            for (name, convert), cell in zip(columns, row["Data"]):
+                value = cell.get("VarCharValue")
+                row_data[name] = convert(value) if value is not None else None
+            yield row_data
+
+
+def fetch_results(query_execution_id: str) -> List[Dict[str, Any]]:
+    return list(iter_results(query_execution_id))
+
+
+def result_download_url(output_location: str, expires_in: int = 3600) -> str:
+    """URL prefirmada del CSV que Athena deja en ``output_location`` (s3://...)."""
+    bucket, _, key = output_location[len("s3://"):].partition("/")
+    return _s3().generate_presigned_url(
+        "get_object",
+        Params={"Bucket": bucket, "Key": key},
+        ExpiresIn=expires_in,
+    )
+
+
+def run_queries(
+    queries: Dict[str, str],
+    database: str,
+    output_location: str,
+    timeout_seconds: float = 50.0,
+    timeouts: Optional[Dict[str, float]] = None,
+    fetch: bool = True,
+    parameters: Optional[Dict[str, List[str]]] = None,
+    max_bytes_scanned: Optional[int] = None,
+) -> Tuple[Dict[str, Any], Dict[str, str], Dict[str, Dict[str, Any]]]:
+    """
+    Ejecuta varias queries concurrentemente.
+
+    Con ``fetch=False`` no se leen las filas: el resultado de cada query es la
+    ubicación S3 del CSV generado por Athena.
+
+    ``parameters`` indica, por nombre, los valores de los ``?`` de cada query.
+    ``timeout_seconds`` aplica a cada query salvo que ``timeouts`` indique uno
+    propio. Las queries que exceden su tiempo se cancelan y se reportan en los
+    errores, devolviendo los resultados parciales del resto. Igual ocurre con
+    las que superan ``max_bytes_scanned`` mientras se ejecutan y con todas las
+    pendientes si falla el sondeo de estado.
+
+    Returns:
+        (resultados por nombre, errores por nombre, estadísticas por nombre)
+    """
+    timeouts = timeouts or {}
+    parameters = parameters or {}
+    results: Dict[str, Any] = {}
+    errors: Dict[str, str] = {}
+    statistics: Dict[str, Dict[str, Any]] = {}
+    started_at = time.monotonic()
+
+    pending: Dict[str, str] = {}
+    for name, query in queries.items():
+        try:
+            query_id = start_query(query, database, output_location, parameters.get(name))
+            pending[query_id] = name
+        except Exception as exc:
+            errors[name] = str(exc)
+
+    delay = INITIAL_POLL_SECONDS
+    while pending:
+        finished_any = False
+        ids = list(pending)
+        for offset in range(0, len(ids), BATCH_GET_LIMIT):
+            try:
+                response = _client().batch_get_query_execution(
+                    QueryExecutionIds=ids[offset:offset + BATCH_GET_LIMIT]
+                )
+            except (ClientError, BotoCoreError) as exc:
+                # Sin poder sondear no se sabe cuándo terminan: cancelar las
+                # pendientes y devolver los resultados parciales del resto
+                for query_id, name in pending.items():
+                    errors[name] = f"Error consultando el estado del query: {exc}"
+                    if name in statistics:
+                        statistics[name]["state"] = "CANCELLED"
+                    _stop(query_id)
+                pending.clear()
+                break
+            for execution in response.get("QueryExecutions", []):
+                query_id = execution["QueryExecutionId"]
+                status = execution["Status"]
+                state = status["State"]
+                name = pending[query_id]
+                statistics[name] = query_statistics(execution)
+                if state not in FINAL_STATES:
+                    scanned = statistics[name]["dataScannedBytes"]
+                    if max_bytes_scanned and scanned > max_bytes_scanned:
+                        pending.pop(query_id)
+                        finished_any = True
+                        errors[name] = (
+                            f"Query cancelado: escaneó {scanned} bytes "
+                            f"(presupuesto {max_bytes_scanned})")
+                        statistics[name]["state"] = "CANCELLED"
+                        _stop(query_id)
+                    continue
+                pending.pop(query_id)
+                finished_any = True
+                if state == "SUCCEEDED" and not fetch:
+                    results[name] = execution["ResultConfiguration"]["OutputLocation"]
+                elif state == "SUCCEEDED":
+                    try:
+                        results[name] = fetch_results(query_id)
+                    except Exception as exc:
+                        errors[name] = str(exc)
+                else:
+                    reason = status.get("StateChangeReason", "Unknown error")
+                    errors[name] = f"Query failed: {reason}"
+            for unprocessed in response.get("UnprocessedQueryExecutionIds", []):
+                query_id = unprocessed["QueryExecutionId"]
+                errors[pending.pop(query_id)] = unprocessed.get(
+                    "ErrorMessage", "Unknown error")
+
+        elapsed = time.monotonic() - started_at
+        for query_id, name in list(pending.items()):
+            if elapsed >= timeouts.get(name, timeout_seconds):
+                pending.pop(query_id)
+                errors[name] = "Query execution timeout"
+                if name in statistics:
+                    statistics[name]["state"] = "CANCELLED"
+                _stop(query_id)
+
+        if not pending:
+            break
+        # Backoff adaptativo: sondear rápido mientras terminan queries,
+        # espaciar las consultas cuando todas siguen en curso
+        delay = INITIAL_POLL_SECONDS if finished_any else min(
+            MAX_POLL_SECONDS, delay * BACKOFF_FACTOR)
+        time.sleep(delay)
+
+    return results, errors, statistics
+
+
+def execute_athena_query(
+    query: str,
+    database: str,
+    output_location: str,
+    timeout_seconds: float = 60.0,
+    parameters: Optional[List[str]] = None,
+):
+    """
+    Ejecuta un solo query en Athena y espera el resultado
+    """
+    results, errors, _ = run_queries(
+        {"query": query}, database, output_location, timeout_seconds,
+        parameters={"query": parameters} if parameters else None)
+    if errors:
+        raise AthenaQueryError(errors["query"])
+    return results["query"]
+
+
+def cache_key(name: str, query: str, dataset_version: int, params: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Clave S3 del resultado cacheado: cambia con la versión del dataset, el SQL
+    y los parámetros, por lo que nunca se sirve un resultado obsoleto.
+    """
+    fingerprint = json.dumps([query, params or {}], sort_keys=True, default=str)
+    digest = hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()[:32]
+    return f"{CACHE_PREFIX}/v{dataset_version}/{name}/{digest}.json"
+
+
+def load_cached_result(bucket: str, key: str) -> Optional[Dict[str, Any]]:
+    try:
+        response = _s3().get_object(Bucket=bucket, Key=key)
+    except ClientError as exc:
+        if exc.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+            return None
+        raise
+    return json.loads(response["Body"].read())
+
+
+def store_cached_result(bucket: str, key: str, rows: Any) -> None:
+    payload = {"cachedAt": int(time.time()), "rows": rows}
+    _s3().put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=json.dumps(payload, default=str).encode("utf-8"),
+        ContentType="application/json",
+    )
+
+
+def run_cached_queries(
+    queries: Dict[str, str],
+    database: str,
+    output_location: str,
+    cache_bucket: str,
+    dataset_version: int,
+    parameters: Optional[Dict[str, List[str]]] = None,
+    refresh: bool = False,
+    timeout_seconds: float = 50.0,
+    fetch: bool = True,
+    max_bytes_scanned: Optional[int] = None,
+) -> Tuple[Dict[str, Any], Dict[str, str], Dict[str, Any], Dict[str, Dict[str, Any]]]:
+    """
+    Igual que ``run_queries`` pero reutiliza resultados guardados en S3 para la
+    versión actual del dataset. Solo se ejecutan en Athena los que no están
+    cacheados (o todos si ``refresh``).
+
+    Returns:
+        (resultados, errores, metadata de cache, estadísticas de las ejecutadas)
+    """
+    parameters = parameters or {}
+    results: Dict[str, Any] = {}
+    # Las filas y las ubicaciones de CSV se cachean por separado
+    keys = {
+        name: cache_key(name, query, dataset_version,
+                        {"parameters": parameters.get(name), "fetch": fetch})
+        for name, query in queries.items()
+    }
+    hits: Dict[str, int] = {}
+
+    if not refresh:
+        for name, key in keys.items():
+            try:
+                cached = load_cached_result(cache_bucket, key)
+            except Exception as exc:
+                print(f"Error leyendo cache de {name}: {exc}")
+                continue
+            if cached is not None:
+                results[name] = cached["rows"]
+                hits[name] = cached.get("cachedAt")
+
+    misses = {name: query for name, query in queries.items() if name not in results}
+    fresh, errors, statistics = run_queries(
+        misses, database, output_location, timeout_seconds,
+        fetch=fetch, parameters=parameters, max_bytes_scanned=max_bytes_scanned)
+    for name, rows in fresh.items():
+        results[name] = rows
+        try:
+            store_cached_result(cache_bucket, keys[name], rows)
+        except Exception as exc:
+            print(f"Error guardando cache de {name}: {exc}")
+
+    cache = {
+        "datasetVersion": dataset_version,
+        "hits": sorted(hits),
+        "misses": sorted(misses),
+        "cachedAt": hits,
+    }
+    return results, errors, cache, statistics
@@ -1,10 +1,14 @@
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from decimal import Decimal
 from functools import lru_cache
 from time import time
-from typing import Any, Dict, Iterable, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import boto3
-from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.conditions import Attr, Key
 from botocore.exceptions import ClientError
 
 
@@ -31,6 +35,71 @@ def _connections_table():
     return _resource().Table(table_name)
 
 
+@lru_cache(maxsize=1)
+def _stats_table():
+    table_name = os.environ["STATS_TABLE"]
+    return _resource().Table(table_name)
+
+
+@lru_cache(maxsize=1)
+def _jobs_table():
+    table_name = os.environ["JOBS_TABLE"]
+    return _resource().Table(table_name)
+
+
+DATA_VERSION_KEY = {"statKey": "dataVersion", "bucket": "incidents"}
+DATASET_VERSION_KEY = {"statKey": "datasetVersion", "bucket": "analytics"}
+SYNC_WATERMARK_STAT_KEY = "syncWatermark"
+CREATED_DAY_INDEX = "createdDay-index"
+UPDATED_DAY_INDEX = "updatedDay-index"
+ASSIGNED_INDEX = "assignedTo-status-index"
+STATUS_CREATED_INDEX = "status-createdAt-index"
+JOBS_REQUESTED_BY_INDEX = "requestedBy-index"
+WORKLOAD_STAT_KEY = "workload"
+# Atributos que son clave de algún índice: DynamoDB rechaza valores NULL en ellos
+_INDEX_KEY_ATTRIBUTES = (
+    "status", "createdDay", "createdAt", "assignedTo", "updatedDay", "updatedAt",
+)
+# Índices por día: (atributo de partición, atributo de orden)
+_DAY_INDEX_KEYS = {
+    CREATED_DAY_INDEX: ("createdDay", "createdAt"),
+    UPDATED_DAY_INDEX: ("updatedDay", "updatedAt"),
+}
+SECONDS_PER_DAY = 86400
+BUCKET_QUERY_WORKERS = 8
+
+_thread_local = threading.local()
+
+
+def _thread_incidents_table():
+    # Los recursos de boto3 no son thread-safe: un Table por hilo
+    table = getattr(_thread_local, "incidents_table", None)
+    if table is None:
+        resource = boto3.session.Session().resource("dynamodb")
+        table = resource.Table(os.environ["INCIDENTS_TABLE"])
+        _thread_local.incidents_table = table
+    return table
+
+
+def day_bucket(timestamp: int) -> str:
+    """
+    Partición diaria (UTC) de los índices por fecha: day#YYYY-MM-DD
+    """
+    day = datetime.fromtimestamp(int(timestamp), tz=timezone.utc)
+    return f"day#{day.strftime('%Y-%m-%d')}"
+
+
+def day_buckets_between(start: int, end: int) -> List[str]:
+    """
+    Particiones diarias que cubren el rango [start, end)
+    """
+    if end <= start:
+        return []
+    first_day = int(start) // SECONDS_PER_DAY
+    last_day = (int(end) - 1) // SECONDS_PER_DAY
+    return [day_bucket(day * SECONDS_PER_DAY) for day in range(first_day, last_day + 1)]
+
+
 def put_user(item: Dict[str, Any]) -> None:
     table = _users_table()
     table.put_item(Item=item)
@@ -53,7 +122,16 @@ def update_last_login(email: str) -> None:
 
 def put_incident(item: Dict[str, Any]) -> None:
     table = _incidents_table()
+    if "createdDay" not in item and item.get("createdAt"):
+        item = {**item, "createdDay": day_bucket(item["createdAt"])}
+    if "updatedDay" not in item and item.get("updatedAt"):
+        item = {**item, "updatedDay": day_bucket(item["updatedAt"])}
+    item = {
+        key: value for key, value in item.items()
+        if value is not None or key not in _INDEX_KEY_ATTRIBUTES
+    }
     table.put_item(Item=item)
+    _touch_data_version()
 
 
 def get_incident(incident_id: str) -> Optional[Dict[str, Any]]:
@@ -90,6 +168,185 @@ def list_incidents(statuses: Optional[Iterable[str]] = None) -> List[Dict[str, A
     return items
 
 
+def _equality_filter(filters: Optional[Dict[str, Any]]):
+    """FilterExpression con las igualdades indicadas (None si no hay)"""
+    expression = None
+    for attribute, value in (filters or {}).items():
+        condition = Attr(attribute).eq(value)
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def _query_day_bucket(
+    bucket: str,
+    start: int,
+    end: int,
+    descending: bool,
+    index_name: str = CREATED_DAY_INDEX,
+    filter_expression=None,
+) -> List[Dict[str, Any]]:
+    table = _thread_incidents_table()
+    partition_key, sort_key = _DAY_INDEX_KEYS[index_name]
+    items: List[Dict[str, Any]] = []
+    kwargs: Dict[str, Any] = {
+        "IndexName": index_name,
+        "KeyConditionExpression": (
+            Key(partition_key).eq(bucket) & Key(sort_key).between(start, end - 1)
+        ),
+        "ScanIndexForward": not descending,
+    }
+    if filter_expression is not None:
+        kwargs["FilterExpression"] = filter_expression
+    while True:
+        response = table.query(**kwargs)
+        items.extend(response.get("Items", []))
+        last_key = response.get("LastEvaluatedKey")
+        if not last_key:
+            break
+        kwargs["ExclusiveStartKey"] = last_key
+    return items
+
+
+def _iter_day_index(
+    index_name: str,
+    start: int,
+    end: Optional[int],
+    descending: bool,
+    filter_expression=None,
+) -> Iterator[Dict[str, Any]]:
+    if end is None:
+        end = int(time()) + 1
+    buckets = day_buckets_between(start, end)
+    if descending:
+        buckets.reverse()
+    window = BUCKET_QUERY_WORKERS * 2
+    with ThreadPoolExecutor(max_workers=BUCKET_QUERY_WORKERS) as executor:
+        for offset in range(0, len(buckets), window):
+            chunk = buckets[offset:offset + window]
+            pages = executor.map(
+                lambda bucket: _query_day_bucket(
+                    bucket, start, end, descending, index_name, filter_expression),
+                chunk,
+            )
+            for items in pages:
+                yield from items
+
+
+def list_incidents_between(
+    start: int,
+    end: Optional[int] = None,
+    descending: bool = False,
+    filters: Optional[Dict[str, Any]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Itera los incidentes con createdAt en [start, end) en orden de createdAt.
+
+    Sin ``status`` consulta solo las particiones diarias del rango, en
+    paralelo; con ``status`` usa status-createdAt-index (solo lee los de ese
+    estado). El resto de ``filters`` (igualdad por atributo) se evalúa en
+    DynamoDB con FilterExpression.
+    """
+    filters = dict(filters or {})
+    status = filters.pop("status", None)
+    filter_expression = _equality_filter(filters)
+    if status:
+        return _iter_status_range(status, start, end, descending, filter_expression)
+    return _iter_day_index(CREATED_DAY_INDEX, start, end, descending, filter_expression)
+
+
+def _iter_status_range(
+    status: str,
+    start: int,
+    end: Optional[int],
+    descending: bool,
+    filter_expression=None,
+) -> Iterator[Dict[str, Any]]:
+    if end is None:
+        end = int(time()) + 1
+    table = _incidents_table()
+    kwargs: Dict[str, Any] = {
+        "IndexName": STATUS_CREATED_INDEX,
+        "KeyConditionExpression": (
+            Key("status").eq(status) & Key("createdAt").between(start, end - 1)
+        ),
+        "ScanIndexForward": not descending,
+    }
+    if filter_expression is not None:
+        kwargs["FilterExpression"] = filter_expression
+    while True:
+        response = table.query(**kwargs)
+        yield from response.get("Items", [])
+        last_key = response.get("LastEvaluatedKey")
+        if not last_key:
+            return
+        kwargs["ExclusiveStartKey"] = last_key
+
+
+def list_incidents_updated_between(
+    start: int,
+    end: Optional[int] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Itera los incidentes modificados (updatedAt) en [start, end). El índice
+    solo proyecta ``incidentId``, ``updatedAt`` y ``createdAt``.
+    """
+    return _iter_day_index(UPDATED_DAY_INDEX, start, end, False)
+
+
+def created_days_updated_between(start: int, end: Optional[int] = None) -> List[int]:
+    """
+    Días de creación (días desde epoch, UTC) de los incidentes modificados en
+    [start, end): las particiones diarias que hay que recalcular
+    """
+    days = set()
+    for item in list_incidents_updated_between(start, end):
+        created_at = item.get("createdAt")
+        if isinstance(created_at, (int, float, Decimal)) and created_at > 0:
+            days.add(int(created_at) // SECONDS_PER_DAY)
+    return sorted(days)
+
+
+def list_incidents_assigned_to(
+    staff: str,
+    status: Optional[str] = None,
+    limit: int = 25,
+    exclusive_start_key: Optional[Dict[str, Any]] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """
+    Página de incidentes asignados a un miembro del personal (índice assignedTo+status)
+    """
+    table = _incidents_table()
+    condition = Key("assignedTo").eq(staff)
+    if status:
+        condition = condition & Key("status").eq(status)
+    kwargs: Dict[str, Any] = {
+        "IndexName": ASSIGNED_INDEX,
+        "KeyConditionExpression": condition,
+        "Limit": limit,
+    }
+    if exclusive_start_key:
+        kwargs["ExclusiveStartKey"] = exclusive_start_key
+    response = table.query(**kwargs)
+    return response.get("Items", []), response.get("LastEvaluatedKey")
+
+
+def count_incidents_assigned_to(staff: str, status: str) -> int:
+    table = _incidents_table()
+    kwargs: Dict[str, Any] = {
+        "IndexName": ASSIGNED_INDEX,
+        "KeyConditionExpression": Key("assignedTo").eq(staff) & Key("status").eq(status),
+        "Select": "COUNT",
+    }
+    total = 0
+    while True:
+        response = table.query(**kwargs)
+        total += response.get("Count", 0)
+        last_key = response.get("LastEvaluatedKey")
+        if not last_key:
+            return total
+        kwargs["ExclusiveStartKey"] = last_key
+
+
 def list_all_incidents() -> List[Dict[str, Any]]:
     """
     Lista todos los incidentes sin filtros (para analytics)
@@ -97,15 +354,44 @@ def list_all_incidents() -> List[Dict[str, Any]]:
     return list_incidents(statuses=None)
 
 
+def iter_all_incidents(
+    filters: Optional[Dict[str, Any]] = None,
+    end: Optional[int] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Itera la tabla completa con scan paginado (orden de la tabla), incluidos
+    los incidentes sin createdDay. ``filters`` (igualdad por atributo) y el
+    límite ``createdAt < end`` se evalúan en DynamoDB con FilterExpression.
+    """
+    table = _incidents_table()
+    filter_expression = _equality_filter(filters)
+    if end is not None:
+        condition = Attr("createdAt").lt(end)
+        filter_expression = (
+            condition if filter_expression is None else filter_expression & condition)
+    kwargs: Dict[str, Any] = {}
+    if filter_expression is not None:
+        kwargs["FilterExpression"] = filter_expression
+    while True:
+        response = table.scan(**kwargs)
+        yield from response.get("Items", [])
+        last_key = response.get("LastEvaluatedKey")
+        if not last_key:
+            break
+        kwargs["ExclusiveStartKey"] = last_key
+
+
 def update_incident(
     incident_id: str,
     attributes: Dict[str, Any],
     history_entry: Dict[str, Any],
 ) -> Dict[str, Any]:
     table = _incidents_table()
+    now = int(time())
     attr_names: Dict[str, str] = {}
     attr_values: Dict[str, Any] = {
-        ":ts": int(time()),
+        ":ts": now,
+        ":updatedDay": day_bucket(now),
         ":historyEntry": [history_entry],
         ":emptyList": [],
     }
@@ -122,6 +408,7 @@ def update_incident(
         set_parts.append(f"{placeholder_name} = {placeholder_value}")
 
     set_parts.append("updatedAt = :ts")
+    set_parts.append("updatedDay = :updatedDay")
     set_parts.append(
         "history = list_append(if_not_exists(history, :emptyList), :historyEntry)")
 
@@ -136,6 +423,230 @@ def update_incident(
     if attr_names:
         update_kwargs["ExpressionAttributeNames"] = attr_names
     response = table.update_item(**update_kwargs)
+    _touch_data_version()
+    return response["Attributes"]
+
+
+def bump_data_version() -> int:
+    """
+    Incrementa el contador de versión de los incidentes (usado para ETags)
+    """
+    table = _stats_table()
+    response = table.update_item(
+        Key=DATA_VERSION_KEY,
+        UpdateExpression="ADD version :one SET updatedAt = :ts",
+        ExpressionAttributeValues={":one": 1, ":ts": int(time())},
+        ReturnValues="UPDATED_NEW",
+    )
+    return int(response["Attributes"]["version"])
+
+
+def _touch_data_version() -> None:
+    """
+    Incrementa la versión tras una escritura ya confirmada; un fallo solo se
+    registra para no convertir la escritura en un error (como los sketches)
+    """
+    try:
+        bump_data_version()
+    except Exception as exc:
+        print(f"Error incrementando la versión de los incidentes: {exc}")
+
+
+def get_data_version() -> int:
+    """
+    Versión agregada de los incidentes; cambia con cada escritura
+    """
+    table = _stats_table()
+    response = table.get_item(Key=DATA_VERSION_KEY)
+    return int(response.get("Item", {}).get("version", 0))
+
+
+def publish_dataset_version(incidents_count: int) -> int:
+    """
+    Publica una nueva versión del dataset de Athena (la escribe el job de sync)
+    """
+    table = _stats_table()
+    response = table.update_item(
+        Key=DATASET_VERSION_KEY,
+        UpdateExpression="ADD version :one SET updatedAt = :ts, incidentsCount = :count",
+        ExpressionAttributeValues={":one": 1, ":ts": int(time()), ":count": incidents_count},
+        ReturnValues="UPDATED_NEW",
+    )
+    return int(response["Attributes"]["version"])
+
+
+def get_dataset_version() -> int:
+    """
+    Versión del dataset sincronizado a S3; 0 si nunca se sincronizó
+    """
+    table = _stats_table()
+    response = table.get_item(Key=DATASET_VERSION_KEY)
+    return int(response.get("Item", {}).get("version", 0))
+
+
+def get_sync_watermark(target: str = "analytics") -> int:
+    """
+    updatedAt hasta el cual ``target`` (data lake de Athena, rollups, ...)
+    está sincronizado; 0 si nunca
+    """
+    table = _stats_table()
+    response = table.get_item(Key={"statKey": SYNC_WATERMARK_STAT_KEY, "bucket": target})
+    return int(response.get("Item", {}).get("watermark", 0))
+
+
+def set_sync_watermark(watermark: int, target: str = "analytics") -> None:
+    table = _stats_table()
+    table.put_item(Item={
+        "statKey": SYNC_WATERMARK_STAT_KEY,
+        "bucket": target,
+        "watermark": watermark,
+        "updatedAt": int(time()),
+    })
+
+
+def get_stat_item(stat_key: str, bucket: str) -> Optional[Dict[str, Any]]:
+    table = _stats_table()
+    response = table.get_item(Key={"statKey": stat_key, "bucket": bucket})
+    return response.get("Item")
+
+
+def put_stat_item(
+    stat_key: str,
+    bucket: str,
+    attributes: Dict[str, Any],
+    expected_version: Optional[int] = None,
+) -> bool:
+    """
+    Guarda un agregado con control optimista de concurrencia sobre ``version``.
+    Retorna False si otro proceso lo modificó antes (se debe reintentar).
+    """
+    table = _stats_table()
+    # Las reconstrucciones completas (sin versión esperada) usan una versión
+    # nueva basada en el reloj para invalidar lecturas concurrentes
+    version = int(time() * 1000) if expected_version is None else expected_version + 1
+    item = {**attributes, "statKey": stat_key, "bucket": bucket,
+            "version": version, "updatedAt": int(time())}
+    kwargs: Dict[str, Any] = {"Item": item}
+    if expected_version is not None:
+        if expected_version:
+            kwargs["ConditionExpression"] = "version = :expected"
+            kwargs["ExpressionAttributeValues"] = {":expected": expected_version}
+        else:
+            kwargs["ConditionExpression"] = "attribute_not_exists(statKey)"
+    try:
+        table.put_item(**kwargs)
+    except ClientError as exc:
+        if exc.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return False
+        raise
+    return True
+
+
+def batch_get_stat_items(stat_key: str, buckets: Iterable[str]) -> List[Dict[str, Any]]:
+    """
+    Lee varios buckets de un mismo agregado (en lotes de 100 claves)
+    """
+    table_name = os.environ["STATS_TABLE"]
+    keys = [{"statKey": stat_key, "bucket": bucket} for bucket in buckets]
+    items: List[Dict[str, Any]] = []
+    for offset in range(0, len(keys), 100):
+        request = {table_name: {"Keys": keys[offset:offset + 100]}}
+        while request:
+            response = _resource().batch_get_item(RequestItems=request)
+            items.extend(response.get("Responses", {}).get(table_name, []))
+            request = response.get("UnprocessedKeys") or None
+    return items
+
+
+def adjust_staff_workload(staff: str, deltas: Dict[str, int]) -> None:
+    """
+    Ajusta atómicamente los contadores por estado de un miembro del personal
+    """
+    deltas = {status: delta for status, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    table = _stats_table()
+    names = {}
+    values: Dict[str, Any] = {":ts": int(time())}
+    parts = []
+    for idx, (status, delta) in enumerate(deltas.items()):
+        names[f"#s{idx}"] = status
+        values[f":d{idx}"] = delta
+        parts.append(f"#s{idx} :d{idx}")
+    table.update_item(
+        Key={"statKey": WORKLOAD_STAT_KEY, "bucket": staff},
+        UpdateExpression="ADD " + ", ".join(parts) + " SET updatedAt = :ts",
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=values,
+    )
+
+
+def list_staff_workload() -> List[Dict[str, Any]]:
+    """
+    Contadores por estado de todo el personal (una sola partición de la tabla de estadísticas)
+    """
+    table = _stats_table()
+    items: List[Dict[str, Any]] = []
+    kwargs: Dict[str, Any] = {"KeyConditionExpression": Key("statKey").eq(WORKLOAD_STAT_KEY)}
+    while True:
+        response = table.query(**kwargs)
+        items.extend(response.get("Items", []))
+        last_key = response.get("LastEvaluatedKey")
+        if not last_key:
+            return items
+        kwargs["ExclusiveStartKey"] = last_key
+
+
+def put_job(item: Dict[str, Any]) -> None:
+    table = _jobs_table()
+    table.put_item(Item=item)
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    table = _jobs_table()
+    response = table.get_item(Key={"jobId": job_id})
+    return response.get("Item")
+
+
+def count_active_jobs(requested_by: str, since: int, analysis: Optional[str] = None) -> int:
+    """
+    Jobs pendientes o en ejecución del usuario creados desde ``since``
+    (índice requestedBy+createdAt)
+    """
+    table = _jobs_table()
+    filter_expression = Attr("status").is_in(["pending", "running"])
+    if analysis:
+        filter_expression = filter_expression & Attr("analysis").eq(analysis)
+    kwargs: Dict[str, Any] = {
+        "IndexName": JOBS_REQUESTED_BY_INDEX,
+        "KeyConditionExpression": Key("requestedBy").eq(requested_by) & Key("createdAt").gte(since),
+        "FilterExpression": filter_expression,
+        "Select": "COUNT",
+    }
+    total = 0
+    while True:
+        response = table.query(**kwargs)
+        total += response.get("Count", 0)
+        last_key = response.get("LastEvaluatedKey")
+        if not last_key:
+            return total
+        kwargs["ExclusiveStartKey"] = last_key
+
+
+def update_job(job_id: str, attributes: Dict[str, Any]) -> Dict[str, Any]:
+    table = _jobs_table()
+    attributes = {**attributes, "updatedAt": int(time())}
+    attr_names = {f"#attr{idx}": key for idx, key in enumerate(attributes)}
+    attr_values = {f":val{idx}": value for idx, value in enumerate(attributes.values())}
+    set_parts = [f"#attr{idx} = :val{idx}" for idx in range(len(attributes))]
+    response = table.update_item(
+        Key={"jobId": job_id},
+        UpdateExpression="SET " + ", ".join(set_parts),
+        ExpressionAttributeNames=attr_names,
+        ExpressionAttributeValues=attr_values,
+        ConditionExpression="attribute_exists(jobId)",
+        ReturnValues="ALL_NEW",
+    )
     return response["Attributes"]
 
 
@@ -204,7 +715,7 @@ def add_incident_comment(
         Key={"incidentId": incident_id},
         UpdateExpression=(
             "SET comments = list_append(if_not_exists(comments, :emptyList), :commentList), "
-            "updatedAt = :ts, "
+            "updatedAt = :ts, updatedDay = :updatedDay, "
             "history = list_append(if_not_exists(history, :emptyList), :historyEntry)"
         ),
         ExpressionAttributeValues={
@@ -212,10 +723,12 @@ def add_incident_comment(
             ":historyEntry": [history_entry],
             ":emptyList": [],
             ":ts": now,
+            ":updatedDay": day_bucket(now),
         },
         ConditionExpression="attribute_exists(incidentId)",
         ReturnValues="ALL_NEW",
     )
+    _touch_data_version()
     return response["Attributes"]
 
 
@@ -244,12 +757,13 @@ def add_significance_vote(
         response = table.update_item(
             Key={"incidentId": incident_id},
             UpdateExpression=(
-                "SET updatedAt = :ts, "
+                "SET updatedAt = :ts, updatedDay = :updatedDay, "
                 "history = list_append(if_not_exists(history, :emptyList), :historyEntry) "
                 "ADD significanceCount :one, significanceVoters :voterSet"
             ),
             ExpressionAttributeValues={
                 ":ts": now,
+                ":updatedDay": day_bucket(now),
                 ":historyEntry": [history_entry],
                 ":emptyList": [],
                 ":one": 1,
@@ -258,6 +772,7 @@ def add_significance_vote(
             ConditionExpression="attribute_exists(incidentId)",
             ReturnValues="ALL_NEW",
         )
+        _touch_data_version()
         return response["Attributes"]
     except ClientError as exc:
         if exc.response["Error"]["Code"] == "ConditionalCheckFailedException":
@@ -0,0 +1,203 @@
+"""
+Acumulador de features para el análisis predictivo.
+
+En lugar de que cada análisis recorra el frame con sus propios filtros y
+bincounts, ``IncidentFeatures`` llena en una sola pasada dos tablas de conteos
+conjuntos (ubicación × tipo × indicadores y createdAt conocido × tipo × día de
+la semana × hora) más los conteos por día. Todas las tablas que usan las
+predicciones son marginales de estos conteos, por lo que los análisis no pueden
+divergir entre sí.
+
+Las tablas son aditivas: ``buildDailyRollups`` las materializa por día de
+creación (``features#daily``) y las predicciones combinan los días del rango
+con ``IncidentFeatures.merge``.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.common.frame import SECONDS_PER_DAY, IncidentFrame
+
+# Ejes de las tablas conjuntas; los indicadores son ejes de tamaño 2
+LOCATION_AXES = ("location", "type", "high_urgency", "high_priority", "unresolved", "timed")
+TIME_AXES = ("timed", "type", "weekday", "hour")
+_HOURS = 24
+_WEEKDAYS = 7
+
+
+def _location_table(n_locations: int, n_types: int) -> np.ndarray:
+    return np.zeros((n_locations, n_types, 2, 2, 2, 2), dtype=np.int64)
+
+
+def _time_table(n_types: int) -> np.ndarray:
+    return np.zeros((2, n_types, _WEEKDAYS, _HOURS), dtype=np.int64)
+
+
+class IncidentFeatures:
+    """Conteos conjuntos de incidentes y sus marginales."""
+
+    def __init__(
+        self,
+        labels: Dict[str, List[Any]],
+        location_counts: np.ndarray,
+        time_counts: np.ndarray,
+        first_day: int = 0,
+        day_counts: Optional[np.ndarray] = None,
+    ) -> None:
+        self._labels = labels
+        self._location_counts = location_counts
+        self._time_counts = time_counts
+        self._first_day = first_day
+        self._day_counts = np.zeros(0, dtype=np.int64) if day_counts is None else day_counts
+        self.total = int(location_counts.sum())
+
+    @classmethod
+    def from_frame(cls, frame: IncidentFrame) -> "IncidentFeatures":
+        """Llena todas las tablas en una sola pasada sobre el frame."""
+        labels = {"location": frame.labels("location"), "type": frame.labels("type")}
+        n_locations = len(labels["location"])
+        n_types = len(labels["type"])
+
+        type_codes = frame.codes("type").astype(np.int64)
+        # createdAt conocido (los análisis de horarios y recurrencia usan solo estos)
+        timed = frame.has_time()
+        key = frame.codes("location").astype(np.int64) * n_types + type_codes
+        for column, value, negate in (
+            ("urgency", "alta", False),
+            ("priority", "alta", False),
+            ("status", "resuelto", True),
+        ):
+            flag = frame.codes(column) == frame.code_of(column, value)
+            key = key * 2 + (~flag if negate else flag)
+        key = key * 2 + timed
+        location_counts = np.bincount(
+            key, minlength=n_locations * n_types * 16,
+        ).reshape(n_locations, n_types, 2, 2, 2, 2)
+
+        # Hora y día de la semana por createdAt (updatedAt si falta); la última
+        # posición agrupa los incidentes sin timestamp y se descarta
+        event = frame.event_time()
+        event_known = event > 0
+        key = timed.astype(np.int64) * n_types + type_codes
+        key = key * (_WEEKDAYS + 1) + np.where(
+            event_known, IncidentFrame.weekday_of(event), _WEEKDAYS)
+        key = key * (_HOURS + 1) + np.where(event_known, IncidentFrame.hour_of(event), _HOURS)
+        time_counts = np.bincount(
+            key, minlength=2 * n_types * (_WEEKDAYS + 1) * (_HOURS + 1),
+        ).reshape(2, n_types, _WEEKDAYS + 1, _HOURS + 1)[:, :, :_WEEKDAYS, :_HOURS]
+
+        # Conteos por día (solo con createdAt) para las tendencias semanales
+        timed_days = IncidentFrame.day_of(frame.values("createdAt")[timed])
+        first_day = int(timed_days.min()) if timed_days.size else 0
+        return cls(labels, location_counts, time_counts, first_day,
+                   np.bincount(timed_days - first_day))
+
+    @classmethod
+    def by_day(cls, frame: IncidentFrame) -> Dict[int, "IncidentFeatures"]:
+        """Features por día de creación (días desde epoch) en una pasada ordenada."""
+        timed = frame.filter(frame.has_time())
+        days = timed.days()
+        order = np.argsort(days, kind="stable")
+        timed = timed.filter(order)
+        unique_days, offsets = np.unique(days[order], return_index=True)
+        bounds = list(offsets[1:]) + [len(timed)]
+        return {
+            int(day): cls.from_frame(timed.filter(slice(first, last)))
+            for day, first, last in zip(unique_days, offsets, bounds)
+        }
+
+    @classmethod
+    def merge(cls, parts: Iterable["IncidentFeatures"]) -> "IncidentFeatures":
+        """Suma las tablas de varios rangos, unificando las etiquetas."""
+        parts = list(parts)
+        index: Dict[str, Dict[Any, int]] = {"location": {}, "type": {}}
+        maps = []
+        for part in parts:
+            maps.append({
+                column: np.asarray(
+                    [codes.setdefault(label, len(codes)) for label in part._labels[column]],
+                    dtype=np.int64)
+                for column, codes in index.items()
+            })
+
+        location_counts = _location_table(len(index["location"]), len(index["type"]))
+        time_counts = _time_table(len(index["type"]))
+        for part, code_map in zip(parts, maps):
+            location_counts[np.ix_(code_map["location"], code_map["type"])] += part._location_counts
+            time_counts[:, code_map["type"]] += part._time_counts
+
+        dated = [part for part in parts if part._day_counts.size]
+        first_day = min((part._first_day for part in dated), default=0)
+        last_day = max((part._first_day + part._day_counts.size for part in dated), default=0)
+        day_counts = np.zeros(max(0, last_day - first_day), dtype=np.int64)
+        for part in dated:
+            offset = part._first_day - first_day
+            day_counts[offset:offset + part._day_counts.size] += part._day_counts
+
+        labels = {column: list(codes) for column, codes in index.items()}
+        return cls(labels, location_counts, time_counts, first_day, day_counts)
+
+    def to_item(self) -> Dict[str, Any]:
+        """Celdas no vacías con etiquetas compactadas (serializable a JSON/DynamoDB)."""
+        location_cells = np.argwhere(self._location_counts)
+        time_cells = np.argwhere(self._time_counts)
+        location_counts = self._location_counts[tuple(location_cells.T)]
+        time_counts = self._time_counts[tuple(time_cells.T)]
+
+        location_codes = np.unique(location_cells[:, 0])
+        type_codes = np.unique(np.concatenate([location_cells[:, 1], time_cells[:, 1]]))
+        location_cells[:, 0] = np.searchsorted(location_codes, location_cells[:, 0])
+        location_cells[:, 1] = np.searchsorted(type_codes, location_cells[:, 1])
+        time_cells[:, 1] = np.searchsorted(type_codes, time_cells[:, 1])
+        return {
+            "total": self.total,
+            "locations": [self._labels["location"][code] for code in location_codes],
+            "types": [self._labels["type"][code] for code in type_codes],
+            "locationCells": np.column_stack([location_cells, location_counts]).tolist(),
+            "timeCells": np.column_stack([time_cells, time_counts]).tolist(),
+            "firstDay": self._first_day,
+            "dayCounts": self._day_counts.tolist(),
+        }
+
+    @classmethod
+    def from_item(cls, item: Dict[str, Any]) -> "IncidentFeatures":
+        labels = {"location": list(item.get("locations") or []),
+                  "type": list(item.get("types") or [])}
+        location_counts = _location_table(len(labels["location"]), len(labels["type"]))
+        time_counts = _time_table(len(labels["type"]))
+        for table, cells in ((location_counts, item.get("locationCells")),
+                             (time_counts, item.get("timeCells"))):
+            cells = np.asarray(cells or [], dtype=np.int64).reshape(-1, table.ndim + 1)
+            table[tuple(cells[:, :-1].T)] = cells[:, -1]
+        day_counts = np.asarray(item.get("dayCounts") or [], dtype=np.int64)
+        return cls(labels, location_counts, time_counts, int(item.get("firstDay") or 0), day_counts)
+
+    def labels(self, column: str, default: Any = None) -> List[Any]:
+        """Etiquetas por código; los valores ausentes se reemplazan por ``default``."""
+        return [default if label is None else label for label in self._labels[column]]
+
+    def counts(self, *dims: str, where: Optional[str] = None) -> np.ndarray:
+        """
+        Marginal sobre ``dims`` (location, type, hour, weekday), restringida a los
+        incidentes con el indicador ``where`` (high_urgency, high_priority,
+        unresolved, timed). Las dimensiones de tiempo omiten los incidentes sin
+        timestamp y no se combinan con location.
+        """
+        if "hour" in dims or "weekday" in dims:
+            table, axes = self._time_counts, TIME_AXES
+        else:
+            table, axes = self._location_counts, LOCATION_AXES
+        if where is not None:
+            table = np.take(table, 1, axis=axes.index(where))
+            axes = tuple(axis for axis in axes if axis != where)
+        table = table.sum(axis=tuple(i for i, axis in enumerate(axes) if axis not in dims))
+        kept = [axis for axis in axes if axis in dims]
+        return np.transpose(table, [kept.index(dim) for dim in dims])
+
+    def week_counts(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(semanas ``year * 100 + %W`` ordenadas, conteos) de los incidentes con createdAt."""
+        days = np.flatnonzero(self._day_counts)
+        weeks = IncidentFrame.week_of((days + self._first_day) * SECONDS_PER_DAY)
+        unique_weeks, inverse = np.unique(weeks, return_inverse=True)
+        return unique_weeks, np.bincount(
+            inverse, weights=self._day_counts[days], minlength=unique_weeks.size).astype(np.int64)
@@ -0,0 +1,253 @@
+"""
+Representación columnar en memoria de incidentes para analíticas vectorizadas.
+
+Los items de DynamoDB llegan como diccionarios con valores ``Decimal``; aquí se
+convierten una sola vez a arreglos NumPy (timestamps y contadores) y a códigos
+categóricos codificados por diccionario (type, location, status, urgency, ...).
+"""
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+CATEGORICAL_COLUMNS = (
+    "type",
+    "location",
+    "status",
+    "urgency",
+    "priority",
+    "reportedBy",
+    "assignedTo",
+)
+NUMERIC_COLUMNS = (
+    "createdAt",
+    "updatedAt",
+    "closedAt",
+    "significanceCount",
+)
+
+SECONDS_PER_HOUR = 3600
+SECONDS_PER_DAY = 86400
+# 1970-01-01 fue jueves (lunes = 0)
+_EPOCH_WEEKDAY = 3
+
+
+def to_epoch(value: Any) -> int:
+    """Convierte un timestamp (int, Decimal, str numérico o ISO 8601) a epoch en segundos."""
+    if value is None or value == "":
+        return 0
+    if isinstance(value, (int, float, Decimal)):
+        return int(value)
+    text = str(value).strip()
+    try:
+        return int(float(text))
+    except ValueError:
+        pass
+    try:
+        return int(datetime.fromisoformat(text.replace("Z", "+00:00")).timestamp())
+    except ValueError:
+        return 0
+
+
+class _Dictionary:
+    """Codificador por diccionario: asigna códigos en orden de aparición."""
+
+    def __init__(self) -> None:
+        self.index: Dict[Any, int] = {}
+        self.labels: List[Any] = []
+
+    def encode(self, value: Any) -> int:
+        code = self.index.get(value)
+        if code is None:
+            code = len(self.labels)
+            self.index[value] = code
+            self.labels.append(value)
+        return code
+
+
+class IncidentFrame:
+    """Tabla columnar inmutable de incidentes."""
+
+    def __init__(
+        self,
+        numeric: Dict[str, np.ndarray],
+        codes: Dict[str, np.ndarray],
+        labels: Dict[str, List[Any]],
+    ) -> None:
+        self._numeric = numeric
+        self._codes = codes
+        self._labels = labels
+
+    @classmethod
+    def from_items(cls, items: Iterable[Dict[str, Any]]) -> "IncidentFrame":
+        """Construye el frame en una sola pasada sobre los items de DynamoDB."""
+        dictionaries = {column: _Dictionary() for column in CATEGORICAL_COLUMNS}
+        raw_codes: Dict[str, List[int]] = {column: [] for column in CATEGORICAL_COLUMNS}
+        raw_numeric: Dict[str, List[int]] = {column: [] for column in NUMERIC_COLUMNS}
+
+        for item in items:
+            for column in CATEGORICAL_COLUMNS:
+                value = item.get(column)
+                if value == "":
+                    value = None
+                raw_codes[column].append(dictionaries[column].encode(value))
+            raw_numeric["createdAt"].append(to_epoch(item.get("createdAt")))
+            raw_numeric["updatedAt"].append(to_epoch(item.get("updatedAt")))
+            raw_numeric["closedAt"].append(to_epoch(item.get("closedAt")))
+            raw_numeric["significanceCount"].append(
+                int(item.get("significanceCount") or 0))
+
+        numeric = {
+            column: np.asarray(values, dtype=np.int64)
+            for column, values in raw_numeric.items()
+        }
+        codes = {
+            column: np.asarray(values, dtype=np.int32)
+            for column, values in raw_codes.items()
+        }
+        labels = {column: dictionaries[column].labels for column in CATEGORICAL_COLUMNS}
+        return cls(numeric, codes, labels)
+
+    def __len__(self) -> int:
+        return int(self._numeric["createdAt"].shape[0])
+
+    # ------------------------------------------------------------------
+    # Acceso a columnas
+    # ------------------------------------------------------------------
+    def values(self, column: str) -> np.ndarray:
+        return self._numeric[column]
+
+    def codes(self, column: str) -> np.ndarray:
+        return self._codes[column]
+
+    def labels(self, column: str, default: Any = None) -> List[Any]:
+        """Etiquetas por código; los valores ausentes se reemplazan por ``default``."""
+        return [default if label is None else label for label in self._labels[column]]
+
+    def code_of(self, column: str, label: Any) -> int:
+        """Código de una etiqueta o -1 si no aparece en el frame."""
+        try:
+            return self._labels[column].index(label)
+        except ValueError:
+            return -1
+
+    def filter(self, mask: np.ndarray) -> "IncidentFrame":
+        """Subconjunto de filas que cumplen ``mask`` (comparte los diccionarios)."""
+        numeric = {column: values[mask] for column, values in self._numeric.items()}
+        codes = {column: values[mask] for column, values in self._codes.items()}
+        return IncidentFrame(numeric, codes, self._labels)
+
+    def between(self, start: Optional[int] = None, end: Optional[int] = None) -> "IncidentFrame":
+        """Filtra por ``createdAt`` en el rango [start, end)."""
+        created = self._numeric["createdAt"]
+        mask = np.ones(created.shape[0], dtype=bool)
+        if start is not None:
+            mask &= created >= start
+        if end is not None:
+            mask &= created < end
+        return self.filter(mask)
+
+    # ------------------------------------------------------------------
+    # Buckets de tiempo (UTC)
+    # ------------------------------------------------------------------
+    def event_time(self) -> np.ndarray:
+        """``createdAt`` con ``updatedAt`` como respaldo cuando falta."""
+        created = self._numeric["createdAt"]
+        return np.where(created > 0, created, self._numeric["updatedAt"])
+
+    def has_time(self) -> np.ndarray:
+        return self._numeric["createdAt"] > 0
+
+    @staticmethod
+    def hour_of(timestamps: np.ndarray) -> np.ndarray:
+        return (timestamps // SECONDS_PER_HOUR) % 24
+
+    @staticmethod
+    def day_of(timestamps: np.ndarray) -> np.ndarray:
+        """Días desde epoch."""
+        return timestamps // SECONDS_PER_DAY
+
+    @staticmethod
+    def weekday_of(timestamps: np.ndarray) -> np.ndarray:
+        """Día de la semana con lunes = 0, igual que ``datetime.weekday()``."""
+        return (timestamps // SECONDS_PER_DAY + _EPOCH_WEEKDAY) % 7
+
+    @staticmethod
+    def week_of(timestamps: np.ndarray) -> np.ndarray:
+        """Semana como ``year * 100 + %W`` (semanas iniciadas en lunes)."""
+        days = (timestamps // SECONDS_PER_DAY).astype("datetime64[D]")
+        years = days.astype("datetime64[Y]")
+        year_day = (days - years).astype(np.int64)
+        weekday = IncidentFrame.weekday_of(timestamps)
+        week = (year_day + 7 - weekday) // 7
+        return (years.astype(np.int64) + 1970) * 100 + week
+
+    def hours(self) -> np.ndarray:
+        return self.hour_of(self._numeric["createdAt"])
+
+    def weekdays(self) -> np.ndarray:
+        return self.weekday_of(self._numeric["createdAt"])
+
+    def days(self) -> np.ndarray:
+        return self.day_of(self._numeric["createdAt"])
+
+    def weeks(self) -> np.ndarray:
+        return self.week_of(self._numeric["createdAt"])
+
+    # ------------------------------------------------------------------
+    # Agregaciones vectorizadas
+    # ------------------------------------------------------------------
+    def count_by(self, column: str, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Conteos por código categórico (índice = código)."""
+        codes = self._codes[column]
+        if mask is not None:
+            codes = codes[mask]
+        return np.bincount(codes, minlength=len(self._labels[column]))
+
+    def sum_by(self, column: str, values: np.ndarray) -> np.ndarray:
+        return np.bincount(
+            self._codes[column],
+            weights=values,
+            minlength=len(self._labels[column]),
+        )
+
+    def max_by(self, column: str, values: np.ndarray) -> np.ndarray:
+        result = np.zeros(len(self._labels[column]), dtype=values.dtype)
+        np.maximum.at(result, self._codes[column], values)
+        return result
+
+    def crosstab(self, row_column: str, col_column: str) -> np.ndarray:
+        """Matriz de conteos ``[código fila, código columna]``."""
+        rows = len(self._labels[row_column])
+        cols = len(self._labels[col_column])
+        flat = self._codes[row_column].astype(np.int64) * cols + self._codes[col_column]
+        return np.bincount(flat, minlength=rows * cols).reshape(rows, cols)
+
+    def top_k(
+        self,
+        column: str,
+        k: Optional[int] = None,
+        default: Any = None,
+        mask: Optional[np.ndarray] = None,
+    ) -> List[Tuple[Any, int]]:
+        """Pares (etiqueta, conteo) ordenados por conteo descendente."""
+        return top_k_counts(self.count_by(column, mask), self.labels(column, default), k)
+
+
+def top_k_counts(
+    counts: np.ndarray,
+    labels: Sequence[Any],
+    k: Optional[int] = None,
+) -> List[Tuple[Any, int]]:
+    """Ordena conteos de forma descendente y estable, omitiendo ceros."""
+    order = np.argsort(-counts, kind="stable")
+    order = order[counts[order] > 0]
+    if k is not None:
+        order = order[:k]
+    return [(labels[code], int(counts[code])) for code in order]
+
+
+def value_counts(keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Group-by genérico sobre una columna numérica: (claves únicas, conteos)."""
+    return np.unique(keys, return_counts=True)
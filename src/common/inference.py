@@ -0,0 +1,128 @@
+"""
+Cliente del endpoint de SageMaker para las predicciones.
+
+Todas las combinaciones (ubicación, hora, día de la semana) a evaluar se envían
+en una sola invocación. El cliente usa timeouts cortos y un circuit breaker por
+contenedor: tras ``SAGEMAKER_BREAKER_FAILURES`` fallos seguidos se deja de
+llamar al endpoint durante ``SAGEMAKER_BREAKER_COOLDOWN_SECONDS`` y las
+predicciones usan la heurística de inmediato.
+
+``SAGEMAKER_RUNTIME_URL`` redirige el cliente a otro host, p. ej. al modelo
+local de ``scripts/local_model_server.py``.
+
+Contrato del endpoint (JSON):
+    request:  {"features": {...}, "instances": [{"location", "hour", "dayOfWeek"}, ...]}
+    response: {"predictions": [{...}, ...], ...}  (una predicción por instancia)
+"""
+import json
+import os
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+
+CONNECT_TIMEOUT_SECONDS = float(os.environ.get("SAGEMAKER_CONNECT_TIMEOUT_SECONDS", "1"))
+READ_TIMEOUT_SECONDS = float(os.environ.get("SAGEMAKER_READ_TIMEOUT_SECONDS", "2"))
+BREAKER_FAILURES = int(os.environ.get("SAGEMAKER_BREAKER_FAILURES", "3"))
+BREAKER_COOLDOWN_SECONDS = float(os.environ.get("SAGEMAKER_BREAKER_COOLDOWN_SECONDS", "60"))
+# Límite de instancias por invocación (el payload de SageMaker admite 6 MB)
+MAX_INSTANCES = 500
+
+
+@lru_cache(maxsize=1)
+def _runtime():
+    config = Config(
+        connect_timeout=CONNECT_TIMEOUT_SECONDS,
+        read_timeout=READ_TIMEOUT_SECONDS,
+        # Un solo reintento: en el peor caso ~2 timeouts + backoff (< 6 s), y
+        # el fallback heurístico es mejor que seguir esperando
+        retries={"total_max_attempts": 2, "mode": "standard"},
+    )
+    return boto3.client(
+        "sagemaker-runtime",
+        endpoint_url=os.environ.get("SAGEMAKER_RUNTIME_URL") or None,
+        config=config,
+    )
+
+
+class CircuitBreaker:
+    """Abre el circuito tras ``failures`` fallos seguidos durante ``cooldown`` segundos."""
+
+    def __init__(self, failures: int, cooldown: float) -> None:
+        self.failures = failures
+        self.cooldown = cooldown
+        self._consecutive = 0
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Cerrado, o abierto con el cooldown vencido (se deja pasar un intento)."""
+        with self._lock:
+            return time.monotonic() >= self._open_until
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._consecutive = 0
+            self._open_until = 0.0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._consecutive += 1
+            if self._consecutive >= self.failures:
+                self._open_until = time.monotonic() + self.cooldown
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return "open" if time.monotonic() < self._open_until else "closed"
+
+
+_breaker = CircuitBreaker(BREAKER_FAILURES, BREAKER_COOLDOWN_SECONDS)
+
+
+def endpoint_name() -> Optional[str]:
+    return os.environ.get("SAGEMAKER_ENDPOINT_NAME") or None
+
+
+def score_instances(
+    features: Dict[str, Any],
+    instances: List[Dict[str, Any]],
+) -> Optional[Dict[str, Any]]:
+    """
+    Evalúa todas las instancias en una sola invocación.
+
+    Returns:
+        La respuesta del endpoint con ``predictions`` alineado a ``instances``,
+        o None si no hay endpoint, el circuito está abierto o la llamada falla.
+    """
+    endpoint = endpoint_name()
+    if not endpoint or not instances or not _breaker.allow():
+        return None
+
+    started = time.monotonic()
+    try:
+        response = _runtime().invoke_endpoint(
+            EndpointName=endpoint,
+            ContentType="application/json",
+            Accept="application/json",
+            Body=json.dumps(
+                {"features": features, "instances": instances[:MAX_INSTANCES]},
+                default=str,
+            ).encode("utf-8"),
+        )
+        result = json.loads(response["Body"].read().decode("utf-8"))
+        predictions = result.get("predictions") if isinstance(result, dict) else None
+        if not isinstance(predictions, list) or len(predictions) != len(instances[:MAX_INSTANCES]):
+            raise ValueError("La respuesta no trae una predicción por instancia")
+    except (BotoCoreError, ClientError, ValueError) as exc:
+        _breaker.record_failure()
+        print(f"Error invocando SageMaker ({endpoint}, breaker {_breaker.state}): {exc}")
+        return None
+
+    _breaker.record_success()
+    result["latencyMs"] = round((time.monotonic() - started) * 1000)
+    return result
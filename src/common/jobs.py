@@ -0,0 +1,238 @@
+"""
+Jobs asíncronos de analítica.
+
+``POST /analytics/jobs`` registra el job en DynamoDB e invoca al worker de forma
+asíncrona; el worker guarda el resultado en S3, actualiza el estado y notifica
+por WebSocket (``analytics.job.completed``) al usuario que lo solicitó.
+
+Las exportaciones (``POST /analytics/export``) también son jobs: el worker
+reporta el avance en ``progress`` y al terminar envía ``export.ready`` con la
+URL de descarga.
+"""
+import json
+import os
+import uuid
+from functools import lru_cache
+from time import time
+from typing import Any, Dict, Optional
+
+import boto3
+
+from src.common.dynamodb import count_active_jobs, get_job, put_job, update_job
+from src.common.response import DecimalEncoder
+from src.common.websocket import notify_user
+
+JOB_ANALYSES = ("athena", "predictions", "rollup", "export")
+JOB_TTL_SECONDS = 7 * 24 * 3600
+# Timeout del worker: un job pendiente o en ejecución más antiguo ya no corre
+JOB_MAX_RUNTIME_SECONDS = 900
+# Resultados más grandes se entregan como URL prefirmada
+INLINE_RESULT_BYTES = 1_000_000
+RESULT_URL_EXPIRATION = 3600
+JOB_COMPLETED_EVENT = "analytics.job.completed"
+EXPORT_READY_EVENT = "export.ready"
+# Evento WebSocket por tipo de análisis (default JOB_COMPLETED_EVENT)
+JOB_EVENTS = {"export": EXPORT_READY_EVENT}
+# Jobs simultáneos permitidos por usuario y tipo de análisis
+JOB_CONCURRENCY_LIMITS = {
+    "export": int(os.environ.get("EXPORT_MAX_CONCURRENT_JOBS", "2")),
+}
+
+
+class JobLimitError(Exception):
+    """Raised when a user already has the maximum number of active jobs."""
+
+
+class JobStartError(Exception):
+    """Raised when the worker could not be invoked; the job is marked failed."""
+
+    def __init__(self, job_id: str, message: str) -> None:
+        super().__init__(message)
+        self.job_id = job_id
+
+
+@lru_cache(maxsize=1)
+def _lambda():
+    return boto3.client("lambda")
+
+
+@lru_cache(maxsize=1)
+def _s3():
+    return boto3.client("s3")
+
+
+def _results_bucket() -> str:
+    return os.environ["ANALYTICS_RESULTS_BUCKET"]
+
+
+def create_job(analysis: str, params: Dict[str, Any], requested_by: str) -> Dict[str, Any]:
+    """Registra un job pendiente e invoca al worker sin esperar el resultado."""
+    if analysis not in JOB_ANALYSES:
+        raise ValueError(f"analysis debe ser uno de: {', '.join(JOB_ANALYSES)}")
+    now = int(time())
+    limit = JOB_CONCURRENCY_LIMITS.get(analysis)
+    if limit and count_active_jobs(requested_by, now - JOB_MAX_RUNTIME_SECONDS, analysis) >= limit:
+        raise JobLimitError(
+            f"Ya tienes {limit} jobs de {analysis} en curso; espera a que terminen")
+    job = {
+        "jobId": uuid.uuid4().hex,
+        "analysis": analysis,
+        # JSON para no convertir floats a Decimal en DynamoDB
+        "params": json.dumps(params, cls=DecimalEncoder),
+        "status": "pending",
+        "requestedBy": requested_by,
+        "createdAt": now,
+        "updatedAt": now,
+        "expiresAt": now + JOB_TTL_SECONDS,
+    }
+    put_job(job)
+    try:
+        _lambda().invoke(
+            FunctionName=os.environ["JOBS_WORKER_FUNCTION"],
+            InvocationType="Event",
+            Payload=json.dumps({"jobId": job["jobId"]}).encode("utf-8"),
+        )
+    except Exception as exc:
+        # Sin worker el job nunca correría y seguiría contando como activo
+        update_job(job["jobId"], {
+            "status": "failed",
+            "finishedAt": int(time()),
+            "error": f"No se pudo iniciar el job: {exc}",
+        })
+        raise JobStartError(job["jobId"], f"No se pudo iniciar el job: {exc}") from exc
+    return job
+
+
+def job_params(job: Dict[str, Any]) -> Dict[str, Any]:
+    return json.loads(job.get("params") or "{}")
+
+
+def start_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Marca el job como en ejecución. Retorna None si no existe o ya fue
+    procesado (la invocación asíncrona puede repetirse).
+    """
+    job = get_job(job_id)
+    if not job or job.get("status") != "pending":
+        return None
+    return update_job(job_id, {"status": "running", "startedAt": int(time())})
+
+
+def report_progress(job: Dict[str, Any], progress: Dict[str, Any]) -> None:
+    """Guarda el avance del job (no interrumpe el trabajo si falla)"""
+    try:
+        update_job(job["jobId"], {"progress": progress})
+    except Exception as exc:
+        print(f"Error guardando avance del job {job['jobId']}: {exc}")
+
+
+def complete_job(
+    job: Dict[str, Any],
+    result: Dict[str, Any],
+    attributes: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Guarda el resultado y marca el job como exitoso. ``attributes`` se agregan
+    al job (p. ej. ``exportKey`` con el archivo generado).
+    """
+    body = json.dumps(result, cls=DecimalEncoder).encode("utf-8")
+    key = f"jobs/{job['jobId']}.json"
+    _s3().put_object(
+        Bucket=_results_bucket(),
+        Key=key,
+        Body=body,
+        ContentType="application/json",
+    )
+    job = update_job(job["jobId"], {
+        "status": "succeeded",
+        "finishedAt": int(time()),
+        "resultKey": key,
+        "resultBytes": len(body),
+        **(attributes or {}),
+    })
+    _notify(job)
+    return job
+
+
+def fail_job(job: Dict[str, Any], error: str) -> Dict[str, Any]:
+    job = update_job(job["jobId"], {
+        "status": "failed",
+        "finishedAt": int(time()),
+        "error": error,
+    })
+    _notify(job)
+    return job
+
+
+def expire_stale_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Marca como fallido un job pendiente o en ejecución que superó
+    ``JOB_MAX_RUNTIME_SECONDS`` (el worker excedió su timeout o nunca corrió).
+    """
+    if job.get("status") not in ("pending", "running"):
+        return job
+    since = int(job.get("startedAt") or job["createdAt"])
+    if int(time()) - since <= JOB_MAX_RUNTIME_SECONDS:
+        return job
+    error = "El job excedió el tiempo máximo de ejecución"
+    try:
+        return fail_job(job, error)
+    except Exception as exc:
+        print(f"Error marcando el job {job['jobId']} como vencido: {exc}")
+        return {**job, "status": "failed", "error": error}
+
+
+def _download_url(key: str) -> str:
+    return _s3().generate_presigned_url(
+        "get_object",
+        Params={"Bucket": _results_bucket(), "Key": key},
+        ExpiresIn=RESULT_URL_EXPIRATION,
+    )
+
+
+def _notify(job: Dict[str, Any]) -> None:
+    payload = {
+        "jobId": job["jobId"],
+        "analysis": job["analysis"],
+        "status": job["status"],
+    }
+    try:
+        if job.get("exportKey"):
+            payload["downloadUrl"] = _download_url(job["exportKey"])
+            payload["expiresIn"] = RESULT_URL_EXPIRATION
+        if job.get("error"):
+            payload["error"] = job["error"]
+        event = JOB_EVENTS.get(job["analysis"], JOB_COMPLETED_EVENT)
+        notify_user(job["requestedBy"], event, payload)
+    except Exception as exc:
+        print(f"Error notificando job {job['jobId']}: {exc}")
+
+
+def job_view(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Representación pública del job, con el resultado si ya terminó."""
+    view = {
+        "jobId": job["jobId"],
+        "analysis": job["analysis"],
+        "status": job["status"],
+        "params": job_params(job),
+        "requestedBy": job["requestedBy"],
+        "createdAt": job["createdAt"],
+        "updatedAt": job.get("updatedAt"),
+        "startedAt": job.get("startedAt"),
+        "finishedAt": job.get("finishedAt"),
+    }
+    if job.get("progress"):
+        view["progress"] = job["progress"]
+    if job.get("error"):
+        view["error"] = job["error"]
+    if job.get("status") == "succeeded" and job.get("resultKey"):
+        if int(job.get("resultBytes", 0)) <= INLINE_RESULT_BYTES:
+            response = _s3().get_object(Bucket=_results_bucket(), Key=job["resultKey"])
+            view["result"] = json.loads(response["Body"].read())
+        else:
+            view["resultUrl"] = _download_url(job["resultKey"])
+    # URL nueva en cada consulta: la del resultado guardado puede haber expirado
+    if job.get("status") == "succeeded" and job.get("exportKey"):
+        view["downloadUrl"] = _download_url(job["exportKey"])
+        view["expiresIn"] = RESULT_URL_EXPIRATION
+    return view
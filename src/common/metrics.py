@@ -0,0 +1,45 @@
+"""
+Métricas estructuradas en CloudWatch Embedded Metric Format (EMF).
+
+Cada registro se imprime como una línea JSON en stdout; CloudWatch Logs extrae
+las métricas automáticamente, sin llamadas a ``PutMetricData``.
+"""
+import json
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "AlertaUTEC/Analytics")
+
+
+def emit_metrics(
+    dimensions: Dict[str, str],
+    metrics: Dict[str, Tuple[float, str]],
+    properties: Optional[Dict[str, Any]] = None,
+    namespace: str = METRICS_NAMESPACE,
+) -> None:
+    """
+    Emite un registro EMF.
+
+    Args:
+        dimensions: dimensiones de las métricas (p. ej. ``{"Query": "by_type"}``)
+        metrics: nombre -> (valor, unidad CloudWatch)
+        properties: campos extra consultables en Logs Insights (no son métricas)
+    """
+    record: Dict[str, Any] = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": namespace,
+                "Dimensions": [list(dimensions)],
+                "Metrics": [
+                    {"Name": name, "Unit": unit} for name, (_, unit) in metrics.items()
+                ],
+            }],
+        },
+        **(properties or {}),
+        **dimensions,
+    }
+    for name, (value, _) in metrics.items():
+        record[name] = value
+    print(json.dumps(record, default=str))
@@ -0,0 +1,117 @@
+"""
+Serialización de incidentes a Parquet para el data lake de Athena.
+
+Las columnas se escriben tipadas (timestamps epoch como int64) y comprimidas,
+de modo que las queries de Athena solo lean las columnas que usan.
+
+Las exportaciones (Parquet y JSON Lines) usan ``EXPORT_SCHEMA``: las mismas
+columnas más la lista de media y la cantidad de entradas del historial.
+"""
+import io
+from itertools import islice
+from typing import Any, Dict, Iterable, List, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.common.frame import to_epoch
+
+# Debe coincidir con las columnas de la tabla Glue ``incidents``
+INCIDENT_SCHEMA = pa.schema([
+    ("incidentId", pa.string()),
+    ("type", pa.string()),
+    ("location", pa.string()),
+    ("description", pa.string()),
+    ("urgency", pa.string()),
+    ("priority", pa.string()),
+    ("status", pa.string()),
+    ("reportedBy", pa.string()),
+    ("reporterRole", pa.string()),
+    ("assignedTo", pa.string()),
+    ("createdAt", pa.int64()),
+    ("updatedAt", pa.int64()),
+    ("closedAt", pa.int64()),
+    ("significanceCount", pa.int32()),
+])
+EXPORT_SCHEMA = INCIDENT_SCHEMA.append(
+    pa.field("media", pa.list_(pa.string()))
+).append(pa.field("historyCount", pa.int32()))
+TIMESTAMP_COLUMNS = ("createdAt", "updatedAt", "closedAt")
+ROW_GROUP_SIZE = 100_000
+COMPRESSION = "snappy"
+EXPORT_COMPRESSIONS = ("snappy", "gzip", "zstd", "none")
+# Incidentes por lote al escribir exportaciones en streaming
+EXPORT_BATCH_SIZE = 10_000
+
+
+def _typed_value(item: Dict[str, Any], name: str) -> Any:
+    if name in TIMESTAMP_COLUMNS:
+        return to_epoch(item.get(name)) or None
+    if name == "significanceCount":
+        return int(item.get(name) or 0)
+    return None if item.get(name) in (None, "") else str(item[name])
+
+
+def _column_values(incidents: List[Dict[str, Any]], field: pa.Field) -> List[Any]:
+    return [_typed_value(item, field.name) for item in incidents]
+
+
+def export_record(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Incidente con los tipos de ``EXPORT_SCHEMA`` (serializable a JSON)."""
+    record = {field.name: _typed_value(item, field.name) for field in INCIDENT_SCHEMA}
+    record["media"] = [str(key) for key in item.get("media") or []]
+    record["historyCount"] = len(item.get("history") or [])
+    return record
+
+
+def incidents_to_table(incidents: List[Dict[str, Any]]) -> pa.Table:
+    """Tabla Arrow con el esquema de ``INCIDENT_SCHEMA``, ordenada por createdAt."""
+    incidents = sorted(incidents, key=lambda item: to_epoch(item.get("createdAt")))
+    arrays = [
+        pa.array(_column_values(incidents, field), type=field.type)
+        for field in INCIDENT_SCHEMA
+    ]
+    return pa.Table.from_arrays(arrays, schema=INCIDENT_SCHEMA)
+
+
+def incidents_to_parquet(incidents: List[Dict[str, Any]]) -> bytes:
+    """Serializa una partición de incidentes a Parquet comprimido."""
+    buffer = io.BytesIO()
+    pq.write_table(
+        incidents_to_table(incidents),
+        buffer,
+        compression=COMPRESSION,
+        row_group_size=ROW_GROUP_SIZE,
+        use_dictionary=True,
+        write_statistics=True,
+    )
+    return buffer.getvalue()
+
+
+def write_export_parquet(
+    incidents: Iterable[Dict[str, Any]],
+    path: str,
+    compression: str = COMPRESSION,
+    compression_level: Optional[int] = None,
+) -> int:
+    """
+    Escribe los incidentes a un Parquet con ``EXPORT_SCHEMA`` por lotes (un
+    row group por lote), sin cargarlos todos. Retorna la cantidad escrita.
+    """
+    count = 0
+    incidents = iter(incidents)
+    with pq.ParquetWriter(
+        path,
+        EXPORT_SCHEMA,
+        compression=compression,
+        compression_level=compression_level,
+        use_dictionary=True,
+        write_statistics=True,
+    ) as writer:
+        while True:
+            batch = [export_record(item) for item in islice(incidents, EXPORT_BATCH_SIZE)]
+            if not batch:
+                break
+            writer.write_table(pa.Table.from_pylist(batch, schema=EXPORT_SCHEMA))
+            count += len(batch)
+    return count
@@ -0,0 +1,350 @@
+"""
+Reporte PDF completo de incidentes (reportlab).
+
+Todos los incidentes se listan en tablas compactas de ``ROWS_PER_TABLE`` filas
+con estilos compartidos. Las tablas se generan a medida que reportlab consume
+los flowables, así que solo unas pocas tablas pendientes existen a la vez; las
+páginas ya dibujadas sí se acumulan en el canvas hasta que se guarda el archivo
+(~9.6 MB con 5.000 filas, ~17.7 MB con 20.000). Por eso el detalle se limita a
+``PDF_MAX_ROWS`` filas (``EXPORT_PDF_MAX_ROWS``); el resumen incluye todos.
+
+El resumen y los gráficos salen de los rollups diarios del rango. Si hay
+filtros por atributo (los rollups no los reflejan) los conteos se agregan en
+la misma pasada que copia las filas a un archivo temporal.
+"""
+import csv
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from src.common.frame import IncidentFrame, to_epoch
+from src.common.rollups import DailyRollup, merge_rollups
+from src.common.time_range import SECONDS_PER_DAY
+
+ROWS_PER_TABLE = 45
+# Filas de detalle por reporte (el canvas conserva las páginas hasta guardar)
+PDF_MAX_ROWS = int(os.environ.get("EXPORT_PDF_MAX_ROWS", "20000"))
+# Incidentes por lote al agregar conteos de exportaciones filtradas
+SPOOL_BATCH_SIZE = 5000
+# Flowables pendientes antes de generar la siguiente tabla
+FLOWABLE_LOOKAHEAD = 4
+CHART_TOP_K = 8
+CHART_MAX_DAYS = 60
+ROW_HEADERS = ["Creado", "ID", "Tipo", "Ubicación", "Estado", "Urgencia", "Asignado a"]
+# (campo, ancho máximo en caracteres)
+ROW_FIELDS = (
+    ("incidentId", 8),
+    ("type", 18),
+    ("location", 24),
+    ("status", 12),
+    ("urgency", 8),
+    ("assignedTo", 26),
+)
+
+
+def _reportlab():
+    try:
+        from reportlab import platypus
+    except ImportError:
+        raise Exception(
+            "reportlab no está instalado. Instale con: pip install reportlab")
+    return platypus
+
+
+@lru_cache(maxsize=1)
+def _styles() -> Dict[str, Any]:
+    """Estilos de párrafo y tabla, creados una sola vez por contenedor"""
+    _reportlab()
+    from reportlab.lib import colors
+    from reportlab.lib.enums import TA_CENTER
+    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+    from reportlab.platypus import TableStyle
+
+    sample = getSampleStyleSheet()
+    return {
+        "title": ParagraphStyle(
+            'CustomTitle',
+            parent=sample['Heading1'],
+            fontSize=24,
+            textColor=colors.HexColor('#1a365d'),
+            spaceAfter=30,
+            alignment=TA_CENTER
+        ),
+        "date": ParagraphStyle(
+            'DateStyle',
+            parent=sample['Normal'],
+            fontSize=10,
+            textColor=colors.grey,
+            alignment=TA_CENTER,
+            spaceAfter=20
+        ),
+        "heading": sample['Heading2'],
+        "normal": sample['Normal'],
+        "summary": TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#366092')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 12),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ]),
+        "rows": TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#366092')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 7),
+            ('LEADING', (0, 0), (-1, -1), 8.5),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#edf2f7')]),
+            ('LINEBELOW', (0, 0), (-1, 0), 0.5, colors.grey),
+            ('TOPPADDING', (0, 0), (-1, -1), 1.5),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 1.5),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ]),
+        "barFill": colors.HexColor('#366092'),
+        "lineStroke": colors.HexColor('#c05621'),
+    }
+
+
+class _ChunkedFlowables(list):
+    """
+    Lista de flowables que se rellena desde un generador cuando reportlab la
+    consulta (``len``), manteniendo solo unas pocas tablas pendientes. No
+    acota las páginas ya renderizadas, que el canvas conserva hasta guardar.
+    """
+
+    def __init__(self, initial: List[Any], source: Iterator[Any]) -> None:
+        super().__init__(initial)
+        self._source = source
+
+    def __len__(self) -> int:
+        while self._source is not None and super().__len__() < FLOWABLE_LOOKAHEAD:
+            chunk = next(self._source, None)
+            if chunk is None:
+                self._source = None
+            else:
+                self.append(chunk)
+        return super().__len__()
+
+
+def _truncate(value: Any, width: int) -> str:
+    text = "" if value is None else str(value)
+    return text if len(text) <= width else text[:width - 1] + "…"
+
+
+def pdf_row(incident: Dict[str, Any]) -> List[str]:
+    created_at = to_epoch(incident.get("createdAt"))
+    created = (
+        datetime.fromtimestamp(created_at, tz=timezone.utc).strftime("%Y-%m-%d %H:%M")
+        if created_at else "N/A"
+    )
+    return [created] + [_truncate(incident.get(field), width) for field, width in ROW_FIELDS]
+
+
+def _row_tables(rows: Iterable[List[str]]) -> Iterator[Any]:
+    platypus = _reportlab()
+    from reportlab.lib.units import inch
+
+    style = _styles()["rows"]
+    col_widths = [0.95 * inch, 0.6 * inch, 1.1 * inch, 1.5 * inch, 0.8 * inch, 0.6 * inch, 1.75 * inch]
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, ROWS_PER_TABLE))
+        if not chunk:
+            return
+        yield platypus.Table([ROW_HEADERS] + chunk, colWidths=col_widths,
+                             repeatRows=1, style=style)
+
+
+def _detail_flowables(counter: "_RowCounter") -> Iterator[Any]:
+    """Tablas de filas y, si se alcanzó el límite, una nota al final"""
+    yield from _row_tables(counter)
+    if counter.truncated:
+        platypus = _reportlab()
+        yield platypus.Paragraph(
+            f"Se listan los primeros {counter.count} incidentes; el resumen incluye "
+            "todos. Para el detalle completo exporte a CSV, Excel, JSON Lines o Parquet.",
+            _styles()["normal"])
+
+
+def _bar_chart(title: str, counts: Dict[str, int]) -> Any:
+    from reportlab.graphics.charts.barcharts import VerticalBarChart
+    from reportlab.graphics.shapes import Drawing, String
+
+    ranked = sorted(counts.items(), key=lambda kv: kv[1], reverse=True)[:CHART_TOP_K]
+    drawing = Drawing(240, 170)
+    drawing.add(String(10, 155, title, fontName="Helvetica-Bold", fontSize=9))
+    chart = VerticalBarChart()
+    chart.x, chart.y, chart.width, chart.height = 30, 35, 200, 110
+    chart.data = [[count for _, count in ranked] or [0]]
+    chart.categoryAxis.categoryNames = [_truncate(label, 10) for label, _ in ranked] or [""]
+    chart.categoryAxis.labels.angle = 30
+    chart.categoryAxis.labels.boxAnchor = "ne"
+    chart.categoryAxis.labels.fontSize = 6
+    chart.valueAxis.valueMin = 0
+    chart.valueAxis.labels.fontSize = 6
+    chart.bars[0].fillColor = _styles()["barFill"]
+    drawing.add(chart)
+    return drawing
+
+
+def _daily_chart(daily: Dict[int, DailyRollup]) -> Optional[Any]:
+    from reportlab.graphics.charts.lineplots import LinePlot
+    from reportlab.graphics.shapes import Drawing, String
+
+    days = sorted(day for day, rollup in daily.items() if rollup.total)[-CHART_MAX_DAYS:]
+    if len(days) < 2:
+        return None
+    drawing = Drawing(480, 160)
+    drawing.add(String(10, 145, f"Incidentes por día (últimos {len(days)} días con actividad)",
+                       fontName="Helvetica-Bold", fontSize=9))
+    plot = LinePlot()
+    plot.x, plot.y, plot.width, plot.height = 40, 30, 420, 100
+    plot.data = [[(day, daily[day].total) for day in days]]
+    plot.lines[0].strokeColor = _styles()["lineStroke"]
+    plot.xValueAxis.valueMin = days[0]
+    plot.xValueAxis.valueMax = days[-1]
+    plot.xValueAxis.labels.fontSize = 6
+    plot.xValueAxis.labelTextFormat = lambda day: datetime.fromtimestamp(
+        day * SECONDS_PER_DAY, tz=timezone.utc).strftime("%m-%d")
+    plot.yValueAxis.valueMin = 0
+    plot.yValueAxis.labels.fontSize = 6
+    drawing.add(plot)
+    return drawing
+
+
+def _summary_flowables(totals: DailyRollup, daily: Dict[int, DailyRollup]) -> List[Any]:
+    platypus = _reportlab()
+    from reportlab.lib.units import inch
+
+    styles = _styles()
+    status_counts = totals.counts["status"]
+    elements = [
+        platypus.Paragraph("Reporte de Incidentes", styles["title"]),
+        platypus.Paragraph(
+            f"Generado: {datetime.utcnow().strftime('%Y-%m-%d %H:%M UTC')}", styles["date"]),
+        platypus.Spacer(1, 0.3 * inch),
+        platypus.Table([
+            ["Total", "Pendientes", "En Atención", "Resueltos"],
+            [totals.total, status_counts.get("pendiente", 0),
+             status_counts.get("en_atencion", 0), status_counts.get("resuelto", 0)],
+        ], style=styles["summary"]),
+        platypus.Spacer(1, 0.3 * inch),
+        platypus.Table([
+            [_bar_chart("Por tipo", totals.counts["type"]),
+             _bar_chart("Por urgencia", totals.counts["urgency"])],
+            [_bar_chart("Por estado", status_counts),
+             _bar_chart("Por ubicación", totals.counts["location"])],
+        ]),
+    ]
+    daily_chart = _daily_chart(daily)
+    if daily_chart is not None:
+        elements.append(daily_chart)
+    elements.append(platypus.PageBreak())
+    elements.append(platypus.Paragraph("Detalle de Incidentes", styles["heading"]))
+    return elements
+
+
+def _spool_rows(incidents: Iterable[Dict[str, Any]], spool) -> Dict[int, DailyRollup]:
+    """Copia las filas al archivo temporal y agrega los rollups por día"""
+    writer = csv.writer(spool)
+    daily: Dict[int, DailyRollup] = {}
+    incidents = iter(incidents)
+    while True:
+        batch = list(islice(incidents, SPOOL_BATCH_SIZE))
+        if not batch:
+            break
+        writer.writerows(pdf_row(incident) for incident in batch)
+        for day, rollup in DailyRollup.from_frame(IncidentFrame.from_items(batch)).items():
+            daily[day] = daily[day].merge(rollup) if day in daily else rollup
+    spool.seek(0)
+    return daily
+
+
+def _draw_page_number(canvas, doc) -> None:
+    canvas.saveState()
+    canvas.setFont("Helvetica", 7)
+    canvas.drawRightString(doc.pagesize[0] - doc.rightMargin, doc.bottomMargin / 2,
+                           f"Página {doc.page}")
+    canvas.restoreState()
+
+
+def write_pdf(
+    incidents: Iterable[Dict[str, Any]],
+    path: str,
+    daily: Optional[Dict[int, DailyRollup]] = None,
+    max_rows: int = PDF_MAX_ROWS,
+) -> Dict[str, Any]:
+    """
+    Escribe el reporte en ``path``.
+
+    Args:
+        incidents: incidentes a detallar (en el orden en que se listan)
+        daily: rollups por día del mismo conjunto; si se omite se agregan a
+            partir de ``incidents``
+        max_rows: filas de detalle como máximo; el resto solo cuenta en el resumen
+
+    Returns:
+        métricas de la generación (incidentes listados, si se truncó, páginas,
+        segundos, páginas/seg)
+    """
+    platypus = _reportlab()
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import inch
+
+    started = time.monotonic()
+    with tempfile.TemporaryFile("w+", newline="", encoding="utf-8") as spool:
+        if daily is None:
+            daily = _spool_rows(incidents, spool)
+            rows: Iterable[List[str]] = csv.reader(spool)
+        else:
+            rows = (pdf_row(incident) for incident in incidents)
+
+        totals = merge_rollups(daily.values())
+        counter = _RowCounter(rows, max_rows)
+        doc = platypus.SimpleDocTemplate(
+            path, pagesize=A4,
+            leftMargin=0.5 * inch, rightMargin=0.5 * inch,
+            topMargin=0.6 * inch, bottomMargin=0.6 * inch,
+            title="Reporte de Incidentes",
+        )
+        flowables = _ChunkedFlowables(_summary_flowables(totals, daily), _detail_flowables(counter))
+        doc.build(flowables, onFirstPage=_draw_page_number, onLaterPages=_draw_page_number)
+
+    seconds = time.monotonic() - started
+    return {
+        "incidents": counter.count,
+        "truncated": counter.truncated,
+        "pages": doc.page,
+        "buildSeconds": round(seconds, 3),
+        "pagesPerSecond": round(doc.page / seconds, 2) if seconds else None,
+    }
+
+
+class _RowCounter:
+    """Itera hasta ``limit`` filas contando cuántas se renderizaron"""
+
+    def __init__(self, rows: Iterable[List[str]], limit: Optional[int] = None) -> None:
+        self._rows = iter(rows)
+        self._limit = limit
+        self.count = 0
+        self.truncated = False
+
+    def __iter__(self) -> "_RowCounter":
+        return self
+
+    def __next__(self) -> List[str]:
+        if self._limit is not None and self.count >= self._limit:
+            # Se mira una fila más (una sola vez) para saber si quedaron fuera
+            if self._rows is not None:
+                self.truncated = next(self._rows, None) is not None
+                self._rows = None
+            raise StopIteration
+        row = next(self._rows)
+        self.count += 1
+        return row
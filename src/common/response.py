@@ -1,3 +1,4 @@
+import hashlib
 import json
 from decimal import Decimal
 from typing import Any, Dict, Optional
@@ -16,19 +17,28 @@ class DecimalEncoder(json.JSONEncoder):
         return super(DecimalEncoder, self).default(obj)
 
 
+def _default_headers() -> Dict[str, str]:
+    return {
+        "Content-Type": "application/json",
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Allow-Headers": "Content-Type,Authorization,X-Requested-With,If-None-Match",
+        "Access-Control-Allow-Methods": "GET,POST,PATCH,PUT,DELETE,OPTIONS",
+        "Access-Control-Expose-Headers": "ETag",
+        "Access-Control-Max-Age": "300",
+    }
+
+
 def json_response(
     status_code: int,
     body: Dict[str, Any],
     headers: Optional[Dict[str, str]] = None,
+    etag: Optional[str] = None,
 ) -> Dict[str, Any]:
     """Builds a standard API Gateway HTTP response."""
-    default_headers = {
-        "Content-Type": "application/json",
-        "Access-Control-Allow-Origin": "*",
-        "Access-Control-Allow-Headers": "Content-Type,Authorization,X-Requested-With",
-        "Access-Control-Allow-Methods": "GET,POST,PATCH,PUT,DELETE,OPTIONS",
-        "Access-Control-Max-Age": "300",
-    }
+    default_headers = _default_headers()
+    if etag:
+        default_headers["ETag"] = etag
+        default_headers["Cache-Control"] = "private, no-cache"
     if headers:
         default_headers.update(headers)
     return {
@@ -36,3 +46,30 @@ def json_response(
         "headers": default_headers,
         "body": json.dumps(body, cls=DecimalEncoder),
     }
+
+
+def compute_etag(*parts: Any) -> str:
+    """Builds a strong ETag from a data-version marker and the request variant."""
+    digest = hashlib.sha256(
+        json.dumps(parts, cls=DecimalEncoder, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def not_modified(event: Dict[str, Any], etag: str) -> Optional[Dict[str, Any]]:
+    """Returns a 304 response when If-None-Match matches ``etag``, otherwise None."""
+    headers = event.get("headers") or {}
+    if_none_match = headers.get("if-none-match") or headers.get("If-None-Match")
+    if not if_none_match:
+        return None
+    candidates = {
+        tag.strip()[2:] if tag.strip().startswith("W/") else tag.strip()
+        for tag in if_none_match.split(",")
+    }
+    if "*" not in candidates and etag not in candidates:
+        return None
+    response_headers = _default_headers()
+    response_headers["ETag"] = etag
+    response_headers["Cache-Control"] = "private, no-cache"
+    del response_headers["Content-Type"]
+    return {"statusCode": 304, "headers": response_headers, "body": ""}
@@ -0,0 +1,316 @@
+"""
+Rollups diarios pre-materializados de incidentes.
+
+Un job programado (``buildDailyRollups``) guarda por día de creación los
+conteos por tipo, ubicación, urgencia, estado y personal en la tabla de
+estadísticas (``rollup#daily``) y una copia JSON en ``rollups/daily/`` del
+bucket de datos. Las lecturas de rangos históricos combinan esos rollups y solo
+agregan incidentes crudos para la parte del rango que aún no está
+materializada (el día en curso).
+
+El mismo job guarda por día las tablas de features de las predicciones
+(``features#daily``, ver ``src.common.features``).
+"""
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import lru_cache
+from time import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import boto3
+import numpy as np
+
+from src.common.dynamodb import (
+    SECONDS_PER_DAY,
+    batch_get_stat_items,
+    day_bucket,
+    day_buckets_between,
+    get_sync_watermark,
+    list_incidents_between,
+    put_stat_item,
+)
+from src.common.features import IncidentFeatures
+from src.common.frame import IncidentFrame
+
+ROLLUP_STAT_KEY = "rollup#daily"
+ROLLUP_WATERMARK = "rollups"
+ROLLUP_PREFIX = "rollups/daily"
+FEATURES_STAT_KEY = "features#daily"
+# (dimensión del rollup, columna del frame, etiqueta para valores ausentes)
+ROLLUP_DIMENSIONS = (
+    ("type", "type", "unknown"),
+    ("location", "location", "unknown"),
+    ("urgency", "urgency", "unknown"),
+    ("status", "status", "unknown"),
+    ("staff", "assignedTo", None),
+)
+BUILD_WORKERS = 8
+
+
+@lru_cache(maxsize=1)
+def _s3():
+    return boto3.client("s3")
+
+
+class DailyRollup:
+    """Conteos de un día (o la suma de varios días)."""
+
+    def __init__(self) -> None:
+        self.total = 0
+        self.counts: Dict[str, Dict[str, int]] = {
+            dimension: {} for dimension, _, _ in ROLLUP_DIMENSIONS
+        }
+        # personal -> estado -> conteo
+        self.staff_status: Dict[str, Dict[str, int]] = {}
+        # tipo -> [suma, máximo] de significanceCount
+        self.significance: Dict[str, List[int]] = {}
+        self.hours = [0] * 24
+
+    @classmethod
+    def from_frame(cls, frame: IncidentFrame) -> Dict[int, "DailyRollup"]:
+        """Rollups por día de creación (días desde epoch) en una pasada ordenada."""
+        timed = frame.filter(frame.has_time())
+        days = timed.days()
+        order = np.argsort(days, kind="stable")
+        timed = timed.filter(order)
+        unique_days, offsets = np.unique(days[order], return_index=True)
+        bounds = list(offsets[1:]) + [len(timed)]
+
+        rollups: Dict[int, DailyRollup] = {}
+        for day, first, last in zip(unique_days, offsets, bounds):
+            rollups[int(day)] = cls._from_day(timed.filter(slice(first, last)))
+        return rollups
+
+    @classmethod
+    def _from_day(cls, frame: IncidentFrame) -> "DailyRollup":
+        rollup = cls()
+        rollup.total = len(frame)
+        for dimension, column, default in ROLLUP_DIMENSIONS:
+            rollup.counts[dimension] = {
+                label: count
+                for label, count in frame.top_k(column, default=default)
+                if label is not None
+            }
+
+        staff_labels = frame.labels("assignedTo")
+        status_labels = frame.labels("status", "unknown")
+        matrix = frame.crosstab("assignedTo", "status")
+        for staff_code, staff in enumerate(staff_labels):
+            if staff is None or not matrix[staff_code].any():
+                continue
+            rollup.staff_status[staff] = {
+                status_labels[code]: int(count)
+                for code, count in enumerate(matrix[staff_code]) if count
+            }
+
+        significance = frame.values("significanceCount")
+        sums = frame.sum_by("type", significance)
+        maxima = frame.max_by("type", significance)
+        totals = frame.count_by("type")
+        for code, label in enumerate(frame.labels("type", "unknown")):
+            if totals[code]:
+                rollup.significance[label] = [int(sums[code]), int(maxima[code])]
+
+        hours = np.bincount(frame.hours(), minlength=24)
+        rollup.hours = [int(count) for count in hours]
+        return rollup
+
+    def merge(self, other: "DailyRollup") -> "DailyRollup":
+        merged = DailyRollup()
+        merged.total = self.total + other.total
+        for dimension in merged.counts:
+            merged.counts[dimension] = _add_counts(
+                self.counts.get(dimension, {}), other.counts.get(dimension, {}))
+        for staff in set(self.staff_status) | set(other.staff_status):
+            merged.staff_status[staff] = _add_counts(
+                self.staff_status.get(staff, {}), other.staff_status.get(staff, {}))
+        for label in set(self.significance) | set(other.significance):
+            total_a, max_a = self.significance.get(label, (0, 0))
+            total_b, max_b = other.significance.get(label, (0, 0))
+            merged.significance[label] = [total_a + total_b, max(max_a, max_b)]
+        merged.hours = [a + b for a, b in zip(self.hours, other.hours)]
+        return merged
+
+    def to_item(self) -> Dict[str, Any]:
+        return {
+            "total": self.total,
+            "counts": self.counts,
+            "staffStatus": self.staff_status,
+            "significance": self.significance,
+            "hours": self.hours,
+        }
+
+    @classmethod
+    def from_item(cls, item: Optional[Dict[str, Any]]) -> "DailyRollup":
+        rollup = cls()
+        if not item:
+            return rollup
+        rollup.total = int(item.get("total", 0))
+        for dimension, counts in (item.get("counts") or {}).items():
+            rollup.counts[dimension] = {label: int(count) for label, count in counts.items()}
+        rollup.staff_status = {
+            staff: {status: int(count) for status, count in counts.items()}
+            for staff, counts in (item.get("staffStatus") or {}).items()
+        }
+        rollup.significance = {
+            label: [int(total), int(maximum)]
+            for label, (total, maximum) in (item.get("significance") or {}).items()
+        }
+        rollup.hours = [int(count) for count in item.get("hours") or [0] * 24]
+        return rollup
+
+
+def _add_counts(a: Dict[str, int], b: Dict[str, int]) -> Dict[str, int]:
+    merged = dict(a)
+    for label, count in b.items():
+        merged[label] = merged.get(label, 0) + count
+    return merged
+
+
+def merge_rollups(rollups: Iterable[DailyRollup]) -> DailyRollup:
+    merged = DailyRollup()
+    for rollup in rollups:
+        merged = merged.merge(rollup)
+    return merged
+
+
+def _day_label(day: int) -> str:
+    return datetime.fromtimestamp(day * SECONDS_PER_DAY, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+def _save_rollup(day: int, rollup: DailyRollup) -> None:
+    item = rollup.to_item()
+    put_stat_item(ROLLUP_STAT_KEY, day_bucket(day * SECONDS_PER_DAY), item)
+    _s3().put_object(
+        Bucket=os.environ["ANALYTICS_DATA_BUCKET"],
+        Key=f"{ROLLUP_PREFIX}/{_day_label(day)}.json",
+        Body=json.dumps({"day": _day_label(day), **item}).encode("utf-8"),
+        ContentType="application/json",
+    )
+
+
+def _save_features(day: int, features: IncidentFeatures) -> None:
+    put_stat_item(FEATURES_STAT_KEY, day_bucket(day * SECONDS_PER_DAY), features.to_item())
+
+
+def build_rollups_between(start: int, end: int) -> int:
+    """
+    Recalcula y guarda los rollups y features de los días completos que cubren
+    [start, end)
+    """
+    first_day = start // SECONDS_PER_DAY
+    last_day = (end - 1) // SECONDS_PER_DAY
+    frame = IncidentFrame.from_items(list_incidents_between(
+        first_day * SECONDS_PER_DAY, (last_day + 1) * SECONDS_PER_DAY))
+    rollups = DailyRollup.from_frame(frame)
+    features = IncidentFeatures.by_day(frame)
+
+    def _save_day(day: int) -> None:
+        _save_rollup(day, rollups[day])
+        _save_features(day, features[day])
+
+    with ThreadPoolExecutor(max_workers=BUILD_WORKERS) as executor:
+        list(executor.map(_save_day, rollups))
+    return len(rollups)
+
+
+def rollup_coverage_end() -> Optional[int]:
+    """
+    Los rollups reflejan los días anteriores al día de la última ejecución del
+    job; None si nunca se construyeron.
+    """
+    watermark = get_sync_watermark(ROLLUP_WATERMARK)
+    if not watermark:
+        return None
+    return watermark - watermark % SECONDS_PER_DAY
+
+
+def _materialized_range(start: int, end: int) -> Tuple[int, int, Optional[int]]:
+    """
+    Días completos de [start, end) ya materializados: (inicio, fin, cobertura)
+    """
+    coverage_end = rollup_coverage_end()
+    rollup_start = -(-start // SECONDS_PER_DAY) * SECONDS_PER_DAY
+    rollup_end = min(end - end % SECONDS_PER_DAY, coverage_end or 0)
+    return rollup_start, rollup_end, coverage_end
+
+
+def _day_of_bucket(bucket: str) -> int:
+    return int(datetime.strptime(bucket, "day#%Y-%m-%d")
+               .replace(tzinfo=timezone.utc).timestamp()) // SECONDS_PER_DAY
+
+
+def load_daily_rollups(start: int, end: Optional[int] = None) -> Tuple[Dict[int, DailyRollup], Dict[str, Any]]:
+    """
+    Rollups por día para [start, end): los días completos ya materializados se
+    leen de la tabla de estadísticas y el resto (bordes parciales y días aún no
+    materializados) se agrega desde los incidentes crudos.
+
+    Returns:
+        (rollups por día desde epoch, metadata de fuentes)
+    """
+    end = int(time()) + 1 if end is None else end
+    rollup_start, rollup_end, coverage_end = _materialized_range(start, end)
+
+    daily: Dict[int, DailyRollup] = {}
+    raw_ranges = [(start, end)]
+    if rollup_end > rollup_start:
+        for item in batch_get_stat_items(ROLLUP_STAT_KEY, day_buckets_between(rollup_start, rollup_end)):
+            daily[_day_of_bucket(item["bucket"])] = DailyRollup.from_item(item)
+        raw_ranges = [(start, rollup_start), (rollup_end, end)]
+
+    raw_incidents = 0
+    for range_start, range_end in raw_ranges:
+        if range_end <= range_start:
+            continue
+        frame = IncidentFrame.from_items(list_incidents_between(range_start, range_end))
+        raw_incidents += len(frame)
+        for day, rollup in DailyRollup.from_frame(frame).items():
+            daily[day] = daily[day].merge(rollup) if day in daily else rollup
+
+    sources = {
+        "rollupDays": max(0, (rollup_end - rollup_start) // SECONDS_PER_DAY),
+        "rawIncidents": raw_incidents,
+        "rollupsThrough": coverage_end,
+    }
+    return daily, sources
+
+
+def load_features(start: int, end: Optional[int] = None) -> Tuple[IncidentFeatures, Dict[str, Any]]:
+    """
+    Features de predicción para [start, end): combina las tablas diarias ya
+    materializadas con las de los incidentes crudos de los bordes, de modo que
+    el costo no depende del volumen de incidentes del rango.
+
+    Returns:
+        (features combinadas, metadata de fuentes)
+    """
+    end = int(time()) + 1 if end is None else end
+    rollup_start, rollup_end, coverage_end = _materialized_range(start, end)
+
+    parts: List[IncidentFeatures] = []
+    raw_ranges = [(start, end)]
+    if rollup_end > rollup_start:
+        items = batch_get_stat_items(FEATURES_STAT_KEY, day_buckets_between(rollup_start, rollup_end))
+        items.sort(key=lambda item: item["bucket"])
+        parts.extend(IncidentFeatures.from_item(item) for item in items)
+        raw_ranges = [(start, rollup_start), (rollup_end, end)]
+
+    raw_incidents = 0
+    for range_start, range_end in raw_ranges:
+        if range_end <= range_start:
+            continue
+        frame = IncidentFrame.from_items(list_incidents_between(range_start, range_end))
+        raw_incidents += len(frame)
+        # Orden cronológico: el borde inicial va antes de los días materializados
+        position = 0 if range_end == rollup_start else len(parts)
+        parts.insert(position, IncidentFeatures.from_frame(frame))
+
+    sources = {
+        "featureDays": max(0, (rollup_end - rollup_start) // SECONDS_PER_DAY),
+        "rawIncidents": raw_incidents,
+        "featuresThrough": coverage_end,
+    }
+    return IncidentFeatures.merge(parts), sources
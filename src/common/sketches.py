@@ -0,0 +1,260 @@
+"""
+Sketches aproximados y combinables para estadísticas del campus.
+
+- ``SpaceSaving``: heavy hitters (top-k) con memoria acotada.
+- ``HyperLogLog``: conteo aproximado de valores distintos.
+
+Ambos se pueden combinar (``merge``) entre segmentos de scan o buckets de tiempo
+y se serializan a texto para guardarlos por día en DynamoDB o S3.
+"""
+import base64
+import hashlib
+import json
+import math
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+class SpaceSaving:
+    """Top-k aproximado (Metwally et al.) con ``capacity`` contadores."""
+
+    def __init__(self, capacity: int = 64) -> None:
+        self.capacity = capacity
+        # item -> [count, error]
+        self.counters: Dict[str, List[int]] = {}
+
+    def add(self, item: str, count: int = 1) -> None:
+        counter = self.counters.get(item)
+        if counter is not None:
+            counter[0] += count
+            return
+        if len(self.counters) < self.capacity:
+            self.counters[item] = [count, 0]
+            return
+        victim, (min_count, _) = min(self.counters.items(), key=lambda kv: kv[1][0])
+        del self.counters[victim]
+        self.counters[item] = [min_count + count, min_count]
+
+    def update(self, items: Iterable[str]) -> None:
+        for item in items:
+            self.add(item)
+
+    def _floor(self) -> int:
+        """Cota superior del conteo de un item no monitoreado."""
+        if len(self.counters) < self.capacity:
+            return 0
+        return min(count for count, _ in self.counters.values())
+
+    def merge(self, other: "SpaceSaving") -> "SpaceSaving":
+        """Combina dos sketches (Agarwal et al., mergeable summaries)."""
+        floor_self = self._floor()
+        floor_other = other._floor()
+        combined: Dict[str, List[int]] = {}
+        for item in set(self.counters) | set(other.counters):
+            count_a, error_a = self.counters.get(item, (floor_self, floor_self))
+            count_b, error_b = other.counters.get(item, (floor_other, floor_other))
+            combined[item] = [count_a + count_b, error_a + error_b]
+        capacity = max(self.capacity, other.capacity)
+        top = sorted(combined.items(), key=lambda kv: kv[1][0], reverse=True)[:capacity]
+        merged = SpaceSaving(capacity)
+        merged.counters = dict(top)
+        return merged
+
+    def top(self, k: Optional[int] = None) -> List[Tuple[str, int]]:
+        ranked = sorted(self.counters.items(), key=lambda kv: kv[1][0], reverse=True)
+        if k is not None:
+            ranked = ranked[:k]
+        return [(item, count) for item, (count, _) in ranked]
+
+    def serialize(self) -> str:
+        return json.dumps(
+            {
+                "capacity": self.capacity,
+                "counters": [[item, count, error] for item, (count, error) in self.counters.items()],
+            },
+            separators=(",", ":"),
+        )
+
+    @classmethod
+    def deserialize(cls, data: Optional[str], capacity: int = 64) -> "SpaceSaving":
+        if not data:
+            return cls(capacity)
+        payload = json.loads(data)
+        sketch = cls(int(payload["capacity"]))
+        sketch.counters = {
+            item: [int(count), int(error)] for item, count, error in payload["counters"]
+        }
+        return sketch
+
+
+class HyperLogLog:
+    """Cardinalidad aproximada con 2^precision registros (error ~1.04/sqrt(m))."""
+
+    def __init__(self, precision: int = 11) -> None:
+        if not 4 <= precision <= 16:
+            raise ValueError("precision debe estar entre 4 y 16")
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    @staticmethod
+    def _hash(value: Any) -> int:
+        digest = hashlib.blake2b(str(value).encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "big")
+
+    def add(self, value: Any) -> None:
+        hashed = self._hash(value)
+        index = hashed >> (64 - self.precision)
+        remaining_bits = 64 - self.precision
+        remainder = hashed & ((1 << remaining_bits) - 1)
+        rank = remaining_bits - remainder.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values: Iterable[Any]) -> None:
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        if other.precision != self.precision:
+            raise ValueError("No se pueden combinar HyperLogLog con distinta precisión")
+        merged = HyperLogLog(self.precision)
+        merged.registers = np.maximum(self.registers, other.registers)
+        return merged
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int32))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def serialize(self) -> str:
+        packed = zlib.compress(bytes([self.precision]) + self.registers.tobytes())
+        return base64.b64encode(packed).decode("ascii")
+
+    @classmethod
+    def deserialize(cls, data: Optional[str], precision: int = 11) -> "HyperLogLog":
+        if not data:
+            return cls(precision)
+        raw = zlib.decompress(base64.b64decode(data))
+        sketch = cls(raw[0])
+        sketch.registers = np.frombuffer(raw[1:], dtype=np.uint8).copy()
+        return sketch
+
+
+class TDigest:
+    """
+    Cuantiles aproximados combinables (t-digest con fusión, Dunning 2019).
+
+    Los centroides se limitan con la función de escala k1, por lo que los
+    extremos (p90/p99) conservan más resolución que la mediana.
+    """
+
+    def __init__(self, compression: int = 100) -> None:
+        self.compression = compression
+        self.means = np.empty(0, dtype=np.float64)
+        self.weights = np.empty(0, dtype=np.float64)
+        self._buffer: List[float] = []
+
+    @property
+    def count(self) -> int:
+        return int(self.weights.sum()) + len(self._buffer)
+
+    def add(self, value: float) -> None:
+        self._buffer.append(float(value))
+        if len(self._buffer) >= self.compression * 5:
+            self._compress()
+
+    def update(self, values: Iterable[float]) -> None:
+        for value in values:
+            self.add(value)
+
+    def _k(self, q: np.ndarray) -> np.ndarray:
+        return self.compression / (2 * math.pi) * np.arcsin(2 * q - 1)
+
+    def _compress(self) -> None:
+        if not self._buffer:
+            return
+        means = np.concatenate([self.means, np.asarray(self._buffer, dtype=np.float64)])
+        weights = np.concatenate([self.weights, np.ones(len(self._buffer))])
+        self._buffer = []
+        self._fuse(means, weights)
+
+    def _fuse(self, means: np.ndarray, weights: np.ndarray) -> None:
+        """Fusiona puntos ponderados en centroides respetando el límite de k."""
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+
+        merged_means: List[float] = []
+        merged_weights: List[float] = []
+        current_mean, current_weight = means[0], weights[0]
+        cumulative = 0.0
+        k_lower = self._k(np.asarray(0.0))
+        for mean, weight in zip(means[1:], weights[1:]):
+            q = (cumulative + current_weight + weight) / total
+            if self._k(np.asarray(q)) - k_lower <= 1:
+                current_mean += (mean - current_mean) * weight / (current_weight + weight)
+                current_weight += weight
+                continue
+            merged_means.append(current_mean)
+            merged_weights.append(current_weight)
+            cumulative += current_weight
+            k_lower = self._k(np.asarray(cumulative / total))
+            current_mean, current_weight = mean, weight
+        merged_means.append(current_mean)
+        merged_weights.append(current_weight)
+        self.means = np.asarray(merged_means)
+        self.weights = np.asarray(merged_weights)
+
+    def merge(self, other: "TDigest") -> "TDigest":
+        self._compress()
+        other._compress()
+        merged = TDigest(max(self.compression, other.compression))
+        means = np.concatenate([self.means, other.means])
+        if len(means):
+            merged._fuse(means, np.concatenate([self.weights, other.weights]))
+        return merged
+
+    def quantile(self, q: float) -> Optional[float]:
+        self._compress()
+        if not len(self.means):
+            return None
+        if len(self.means) == 1:
+            return float(self.means[0])
+        total = self.weights.sum()
+        # Posición acumulada del centro de cada centroide
+        centers = np.cumsum(self.weights) - self.weights / 2
+        target = q * total
+        return float(np.interp(target, centers, self.means))
+
+    def mean(self) -> Optional[float]:
+        self._compress()
+        if not len(self.means):
+            return None
+        return float(np.average(self.means, weights=self.weights))
+
+    def serialize(self) -> str:
+        self._compress()
+        return json.dumps(
+            {
+                "compression": self.compression,
+                "means": [round(float(mean), 3) for mean in self.means],
+                "weights": [int(weight) for weight in self.weights],
+            },
+            separators=(",", ":"),
+        )
+
+    @classmethod
+    def deserialize(cls, data: Optional[str], compression: int = 100) -> "TDigest":
+        if not data:
+            return cls(compression)
+        payload = json.loads(data)
+        digest = cls(int(payload["compression"]))
+        digest.means = np.asarray(payload["means"], dtype=np.float64)
+        digest.weights = np.asarray(payload["weights"], dtype=np.float64)
+        return digest
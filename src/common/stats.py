@@ -0,0 +1,286 @@
+"""
+Agregados incrementales del campus guardados por bucket diario en la tabla de
+estadísticas (``STATS_TABLE``) y combinados al leer cualquier ventana de días.
+"""
+from collections import defaultdict
+from time import time
+from typing import Any, Callable, Dict, List, Optional
+
+from src.common.dynamodb import (
+    WORKLOAD_STAT_KEY,
+    adjust_staff_workload,
+    batch_get_stat_items,
+    count_incidents_assigned_to,
+    day_bucket,
+    day_buckets_between,
+    get_stat_item,
+    list_incidents_between,
+    list_staff_workload,
+    put_stat_item,
+)
+from src.common.frame import to_epoch
+from src.common.sketches import HyperLogLog, SpaceSaving, TDigest
+
+SKETCH_STAT_KEY = "sketch#campus"
+LATENCY_STAT_KEYS = {
+    "time_to_assign": "latency#tta",
+    "time_to_resolve": "latency#ttr",
+}
+LATENCY_DIMENSIONS = ("type", "urgency", "location", "staff")
+LATENCY_QUANTILES = (0.5, 0.9, 0.99)
+WORKLOAD_STATUSES = ("pendiente", "en_atencion", "resuelto")
+MAX_WRITE_ATTEMPTS = 5
+TOP_K_CAPACITY = 64
+HLL_PRECISION = 11
+
+
+class CampusSketches:
+    """Sketches de un bucket (o de la combinación de varios)."""
+
+    def __init__(self) -> None:
+        self.top_reporters = SpaceSaving(TOP_K_CAPACITY)
+        self.top_locations = SpaceSaving(TOP_K_CAPACITY)
+        self.reporters = HyperLogLog(HLL_PRECISION)
+        self.reporters_by_location: Dict[str, HyperLogLog] = defaultdict(
+            lambda: HyperLogLog(HLL_PRECISION))
+
+    def add(self, incident: Dict[str, Any]) -> None:
+        reporter = incident.get("reportedBy") or "unknown"
+        location = incident.get("location") or "unknown"
+        self.top_reporters.add(reporter)
+        self.top_locations.add(location)
+        self.reporters.add(reporter)
+        self.reporters_by_location[location].add(reporter)
+
+    def merge(self, other: "CampusSketches") -> "CampusSketches":
+        merged = CampusSketches()
+        merged.top_reporters = self.top_reporters.merge(other.top_reporters)
+        merged.top_locations = self.top_locations.merge(other.top_locations)
+        merged.reporters = self.reporters.merge(other.reporters)
+        empty = HyperLogLog(HLL_PRECISION)
+        for location in set(self.reporters_by_location) | set(other.reporters_by_location):
+            merged.reporters_by_location[location] = self.reporters_by_location.get(location, empty).merge(
+                other.reporters_by_location.get(location, empty))
+        return merged
+
+    def to_item(self) -> Dict[str, Any]:
+        return {
+            "topReporters": self.top_reporters.serialize(),
+            "topLocations": self.top_locations.serialize(),
+            "reporters": self.reporters.serialize(),
+            "reportersByLocation": {
+                location: sketch.serialize()
+                for location, sketch in self.reporters_by_location.items()
+            },
+        }
+
+    @classmethod
+    def from_item(cls, item: Optional[Dict[str, Any]]) -> "CampusSketches":
+        sketches = cls()
+        if not item:
+            return sketches
+        sketches.top_reporters = SpaceSaving.deserialize(item.get("topReporters"), TOP_K_CAPACITY)
+        sketches.top_locations = SpaceSaving.deserialize(item.get("topLocations"), TOP_K_CAPACITY)
+        sketches.reporters = HyperLogLog.deserialize(item.get("reporters"), HLL_PRECISION)
+        for location, data in (item.get("reportersByLocation") or {}).items():
+            sketches.reporters_by_location[location] = HyperLogLog.deserialize(data, HLL_PRECISION)
+        return sketches
+
+
+def _update_with_retry(stat_key: str, bucket: str, mutate: Callable[[Optional[Dict[str, Any]]], Dict[str, Any]]) -> None:
+    for _ in range(MAX_WRITE_ATTEMPTS):
+        current = get_stat_item(stat_key, bucket)
+        expected = int(current["version"]) if current else 0
+        if put_stat_item(stat_key, bucket, mutate(current), expected_version=expected):
+            return
+    raise RuntimeError(f"No se pudo actualizar {stat_key}/{bucket} por concurrencia")
+
+
+def record_incident_sketches(incident: Dict[str, Any]) -> None:
+    """
+    Agrega un incidente recién creado a los sketches de su día
+    """
+    bucket = day_bucket(to_epoch(incident.get("createdAt")))
+
+    def mutate(current):
+        sketches = CampusSketches.from_item(current)
+        sketches.add(incident)
+        return sketches.to_item()
+
+    _update_with_retry(SKETCH_STAT_KEY, bucket, mutate)
+
+
+def load_campus_sketches(start: int, end: Optional[int] = None) -> CampusSketches:
+    """
+    Combina los sketches diarios que cubren [start, end)
+    """
+    buckets = day_buckets_between(start, end or int(time()) + 1)
+    merged = CampusSketches()
+    for item in batch_get_stat_items(SKETCH_STAT_KEY, buckets):
+        merged = merged.merge(CampusSketches.from_item(item))
+    return merged
+
+
+def rebuild_campus_sketches(start: int, end: Optional[int] = None) -> int:
+    """
+    Recalcula desde DynamoDB los sketches de cada día en [start, end)
+    """
+    by_day: Dict[str, CampusSketches] = defaultdict(CampusSketches)
+    for incident in list_incidents_between(start, end):
+        by_day[day_bucket(to_epoch(incident.get("createdAt")))].add(incident)
+    for bucket, sketches in by_day.items():
+        put_stat_item(SKETCH_STAT_KEY, bucket, sketches.to_item())
+    return len(by_day)
+
+
+def _latency_keys(incident: Dict[str, Any], staff: Optional[str]) -> List[str]:
+    keys = ["all"]
+    for dimension in ("type", "urgency", "location"):
+        value = incident.get(dimension)
+        if value:
+            keys.append(f"{dimension}:{value}")
+    if staff:
+        keys.append(f"staff:{staff}")
+    return keys
+
+
+def record_latency(
+    metric: str,
+    incident: Dict[str, Any],
+    seconds: float,
+    staff: Optional[str] = None,
+    at: Optional[int] = None,
+) -> None:
+    """
+    Agrega una latencia (en segundos) a los t-digests del día del evento,
+    uno por dimensión (global, tipo, urgencia, ubicación y personal)
+    """
+    if seconds < 0:
+        return
+    bucket = day_bucket(at or int(time()))
+    keys = _latency_keys(incident, staff)
+
+    def mutate(current):
+        digests = dict((current or {}).get("digests") or {})
+        for key in keys:
+            digest = TDigest.deserialize(digests.get(key))
+            digest.add(seconds)
+            digests[key] = digest.serialize()
+        return {"digests": digests}
+
+    _update_with_retry(LATENCY_STAT_KEYS[metric], bucket, mutate)
+
+
+def record_assignment(incident: Dict[str, Any], staff: str, assigned_at: int) -> None:
+    """
+    Registra el tiempo hasta la primera asignación (MTTA)
+    """
+    if incident.get("assignedTo"):
+        return
+    created_at = to_epoch(incident.get("createdAt"))
+    if created_at:
+        record_latency("time_to_assign", incident, assigned_at - created_at, staff, assigned_at)
+
+
+def record_resolution(incident: Dict[str, Any], resolved_at: int) -> None:
+    """
+    Registra el tiempo hasta la resolución (MTTR) al pasar a 'resuelto'
+    """
+    if incident.get("status") == "resuelto":
+        return
+    created_at = to_epoch(incident.get("createdAt"))
+    if created_at:
+        record_latency("time_to_resolve", incident, resolved_at - created_at,
+                       incident.get("assignedTo"), resolved_at)
+
+
+def load_latency_digests(metric: str, start: int, end: Optional[int] = None) -> Dict[str, TDigest]:
+    """
+    Combina los t-digests diarios de [start, end) por clave de dimensión
+    """
+    buckets = day_buckets_between(start, end or int(time()) + 1)
+    merged: Dict[str, TDigest] = {}
+    for item in batch_get_stat_items(LATENCY_STAT_KEYS[metric], buckets):
+        for key, data in (item.get("digests") or {}).items():
+            digest = TDigest.deserialize(data)
+            merged[key] = merged[key].merge(digest) if key in merged else digest
+    return merged
+
+
+def summarize_latency(digests: Dict[str, TDigest]) -> Dict[str, Any]:
+    """
+    Percentiles p50/p90/p99 (en horas) agrupados por dimensión
+    """
+    def _summary(digest: TDigest) -> Dict[str, Any]:
+        summary = {"count": digest.count,
+                   "mean_hours": round(digest.mean() / 3600, 2)}
+        for q in LATENCY_QUANTILES:
+            summary[f"p{int(q * 100)}_hours"] = round(digest.quantile(q) / 3600, 2)
+        return summary
+
+    result: Dict[str, Any] = {"overall": _summary(digests["all"]) if "all" in digests else None}
+    for dimension in LATENCY_DIMENSIONS:
+        rows = [
+            {dimension: key.split(":", 1)[1], **_summary(digest)}
+            for key, digest in digests.items()
+            if key.startswith(f"{dimension}:")
+        ]
+        rows.sort(key=lambda row: row["p90_hours"], reverse=True)
+        result[f"by_{dimension}"] = rows
+    return result
+
+
+def record_workload_transition(before: Dict[str, Any], after: Dict[str, Any]) -> None:
+    """
+    Mueve los contadores por personal según el cambio de (assignedTo, status)
+    """
+    old_staff, old_status = before.get("assignedTo"), before.get("status")
+    new_staff, new_status = after.get("assignedTo"), after.get("status")
+    if (old_staff, old_status) == (new_staff, new_status):
+        return
+    if old_staff and old_staff == new_staff:
+        deltas: Dict[str, int] = {}
+        if old_status:
+            deltas[old_status] = deltas.get(old_status, 0) - 1
+        if new_status:
+            deltas[new_status] = deltas.get(new_status, 0) + 1
+        adjust_staff_workload(old_staff, deltas)
+        return
+    if old_staff and old_status:
+        adjust_staff_workload(old_staff, {old_status: -1})
+    if new_staff and new_status:
+        adjust_staff_workload(new_staff, {new_status: 1})
+
+
+def staff_workload() -> List[Dict[str, Any]]:
+    """
+    Carga de trabajo por personal desde los contadores incrementales
+    """
+    rows = []
+    for item in list_staff_workload():
+        counts = {status: max(0, int(item.get(status, 0))) for status in WORKLOAD_STATUSES}
+        assigned = sum(counts.values())
+        if not assigned:
+            continue
+        rows.append({
+            "assignedTo": item["bucket"],
+            "assigned_incidents": assigned,
+            "resolved": counts["resuelto"],
+            "in_progress": counts["en_atencion"],
+            "pending": counts["pendiente"],
+        })
+    rows.sort(key=lambda row: row["assigned_incidents"], reverse=True)
+    return rows
+
+
+def rebuild_staff_workload(staff_members: List[str]) -> int:
+    """
+    Recalcula los contadores con consultas COUNT por personal y estado
+    """
+    for staff in staff_members:
+        counts = {
+            status: count_incidents_assigned_to(staff, status)
+            for status in WORKLOAD_STATUSES
+        }
+        put_stat_item(WORKLOAD_STAT_KEY, staff, counts)
+    return len(staff_members)
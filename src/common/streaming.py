@@ -0,0 +1,96 @@
+"""
+Escritura en streaming a S3 mediante multipart upload.
+
+``MultipartWriter`` se comporta como un archivo de solo escritura: acumula lo
+escrito en un buffer acotado y sube una parte cada vez que alcanza
+``PART_SIZE``, por lo que la memoria no depende del tamaño del archivo.
+"""
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Union
+
+import boto3
+
+# S3 exige al menos 5 MiB por parte (salvo la última)
+PART_SIZE = 8 * 1024 * 1024
+
+
+@lru_cache(maxsize=1)
+def _s3():
+    return boto3.client("s3")
+
+
+class MultipartWriter:
+    """
+    Archivo de solo escritura respaldado por un multipart upload de S3.
+
+    Usar como context manager: al salir sin errores se completa el upload; si
+    hay una excepción se aborta para no dejar partes huérfanas.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        key: str,
+        content_type: str,
+        content_disposition: Optional[str] = None,
+        part_size: int = PART_SIZE,
+    ) -> None:
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.bytes_written = 0
+        self._buffer = bytearray()
+        self._parts: List[Dict[str, Any]] = []
+        kwargs: Dict[str, Any] = {"Bucket": bucket, "Key": key, "ContentType": content_type}
+        if content_disposition:
+            kwargs["ContentDisposition"] = content_disposition
+        self._upload_id = _s3().create_multipart_upload(**kwargs)["UploadId"]
+
+    def write(self, data: Union[str, bytes]) -> int:
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self._buffer += data
+        self.bytes_written += len(data)
+        if len(self._buffer) >= self.part_size:
+            self._flush()
+        return len(data)
+
+    def _flush(self) -> None:
+        part_number = len(self._parts) + 1
+        response = _s3().upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self._upload_id,
+            PartNumber=part_number,
+            Body=bytes(self._buffer),
+        )
+        self._parts.append({"PartNumber": part_number, "ETag": response["ETag"]})
+        self._buffer.clear()
+
+    def close(self) -> None:
+        # Un archivo vacío también necesita una parte
+        if self._buffer or not self._parts:
+            self._flush()
+        _s3().complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self._upload_id,
+            MultipartUpload={"Parts": self._parts},
+        )
+
+    def abort(self) -> None:
+        try:
+            _s3().abort_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+        except Exception as exc:
+            print(f"Error abortando multipart upload de {self.key}: {exc}")
+
+    def __enter__(self) -> "MultipartWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> bool:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
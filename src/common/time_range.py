@@ -0,0 +1,87 @@
+"""
+Parámetros de rango de fechas (from, to, daysBack) para analíticas y exportes.
+"""
+import os
+from datetime import datetime, timezone
+from time import time
+from typing import Any, Dict, Optional, Tuple
+
+SECONDS_PER_DAY = 86400
+DEFAULT_HISTORY_START = "2025-01-01"
+
+
+def _is_date_only(value: str) -> bool:
+    return len(value) == 10 and value[4] == "-" and value[7] == "-"
+
+
+def parse_timestamp(value: Any) -> int:
+    """
+    Convierte epoch (segundos), YYYY-MM-DD o ISO 8601 a epoch en segundos (UTC)
+    """
+    if isinstance(value, (int, float)):
+        return int(value)
+    text = str(value).strip()
+    if text.isdigit():
+        return int(text)
+    try:
+        parsed = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError as exc:
+        raise ValueError(
+            f"Fecha inválida: {text}. Usa YYYY-MM-DD, ISO 8601 o epoch") from exc
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def start_of_day(timestamp: int) -> int:
+    return int(timestamp) - int(timestamp) % SECONDS_PER_DAY
+
+
+def history_start() -> int:
+    """
+    Inicio del histórico indexado por día (configurable con ANALYTICS_HISTORY_START)
+    """
+    return parse_timestamp(os.environ.get("ANALYTICS_HISTORY_START", DEFAULT_HISTORY_START))
+
+
+def resolve_time_range(
+    params: Dict[str, Any],
+    default_days_back: Optional[int] = None,
+) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Resuelve (start, end) en epoch para el rango [start, end).
+
+    - ``from``/``to`` aceptan fechas; ``to`` con solo fecha incluye ese día.
+    - ``daysBack`` cuenta días completos hacia atrás desde hoy (UTC).
+    - Sin parámetros ni default retorna (None, None): histórico completo.
+    - ``end`` es None cuando el rango es abierto hasta el momento actual.
+    """
+    raw_from = params.get("from")
+    raw_to = params.get("to")
+    raw_days = params.get("daysBack")
+    if raw_days in (None, "") and default_days_back is not None and not raw_from:
+        raw_days = default_days_back
+
+    end = None
+    if raw_to not in (None, ""):
+        end = parse_timestamp(raw_to)
+        if isinstance(raw_to, str) and _is_date_only(raw_to.strip()):
+            end += SECONDS_PER_DAY
+
+    start = None
+    if raw_from not in (None, ""):
+        start = parse_timestamp(raw_from)
+    elif raw_days not in (None, ""):
+        try:
+            days_back = int(raw_days)
+        except (TypeError, ValueError) as exc:
+            raise ValueError("daysBack debe ser un entero") from exc
+        if days_back <= 0:
+            raise ValueError("daysBack debe ser mayor que 0")
+        start = start_of_day(int(time())) - (days_back - 1) * SECONDS_PER_DAY
+    elif end is not None:
+        start = history_start()
+
+    if start is not None and end is not None and end <= start:
+        raise ValueError("El rango de fechas es inválido: 'to' debe ser posterior a 'from'")
+    return start, end
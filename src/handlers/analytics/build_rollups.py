@@ -0,0 +1,71 @@
+"""
+Handler programado que materializa los rollups diarios de incidentes y las
+features de predicción por día. Se ejecuta cada hora junto a la sincronización a S3.
+
+Solo recalcula los días de creación de los incidentes modificados desde la
+última ejecución (``updatedAt`` >= watermark). La primera ejecución construye
+todo el histórico; ``{"from": ..., "to": ...}`` o ``{"daysBack": N}`` fuerzan un
+rango.
+"""
+import json
+from concurrent.futures import ThreadPoolExecutor
+from time import time
+
+from src.common.dynamodb import (
+    SECONDS_PER_DAY,
+    created_days_updated_between,
+    get_sync_watermark,
+    set_sync_watermark,
+)
+from src.common.rollups import BUILD_WORKERS, ROLLUP_WATERMARK, build_rollups_between
+from src.common.time_range import history_start, resolve_time_range
+
+# Margen para no perder escrituras que estaban en curso al fijar el watermark
+WATERMARK_OVERLAP_SECONDS = 60
+
+
+def _build_day(day: int) -> int:
+    start = day * SECONDS_PER_DAY
+    return build_rollups_between(start, start + SECONDS_PER_DAY)
+
+
+def handler(event, context):
+    event = event or {}
+    try:
+        started_at = int(time())
+        start, end = resolve_time_range(event)
+        watermark = get_sync_watermark(ROLLUP_WATERMARK)
+
+        if start is not None or not watermark:
+            # Rango explícito o primera ejecución: una sola pasada por el rango
+            mode = "range" if start is not None else "full"
+            start = history_start() if start is None else start
+            days_built = build_rollups_between(start, end or started_at + 1)
+        else:
+            mode = "incremental"
+            days = created_days_updated_between(
+                watermark - WATERMARK_OVERLAP_SECONDS, started_at + 1)
+            with ThreadPoolExecutor(max_workers=BUILD_WORKERS) as executor:
+                days_built = sum(executor.map(_build_day, days))
+
+        # Un rango explícito no garantiza que el resto esté al día
+        if mode != "range":
+            set_sync_watermark(started_at, ROLLUP_WATERMARK)
+
+        print(f"Rollups diarios recalculados: {days_built} días ({mode})")
+        return {
+            "statusCode": 200,
+            "body": json.dumps({
+                "message": "Rollups actualizados",
+                "mode": mode,
+                "daysBuilt": days_built,
+                "watermark": started_at
+            })
+        }
+
+    except Exception as e:
+        print(f"Error construyendo rollups: {str(e)}")
+        return {
+            "statusCode": 500,
+            "body": json.dumps({"error": str(e)})
+        }
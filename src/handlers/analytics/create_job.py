@@ -0,0 +1,52 @@
+"""
+Handler para encolar un análisis pesado como job asíncrono
+Solo accesible para rol 'autoridad'
+"""
+import json
+from typing import Any, Dict
+
+from src.common.jobs import JobLimitError, JobStartError, create_job, job_view
+from src.common.response import json_response
+from src.common.security import AuthError, get_authenticated_claims
+
+
+def handler(event: Dict[str, Any], _) -> Dict[str, Any]:
+    """
+    POST /analytics/jobs
+    Body: {"analysis": "athena" | "predictions" | "rollup" | "export", "params": {...}}
+    ``params`` son los mismos de /analytics/incidents, /analytics/predictions,
+    /analytics/realtime o /analytics/export respectivamente. Retorna 202 con el jobId; el estado se
+    consulta en GET /analytics/jobs/{jobId} y al terminar se envía el evento
+    WebSocket ``analytics.job.completed``. Si el worker no se pudo invocar
+    retorna 503 con el jobId (el job queda como fallido).
+    """
+    try:
+        claims = get_authenticated_claims(event, allowed_roles={"autoridad"})
+    except AuthError as exc:
+        return json_response(401, {"message": str(exc)})
+
+    try:
+        payload = json.loads(event.get("body") or "{}")
+    except json.JSONDecodeError:
+        return json_response(400, {"message": "Body must be JSON"})
+
+    if not isinstance(payload, dict):
+        return json_response(400, {"message": "Body must be a JSON object"})
+
+    params = payload.get("params") or {}
+    if not isinstance(params, dict):
+        return json_response(400, {"message": "params debe ser un objeto"})
+
+    try:
+        job = create_job(payload.get("analysis") or "", params, claims["sub"])
+    except ValueError as exc:
+        return json_response(400, {"message": str(exc)})
+    except JobLimitError as exc:
+        return json_response(429, {"message": str(exc)})
+    except JobStartError as exc:
+        return json_response(503, {"message": str(exc), "jobId": exc.job_id})
+    except Exception as exc:
+        print(f"Error creando job: {exc}")
+        return json_response(500, {"message": f"Error al crear el job: {str(exc)}"})
+
+    return json_response(202, {"job": job_view(job)})
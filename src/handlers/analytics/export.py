@@ -1,21 +1,57 @@
 """
-Handler para exportar incidentes a PDF, Excel o CSV
+Handler para exportar incidentes a PDF, Excel, CSV, JSON Lines (gzip) o Parquet
 Solo accesible para rol 'autoridad'
+El archivo se genera en un job asíncrono (worker de jobs de analítica); al
+terminar se envía el evento WebSocket ``export.ready`` con la URL de descarga.
 """
 import os
 import json
-import io
 import csv
+import gzip
+import hashlib
+import tempfile
 from datetime import datetime
 from decimal import Decimal
 import boto3
+from botocore.exceptions import ClientError
 from src.common.auth import authorize
 from src.common.response import json_response
-from src.common.dynamodb import list_all_incidents
+from src.common.dynamodb import get_data_version, iter_all_incidents, list_incidents_between
+from src.common.jobs import JobLimitError, JobStartError, create_job, job_view
+from src.common.metrics import emit_metrics
+from src.common.parquet import EXPORT_COMPRESSIONS, export_record, write_export_parquet
+from src.common.pdf_report import write_pdf
+from src.common.rollups import load_daily_rollups
+from src.common.streaming import MultipartWriter
+from src.common.time_range import resolve_time_range
 
 
 s3_client = boto3.client("s3")
 
+EXPORT_FORMATS = ("csv", "excel", "pdf", "jsonl.gz", "parquet")
+EXPORT_EXTENSIONS = {
+    "csv": "csv", "excel": "xlsx", "pdf": "pdf", "jsonl.gz": "jsonl.gz", "parquet": "parquet",
+}
+DEFAULT_GZIP_LEVEL = 6
+DEFAULT_PARQUET_COMPRESSION = "snappy"
+EXPORT_PREFIX = "exports"
+# Cambiar al modificar el contenido de los archivos generados (invalida el cache)
+EXPORT_CACHE_VERSION = 1
+DOWNLOAD_URL_EXPIRATION = 3600
+# Filtros por igualdad que se resuelven en DynamoDB
+FILTER_FIELDS = ("status", "type", "urgency", "location", "assignedTo")
+# Cada cuántos incidentes se guarda el avance del job
+PROGRESS_EVERY = 5000
+# Filas por hoja antes de continuar en una nueva (Excel admite 1.048.576)
+EXCEL_MAX_ROWS_PER_SHEET = 100_000
+EXCEL_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CSV_FIELDS = [
+    "incidentId", "type", "location", "description",
+    "urgency", "priority", "status", "reportedBy",
+    "reporterRole", "assignedTo", "createdAt", "updatedAt",
+    "significanceCount"
+]
+
 
 class DecimalEncoder(json.JSONEncoder):
     """Encoder personalizado para Decimal"""
@@ -28,56 +64,185 @@ class DecimalEncoder(json.JSONEncoder):
         return super(DecimalEncoder, self).default(obj)
 
 
-def export_to_csv(incidents):
+def export_start(filters, start):
     """
-    Exporta incidentes a formato CSV
+    Inicio del rango solo si se pidió ``from`` o ``daysBack``; sin ellos la
+    exportación es del histórico completo (también con solo ``to``)
     """
-    output = io.StringIO()
+    if filters.get("from") in (None, "") and filters.get("daysBack") in (None, ""):
+        return None
+    return start
 
-    if not incidents:
-        return ""
 
-    # Definir campos a exportar
-    fields = [
-        "incidentId", "type", "location", "description",
-        "urgency", "priority", "status", "reportedBy",
-        "reporterRole", "assignedTo", "createdAt", "updatedAt",
-        "significanceCount"
-    ]
+def iter_incidents(start, end, filters):
+    """
+    Incidentes del rango que cumplen los filtros, sin materializar la tabla
+    completa. Con ``start`` se leen los índices por fecha, más recientes
+    primero; sin ``start`` se recorre la tabla con scan (orden de la tabla)
+    para incluir los incidentes anteriores al histórico indexado o sin
+    createdDay.
+    """
+    attribute_filters = {field: filters[field] for field in FILTER_FIELDS if filters.get(field)}
+    if start is None:
+        return iter_all_incidents(attribute_filters, end)
+    return list_incidents_between(start, end, descending=True, filters=attribute_filters)
+
 
-    writer = csv.DictWriter(output, fieldnames=fields, extrasaction='ignore')
-    writer.writeheader()
+def export_options(export_format, body):
+    """
+    Opciones de compresión del formato (jsonl.gz: compressionLevel 1-9;
+    parquet: compression y compressionLevel opcional). Lanza ValueError.
+    """
+    level = body.get("compressionLevel")
+    if level not in (None, ""):
+        try:
+            level = int(level)
+        except (TypeError, ValueError) as exc:
+            raise ValueError("compressionLevel debe ser un entero") from exc
+    else:
+        level = None
+
+    if export_format == "jsonl.gz":
+        level = DEFAULT_GZIP_LEVEL if level is None else level
+        if not 1 <= level <= 9:
+            raise ValueError("compressionLevel debe estar entre 1 y 9 para jsonl.gz")
+        return {"compressionLevel": level}
+    if export_format == "parquet":
+        compression = (body.get("compression") or DEFAULT_PARQUET_COMPRESSION).lower()
+        if compression not in EXPORT_COMPRESSIONS:
+            raise ValueError(
+                f"compression debe ser uno de: {', '.join(EXPORT_COMPRESSIONS)}")
+        if level is not None and compression in ("snappy", "none"):
+            raise ValueError(f"compression {compression} no admite compressionLevel")
+        return {"compression": compression, "compressionLevel": level}
+    return {}
+
+
+def export_cache_key(export_format, filters, data_version, options=None):
+    """
+    Clave del archivo exportado: formato, filtros normalizados (rango resuelto
+    y filtros por atributo) y versión de los incidentes. Mientras no cambien
+    los datos, la misma solicitud reutiliza el archivo ya generado.
+    """
+    start, end = resolve_time_range(filters)
+    normalized = {
+        # None: histórico completo (scan)
+        "from": export_start(filters, start),
+        # None: abierto hasta ahora (sin escrituras nuevas el contenido no cambia)
+        "to": end,
+        **{field: str(filters[field]) for field in FILTER_FIELDS if filters.get(field)},
+    }
+    fingerprint = json.dumps(
+        [EXPORT_CACHE_VERSION, export_format, options or {}, normalized, data_version],
+        sort_keys=True)
+    return hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()[:32]
+
+
+def load_export_manifest(cache_key):
+    """
+    Metadata de una exportación ya generada (se guarda después del archivo,
+    por lo que su existencia indica que está completo); None si no existe
+    """
+    try:
+        response = s3_client.get_object(
+            Bucket=os.environ["ANALYTICS_RESULTS_BUCKET"],
+            Key=f"{EXPORT_PREFIX}/{cache_key}.json")
+    except ClientError as exc:
+        if exc.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+            return None
+        raise
+    return json.loads(response["Body"].read())
+
+
+def _save_export_manifest(cache_key, result):
+    s3_client.put_object(
+        Bucket=os.environ["ANALYTICS_RESULTS_BUCKET"],
+        Key=f"{EXPORT_PREFIX}/{cache_key}.json",
+        Body=json.dumps(result, cls=DecimalEncoder).encode("utf-8"),
+        ContentType="application/json",
+    )
+
+
+def _cached_export(cache_key):
+    try:
+        return load_export_manifest(cache_key)
+    except Exception as exc:
+        print(f"Error leyendo cache de exportación {cache_key}: {exc}")
+        return None
 
+
+def write_jsonl(incidents, output):
+    """
+    Escribe un objeto JSON tipado por línea (``EXPORT_SCHEMA``) en ``output``
+    Retorna la cantidad de incidentes escritos.
+    """
+    count = 0
+    for incident in incidents:
+        output.write(json.dumps(export_record(incident), ensure_ascii=False).encode("utf-8"))
+        output.write(b"\n")
+        count += 1
+    return count
+
+
+def write_csv(incidents, output):
+    """
+    Escribe los incidentes como CSV en ``output`` fila por fila
+    Retorna la cantidad de incidentes escritos.
+    """
+    writer = csv.writer(output)
+    writer.writerow(CSV_FIELDS)
+
+    count = 0
     for incident in incidents:
         # Convertir sets a strings
-        row = {}
-        for field in fields:
+        row = []
+        for field in CSV_FIELDS:
             value = incident.get(field, "")
             if isinstance(value, set):
                 value = ", ".join(str(v) for v in value)
             elif isinstance(value, Decimal):
                 value = int(value) if value % 1 == 0 else float(value)
-            row[field] = value
+            row.append(value)
         writer.writerow(row)
+        count += 1
+    return count
 
-    return output.getvalue()
+def _excel_sheet(wb, index, headers):
+    """Crea una hoja en modo write-only con anchos y header fijados"""
+    from openpyxl.utils import get_column_letter
+    from openpyxl.cell import WriteOnlyCell
 
+    ws = wb.create_sheet("Incidentes" if index == 1 else f"Incidentes ({index})")
+    # En modo write-only los anchos deben fijarse antes de escribir filas
+    for col in range(1, len(headers) + 1):
+        ws.column_dimensions[get_column_letter(col)].width = 15
+    # Columna de descripción más ancha
+    ws.column_dimensions['D'].width = 40
+    ws.freeze_panes = "A2"
+
+    header_row = []
+    for header in headers:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.style = "header"
+        header_row.append(cell)
+    ws.append(header_row)
+    return ws
 
-def export_to_excel(incidents):
+
+def write_excel(incidents, path, max_rows_per_sheet=EXCEL_MAX_ROWS_PER_SHEET):
     """
-    Exporta incidentes a formato Excel (usando openpyxl)
+    Escribe los incidentes en un .xlsx (openpyxl en modo write-only) fila por
+    fila, sin mantener las celdas en memoria. Pasado ``max_rows_per_sheet``
+    continúa en una nueva hoja. Retorna la cantidad de incidentes escritos.
     """
     try:
         from openpyxl import Workbook
-        from openpyxl.styles import Font, PatternFill, Alignment
-        from openpyxl.utils import get_column_letter
+        from openpyxl.styles import Font, PatternFill, Alignment, NamedStyle
     except ImportError:
         raise Exception(
             "openpyxl no está instalado. Instale con: pip install openpyxl")
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Incidentes"
+    wb = Workbook(write_only=True)
 
     # Headers
     headers = [
@@ -87,261 +252,243 @@ def export_to_excel(incidents):
         "Votos Significancia"
     ]
 
-    # Estilo para headers
-    header_fill = PatternFill(start_color="366092",
-                              end_color="366092", fill_type="solid")
-    header_font = Font(color="FFFFFF", bold=True)
+    # Estilo compartido por todas las celdas de header
+    header_style = NamedStyle(name="header")
+    header_style.fill = PatternFill(start_color="366092",
+                                    end_color="366092", fill_type="solid")
+    header_style.font = Font(color="FFFFFF", bold=True)
+    header_style.alignment = Alignment(horizontal="center", vertical="center")
+    wb.add_named_style(header_style)
 
-    for col, header in enumerate(headers, start=1):
-        cell = ws.cell(row=1, column=col, value=header)
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal="center", vertical="center")
+    sheets = 1
+    ws = _excel_sheet(wb, sheets, headers)
+    sheet_rows = 0
+    count = 0
 
     # Datos
-    for row_idx, incident in enumerate(incidents, start=2):
-        ws.cell(row=row_idx, column=1, value=incident.get("incidentId", ""))
-        ws.cell(row=row_idx, column=2, value=incident.get("type", ""))
-        ws.cell(row=row_idx, column=3, value=incident.get("location", ""))
-        ws.cell(row=row_idx, column=4, value=incident.get("description", ""))
-        ws.cell(row=row_idx, column=5, value=incident.get("urgency", ""))
-        ws.cell(row=row_idx, column=6, value=incident.get("priority", ""))
-        ws.cell(row=row_idx, column=7, value=incident.get("status", ""))
-        ws.cell(row=row_idx, column=8, value=incident.get("reportedBy", ""))
-        ws.cell(row=row_idx, column=9, value=incident.get("reporterRole", ""))
-        ws.cell(row=row_idx, column=10, value=incident.get("assignedTo", ""))
-        ws.cell(row=row_idx, column=11, value=incident.get("createdAt", ""))
-        ws.cell(row=row_idx, column=12, value=incident.get("updatedAt", ""))
+    for incident in incidents:
+        if sheet_rows >= max_rows_per_sheet:
+            sheets += 1
+            ws = _excel_sheet(wb, sheets, headers)
+            sheet_rows = 0
 
         sig_count = incident.get("significanceCount", 0)
         if isinstance(sig_count, Decimal):
             sig_count = int(sig_count)
-        ws.cell(row=row_idx, column=13, value=sig_count)
-
-    # Ajustar ancho de columnas
-    for col in range(1, len(headers) + 1):
-        ws.column_dimensions[get_column_letter(col)].width = 15
-
-    # Columna de descripción más ancha
-    ws.column_dimensions['D'].width = 40
-
-    # Guardar en memoria
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
-
-    return output.getvalue()
-
-
-def export_to_pdf(incidents):
-    """
-    Exporta incidentes a formato PDF (usando reportlab)
-    """
-    try:
-        from reportlab.lib.pagesizes import letter, A4
-        from reportlab.lib import colors
-        from reportlab.lib.units import inch
-        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.lib.enums import TA_CENTER, TA_LEFT
-    except ImportError:
-        raise Exception(
-            "reportlab no está instalado. Instale con: pip install reportlab")
-
-    output = io.BytesIO()
-    doc = SimpleDocTemplate(output, pagesize=A4)
-    elements = []
-
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        textColor=colors.HexColor('#1a365d'),
-        spaceAfter=30,
-        alignment=TA_CENTER
-    )
-
-    # Título
-    title = Paragraph("Reporte de Incidentes", title_style)
-    elements.append(title)
-
-    # Fecha de generación
-    date_style = ParagraphStyle(
-        'DateStyle',
-        parent=styles['Normal'],
-        fontSize=10,
-        textColor=colors.grey,
-        alignment=TA_CENTER,
-        spaceAfter=20
-    )
-    date_text = Paragraph(
-        f"Generado: {datetime.utcnow().strftime('%Y-%m-%d %H:%M UTC')}",
-        date_style
-    )
-    elements.append(date_text)
-    elements.append(Spacer(1, 0.5*inch))
-
-    # Resumen
-    summary_data = {
-        "total": len(incidents),
-        "pendientes": sum(1 for i in incidents if i.get("status") == "pendiente"),
-        "en_atencion": sum(1 for i in incidents if i.get("status") == "en_atencion"),
-        "resueltos": sum(1 for i in incidents if i.get("status") == "resuelto"),
-    }
-
-    summary_table = Table([
-        ["Total", "Pendientes", "En Atención", "Resueltos"],
-        [summary_data["total"], summary_data["pendientes"],
-         summary_data["en_atencion"], summary_data["resueltos"]]
-    ])
-
-    summary_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#366092')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-
-    elements.append(summary_table)
-    elements.append(Spacer(1, 0.5*inch))
-
-    # Detalles de incidentes (primeros 50 para no exceder tamaño)
-    if incidents:
-        elements.append(
-            Paragraph("Detalles de Incidentes", styles['Heading2']))
-        elements.append(Spacer(1, 0.2*inch))
-
-        for idx, incident in enumerate(incidents[:50], start=1):
-            incident_data = [
-                ["ID:", incident.get("incidentId", "N/A")],
-                ["Tipo:", incident.get("type", "N/A")],
-                ["Ubicación:", incident.get("location", "N/A")],
-                ["Estado:", incident.get("status", "N/A")],
-                ["Urgencia:", incident.get("urgency", "N/A")],
-                ["Reportado por:", incident.get("reportedBy", "N/A")],
-                ["Asignado a:", incident.get("assignedTo", "No asignado")],
-                ["Creado:", incident.get("createdAt", "N/A")[:10]],
-            ]
-
-            incident_table = Table(incident_data, colWidths=[1.5*inch, 4*inch])
-            incident_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#e2e8f0')),
-                ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, -1), 9),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ]))
-
-            elements.append(incident_table)
-            elements.append(Spacer(1, 0.3*inch))
-
-            # Page break cada 5 incidentes
-            if idx % 5 == 0 and idx < len(incidents[:50]):
-                elements.append(PageBreak())
-
-    if len(incidents) > 50:
-        note = Paragraph(
-            f"<i>Nota: Se muestran los primeros 50 de {len(incidents)} incidentes totales.</i>",
-            styles['Normal']
-        )
-        elements.append(note)
-
-    doc.build(elements)
-    output.seek(0)
-
-    return output.getvalue()
+        ws.append([
+            incident.get("incidentId", ""),
+            incident.get("type", ""),
+            incident.get("location", ""),
+            incident.get("description", ""),
+            incident.get("urgency", ""),
+            incident.get("priority", ""),
+            incident.get("status", ""),
+            incident.get("reportedBy", ""),
+            incident.get("reporterRole", ""),
+            incident.get("assignedTo", ""),
+            _excel_value(incident.get("createdAt", "")),
+            _excel_value(incident.get("updatedAt", "")),
+            sig_count,
+        ])
+        sheet_rows += 1
+        count += 1
+
+    wb.save(path)
+    return count
+
+
+def _excel_value(value):
+    if isinstance(value, Decimal):
+        return int(value) if value % 1 == 0 else float(value)
+    return value
 
 
 @authorize(["autoridad"])
 def handler(event, context):
     """
-    Exporta incidentes en el formato solicitado
+    Encola la exportación de incidentes en el formato solicitado
     POST /analytics/export
-    Body: { format: "csv" | "excel" | "pdf", filters?: {...} }
+    Body: { format: "csv" | "excel" | "pdf" | "jsonl.gz" | "parquet", filters?: {...},
+            compression?: "snappy" | "gzip" | "zstd" | "none", compressionLevel?: int }
+    Filtros de fecha opcionales: filters.from, filters.to, filters.daysBack
+    (sin from ni daysBack se exporta el histórico completo con scan)
+    Filtros por atributo: status, type, urgency, location, assignedTo
+    Retorna 202 con el job; el avance se consulta en GET /analytics/jobs/{jobId}
+    Si el mismo archivo ya se generó y los datos no cambiaron, retorna 200 con
+    una URL de descarga nueva sin crear un job.
     """
     try:
-        body = json.loads(event.get("body", "{}"))
+        body = json.loads(event.get("body") or "{}")
     except json.JSONDecodeError:
         return json_response(400, {"error": "JSON inválido"})
+    if not isinstance(body, dict):
+        return json_response(400, {"error": "El body debe ser un objeto JSON"})
 
-    export_format = body.get("format", "csv").lower()
-    filters = body.get("filters", {})
+    export_format = body.get("format") or "csv"
+    filters = body.get("filters") or {}
 
-    if export_format not in ["csv", "excel", "pdf"]:
+    if not isinstance(filters, dict):
+        return json_response(400, {"error": "filters debe ser un objeto"})
+    export_format = export_format.lower() if isinstance(export_format, str) else export_format
+    if export_format not in EXPORT_FORMATS:
         return json_response(400, {
-            "error": "Formato no soportado. Use: csv, excel o pdf"
+            "error": "Formato no soportado. Use: csv, excel, pdf, jsonl.gz o parquet"
         })
 
     try:
-        # Obtener todos los incidentes
-        incidents = list_all_incidents()
-
-        # Aplicar filtros si existen
-        if filters:
-            if "status" in filters:
-                incidents = [i for i in incidents if i.get(
-                    "status") == filters["status"]]
-            if "type" in filters:
-                incidents = [i for i in incidents if i.get(
-                    "type") == filters["type"]]
-            if "urgency" in filters:
-                incidents = [i for i in incidents if i.get(
-                    "urgency") == filters["urgency"]]
-
-        # Ordenar por fecha (más recientes primero)
-        incidents.sort(key=lambda x: x.get("createdAt", ""), reverse=True)
-
-        # Generar archivo según formato
-        if export_format == "csv":
-            content = export_to_csv(incidents)
-            content_type = "text/csv"
-            filename = f"incidentes_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.csv"
-            content_bytes = content.encode('utf-8')
-
-        elif export_format == "excel":
-            content_bytes = export_to_excel(incidents)
-            content_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            filename = f"incidentes_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.xlsx"
-
-        else:  # pdf
-            content_bytes = export_to_pdf(incidents)
-            content_type = "application/pdf"
-            filename = f"incidentes_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.pdf"
-
-        # Subir a S3
-        results_bucket = os.environ["ANALYTICS_RESULTS_BUCKET"]
-        s3_key = f"exports/{filename}"
-
-        s3_client.put_object(
-            Bucket=results_bucket,
-            Key=s3_key,
-            Body=content_bytes,
-            ContentType=content_type,
-            ContentDisposition=f'attachment; filename="{filename}"'
-        )
-
-        # Generar URL prefirmada para descarga (válida por 1 hora)
-        download_url = s3_client.generate_presigned_url(
-            'get_object',
-            Params={'Bucket': results_bucket, 'Key': s3_key},
-            ExpiresIn=3600
-        )
+        resolve_time_range(filters)
+        options = export_options(export_format, body)
+    except ValueError as exc:
+        return json_response(400, {"error": str(exc)})
 
+    try:
+        return _start_export(event, export_format, filters, options)
+    except Exception as exc:
+        print(f"Error iniciando exportación: {exc}")
+        return json_response(500, {"error": f"Error al iniciar la exportación: {str(exc)}"})
+
+
+def _start_export(event, export_format, filters, options):
+    """URL del archivo ya generado (200) o job nuevo de exportación (202/429)"""
+    # Misma exportación sin cambios en los datos: solo una URL nueva
+    cache_key = export_cache_key(export_format, filters, get_data_version(), options)
+    cached = _cached_export(cache_key)
+    if cached:
         return json_response(200, {
-            "message": "Exportación completada",
-            "format": export_format,
-            "filename": filename,
-            "incidentsCount": len(incidents),
-            "downloadUrl": download_url,
+            "message": "Exportación disponible",
+            "cached": True,
+            **cached,
+            "downloadUrl": s3_client.generate_presigned_url(
+                'get_object',
+                Params={'Bucket': os.environ["ANALYTICS_RESULTS_BUCKET"], 'Key': cached["exportKey"]},
+                ExpiresIn=DOWNLOAD_URL_EXPIRATION
+            ),
             "expiresIn": "1 hora"
         })
 
-    except Exception as e:
-        return json_response(500, {
-            "error": f"Error en exportación: {str(e)}"
+    claims = event["requestContext"]["authorizer"]["lambda"]
+    params = {"format": export_format, "filters": filters, "cacheKey": cache_key, **options}
+    try:
+        job = create_job("export", params, claims["sub"])
+    except JobLimitError as exc:
+        return json_response(429, {"error": str(exc)})
+    except JobStartError as exc:
+        return json_response(503, {"error": str(exc), "jobId": exc.job_id})
+
+    return json_response(202, {
+        "message": "Exportación en proceso",
+        "job": job_view(job)
+    })
+
+
+def _tracked(incidents, progress):
+    """Reenvía los incidentes reportando el avance cada PROGRESS_EVERY"""
+    processed = 0
+    for incident in incidents:
+        yield incident
+        processed += 1
+        if progress and processed % PROGRESS_EVERY == 0:
+            progress({"stage": "writing", "processed": processed})
+
+
+def run_export(params, progress=None):
+    """
+    Genera el archivo de exportación en S3 (usado por el worker de jobs)
+    ``progress`` recibe el avance ({stage, processed}) mientras se escribe.
+    Retorna la metadata del archivo; ``exportKey`` es la clave en el bucket
+    de resultados. Si el archivo ya existe para ``cacheKey`` se reutiliza.
+    """
+    export_format = (params.get("format") or "csv").lower()
+    filters = params.get("filters") or {}
+    if not isinstance(filters, dict):
+        raise ValueError("filters debe ser un objeto")
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError("Formato no soportado. Use: csv, excel, pdf, jsonl.gz o parquet")
+    options = export_options(export_format, params)
+    cache_key = params.get("cacheKey") or export_cache_key(
+        export_format, filters, get_data_version(), options)
+    cached = _cached_export(cache_key)
+    if cached:
+        return {**cached, "cached": True}
+
+    start, end = resolve_time_range(filters)
+    start = export_start(filters, start)
+    incidents = _tracked(iter_incidents(start, end, filters), progress)
+    results_bucket = os.environ["ANALYTICS_RESULTS_BUCKET"]
+    result = {"format": export_format, **options}
+    timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
+    filename = f"incidentes_{timestamp}.{EXPORT_EXTENSIONS[export_format]}"
+    s3_key = f"{EXPORT_PREFIX}/{cache_key}.{EXPORT_EXTENSIONS[export_format]}"
+
+    # CSV: se escribe en streaming (multipart upload) sin cargar la tabla
+    if export_format == "csv":
+        with MultipartWriter(
+            results_bucket, s3_key, "text/csv",
+            content_disposition=f'attachment; filename="{filename}"',
+        ) as output:
+            result["incidentsCount"] = write_csv(incidents, output)
+
+    # JSON Lines comprimido en streaming, igual que el CSV
+    elif export_format == "jsonl.gz":
+        with MultipartWriter(
+            results_bucket, s3_key, "application/gzip",
+            content_disposition=f'attachment; filename="{filename}"',
+        ) as output:
+            with gzip.GzipFile(fileobj=output, mode="wb",
+                               compresslevel=options["compressionLevel"]) as compressed:
+                result["incidentsCount"] = write_jsonl(incidents, compressed)
+
+    # Parquet: row groups por lote en /tmp
+    elif export_format == "parquet":
+        with tempfile.NamedTemporaryFile(suffix=".parquet") as tmp:
+            result["incidentsCount"] = write_export_parquet(
+                incidents, tmp.name, options["compression"], options["compressionLevel"])
+            _upload_file(tmp.name, s3_key, "application/vnd.apache.parquet", filename, progress)
+
+    # Excel: workbook write-only en /tmp y subida con multipart gestionado
+    elif export_format == "excel":
+        with tempfile.NamedTemporaryFile(suffix=".xlsx") as tmp:
+            result["incidentsCount"] = write_excel(incidents, tmp.name)
+            _upload_file(tmp.name, s3_key, EXCEL_CONTENT_TYPE, filename, progress)
+
+    # PDF: todos los incidentes; resumen y gráficos desde los rollups
+    # diarios salvo que haya filtros por atributo o el rango no tenga inicio
+    # (los rollups no cubren lo anterior al histórico indexado)
+    else:
+        daily = None
+        if start is not None and not any(filters.get(field) for field in FILTER_FIELDS):
+            daily, _ = load_daily_rollups(start, end)
+        with tempfile.NamedTemporaryFile(suffix=".pdf") as tmp:
+            report = write_pdf(incidents, tmp.name, daily)
+            _upload_file(tmp.name, s3_key, "application/pdf", filename, progress)
+        print(f"PDF generado: {report['pages']} páginas en {report['buildSeconds']} s "
+              f"({report['pagesPerSecond']} páginas/s)")
+        emit_metrics(
+            {"Export": "pdf"},
+            {
+                "PdfPages": (report["pages"], "Count"),
+                "PdfBuildTime": (report["buildSeconds"], "Seconds"),
+                "PdfPagesPerSecond": (report["pagesPerSecond"] or 0, "Count/Second"),
+            },
+        )
+        result["incidentsCount"] = report["incidents"]
+        result["report"] = report
+
+    result["filename"] = filename
+    result["exportKey"] = s3_key
+    result["generatedAt"] = timestamp
+    _save_export_manifest(cache_key, result)
+    if progress:
+        progress({"stage": "done", "processed": result["incidentsCount"]})
+    return result
+
+
+def _upload_file(path, s3_key, content_type, filename, progress):
+    if progress:
+        progress({"stage": "uploading"})
+    s3_client.upload_file(
+        path, os.environ["ANALYTICS_RESULTS_BUCKET"], s3_key,
+        ExtraArgs={
+            "ContentType": content_type,
+            "ContentDisposition": f'attachment; filename="{filename}"',
         })
@@ -3,32 +3,49 @@ Handler para obtener métricas y analytics usando Athena
 Solo accesible para rol 'autoridad'
 """
 import os
-import json
-import time
-import boto3
+from datetime import datetime, timezone
+from time import time
+from typing import Optional
+from src.common.athena import result_download_url, run_cached_queries
 from src.common.auth import authorize
+from src.common.dynamodb import get_dataset_version
+from src.common.metrics import emit_metrics
 from src.common.response import json_response
+from src.common.rollups import load_daily_rollups, merge_rollups
+from src.common.time_range import SECONDS_PER_DAY, history_start, resolve_time_range, start_of_day
 
+DEFAULT_QUERY_TIMEOUT_SECONDS = 50
+DOWNLOAD_URL_EXPIRATION = 3600
+# Margen para armar la respuesta antes de que expire la Lambda
+RESPONSE_MARGIN_SECONDS = 5
 
-athena_client = boto3.client("athena")
-s3_client = boto3.client("s3")
-
+# Filtro por rango de fechas: los predicados sobre year/month/day permiten a
+# Athena podar particiones (partition projection) y createdAt ajusta el borde
+# exacto del rango. Los valores se enlazan como ExecutionParameters.
+DATE_FILTER = (
+    "year BETWEEN ? AND ? "
+    "AND year * 10000 + month * 100 + day BETWEEN ? AND ? "
+    "AND createdAt >= ? AND createdAt < ?"
+)
 
 PREDEFINED_QUERIES = {
-    "incidents_by_type": """
+    "incidents_by_type": f"""
         SELECT type, COUNT(*) as count
         FROM incidents
+        WHERE {DATE_FILTER}
         GROUP BY type
         ORDER BY count DESC
     """,
-    "incidents_by_status": """
+    "incidents_by_status": f"""
         SELECT status, COUNT(*) as count
         FROM incidents
+        WHERE {DATE_FILTER}
         GROUP BY status
     """,
-    "incidents_by_urgency": """
+    "incidents_by_urgency": f"""
         SELECT urgency, COUNT(*) as count
         FROM incidents
+        WHERE {DATE_FILTER}
         GROUP BY urgency
         ORDER BY 
             CASE urgency
@@ -38,30 +55,33 @@ PREDEFINED_QUERIES = {
                 WHEN 'baja' THEN 4
             END
     """,
-    "incidents_by_location": """
+    "incidents_by_location": f"""
         SELECT location, COUNT(*) as count
         FROM incidents
+        WHERE {DATE_FILTER}
         GROUP BY location
         ORDER BY count DESC
         LIMIT 10
     """,
-    "incidents_by_day": """
+    "incidents_by_day": f"""
         SELECT 
             CAST(year AS VARCHAR) || '-' || LPAD(CAST(month AS VARCHAR), 2, '0') || '-' || LPAD(CAST(day AS VARCHAR), 2, '0') as date,
             COUNT(*) as count
         FROM incidents
+        WHERE {DATE_FILTER}
         GROUP BY year, month, day
         ORDER BY year DESC, month DESC, day DESC
         LIMIT 30
     """,
-    "top_reporters": """
+    "top_reporters": f"""
         SELECT reportedBy, COUNT(*) as incidents_count
         FROM incidents
+        WHERE {DATE_FILTER}
         GROUP BY reportedBy
         ORDER BY incidents_count DESC
         LIMIT 10
     """,
-    "staff_workload": """
+    "staff_workload": f"""
         SELECT 
             assignedTo,
             COUNT(*) as assigned_incidents,
@@ -69,130 +89,201 @@ PREDEFINED_QUERIES = {
             SUM(CASE WHEN status = 'en_atencion' THEN 1 ELSE 0 END) as in_progress,
             SUM(CASE WHEN status = 'pendiente' THEN 1 ELSE 0 END) as pending
         FROM incidents
-        WHERE assignedTo IS NOT NULL
+        WHERE {DATE_FILTER}
+          AND assignedTo IS NOT NULL
         GROUP BY assignedTo
         ORDER BY assigned_incidents DESC
     """,
-    "resolution_time": """
+    "resolution_time": f"""
         SELECT 
             type,
             urgency,
-            AVG(
-                date_diff('second', 
-                    from_iso8601_timestamp(createdAt), 
-                    from_iso8601_timestamp(updatedAt)
-                ) / 3600.0
-            ) as avg_hours_to_update
+            COUNT(*) as resolved_incidents,
+            AVG((COALESCE(closedAt, updatedAt) - createdAt) / 3600.0) as avg_hours_to_resolve,
+            approx_percentile(
+                (COALESCE(closedAt, updatedAt) - createdAt) / 3600.0,
+                0.9
+            ) as p90_hours_to_resolve
         FROM incidents
-        WHERE status = 'resuelto'
+        WHERE {DATE_FILTER}
+          AND status = 'resuelto'
         GROUP BY type, urgency
-        ORDER BY avg_hours_to_update DESC
+        ORDER BY avg_hours_to_resolve DESC
     """,
-    "significance_trends": """
+    "significance_trends": f"""
         SELECT 
             type,
             AVG(significanceCount) as avg_significance,
             MAX(significanceCount) as max_significance,
             COUNT(*) as total_incidents
         FROM incidents
+        WHERE {DATE_FILTER}
         GROUP BY type
         ORDER BY avg_significance DESC
     """
 }
 
 
-def execute_athena_query(query: str, database: str, output_location: str):
-    """
-    Ejecuta un query en Athena y espera el resultado
-    """
-    # Iniciar ejecución del query
-    response = athena_client.start_query_execution(
-        QueryString=query,
-        QueryExecutionContext={"Database": database},
-        ResultConfiguration={"OutputLocation": output_location}
-    )
-
-    query_execution_id = response["QueryExecutionId"]
-
-    # Esperar a que termine la ejecución (máx 60 segundos)
-    max_attempts = 60
-    attempt = 0
-
-    while attempt < max_attempts:
-        query_status = athena_client.get_query_execution(
-            QueryExecutionId=query_execution_id
-        )
+URGENCY_RANK = {"critica": 1, "alta": 2, "media": 3, "baja": 4}
+
 
-        status = query_status["QueryExecution"]["Status"]["State"]
+def _ranked(counts, key_name: str, count_name: str = "count", limit=None):
+    ranked = sorted(counts.items(), key=lambda kv: kv[1], reverse=True)[:limit]
+    return [{key_name: key, count_name: count} for key, count in ranked]
 
-        if status == "SUCCEEDED":
-            # Obtener resultados
-            results = athena_client.get_query_results(
-                QueryExecutionId=query_execution_id
-            )
-            return parse_athena_results(results)
 
-        elif status in ["FAILED", "CANCELLED"]:
-            reason = query_status["QueryExecution"]["Status"].get(
-                "StateChangeReason", "Unknown error"
-            )
-            raise Exception(f"Query failed: {reason}")
+def _rollup_by_day(totals, daily):
+    days = sorted((day for day, rollup in daily.items() if rollup.total), reverse=True)[:30]
+    return [
+        {
+            "date": datetime.fromtimestamp(day * SECONDS_PER_DAY, tz=timezone.utc).strftime("%Y-%m-%d"),
+            "count": daily[day].total,
+        }
+        for day in days
+    ]
 
-        time.sleep(1)
-        attempt += 1
 
-    raise Exception("Query execution timeout")
+def _rollup_staff_workload(totals, daily):
+    rows = [
+        {
+            "assignedTo": staff,
+            "assigned_incidents": sum(statuses.values()),
+            "resolved": statuses.get("resuelto", 0),
+            "in_progress": statuses.get("en_atencion", 0),
+            "pending": statuses.get("pendiente", 0),
+        }
+        for staff, statuses in totals.staff_status.items()
+    ]
+    rows.sort(key=lambda row: row["assigned_incidents"], reverse=True)
+    return rows
+
+
+def _rollup_significance(totals, daily):
+    rows = []
+    for label, (total, maximum) in totals.significance.items():
+        count = totals.counts["type"].get(label, 0)
+        rows.append({
+            "type": label,
+            "avg_significance": total / count if count else 0.0,
+            "max_significance": maximum,
+            "total_incidents": count,
+        })
+    rows.sort(key=lambda row: row["avg_significance"], reverse=True)
+    return rows
+
+
+# Queries que se responden desde los rollups diarios (mismas columnas que el SQL)
+ROLLUP_QUERIES = {
+    "incidents_by_type": lambda totals, daily: _ranked(totals.counts["type"], "type"),
+    "incidents_by_status": lambda totals, daily: _ranked(totals.counts["status"], "status"),
+    "incidents_by_urgency": lambda totals, daily: sorted(
+        _ranked(totals.counts["urgency"], "urgency"),
+        key=lambda row: URGENCY_RANK.get(row["urgency"], 5)),
+    "incidents_by_location": lambda totals, daily: _ranked(
+        totals.counts["location"], "location", limit=10),
+    "incidents_by_day": _rollup_by_day,
+    "staff_workload": _rollup_staff_workload,
+    "significance_trends": _rollup_significance,
+}
 
 
-def parse_athena_results(results):
+def _ymd(timestamp: int) -> int:
+    day = datetime.fromtimestamp(timestamp, tz=timezone.utc)
+    return day.year * 10000 + day.month * 100 + day.day
+
+
+def _date_parameters(start: int, end: int):
+    """Valores de ``DATE_FILTER`` para el rango [start, end)"""
+    first, last = _ymd(start), _ymd(end - 1)
+    return [first // 10000, last // 10000, first, last, start, end]
+
+
+def _query_timeout(query_params, context) -> float:
     """
-    Parsea los resultados de Athena a formato JSON
+    Timeout por query: el solicitado (?timeout=segundos) acotado por el
+    configurado y por el tiempo restante de la Lambda, para devolver siempre
+    resultados parciales antes de que expire la invocación.
     """
-    rows = results["ResultSet"]["Rows"]
-
-    if len(rows) == 0:
-        return []
-
-    # Primera fila contiene los headers
-    headers = [col["VarCharValue"] for col in rows[0]["Data"]]
-
-    # Resto de filas son datos
-    data = []
-    for row in rows[1:]:
-        row_data = {}
-        for i, col in enumerate(row["Data"]):
-            value = col.get("VarCharValue", None)
-            # Intentar convertir a número si es posible
-            if value is not None:
-                try:
-                    value = int(value)
-                except ValueError:
-                    try:
-                        value = float(value)
-                    except ValueError:
-                        pass
-            row_data[headers[i]] = value
-        data.append(row_data)
-
-    return data
+    timeout = float(os.environ.get("ATHENA_QUERY_TIMEOUT_SECONDS", DEFAULT_QUERY_TIMEOUT_SECONDS))
+    requested = query_params.get("timeout")
+    if requested:
+        timeout = min(timeout, float(requested))
+    if context is not None and hasattr(context, "get_remaining_time_in_millis"):
+        remaining = context.get_remaining_time_in_millis() / 1000.0 - RESPONSE_MARGIN_SECONDS
+        timeout = min(timeout, remaining)
+    return max(timeout, 1.0)
+
+
+def _bytes_budget() -> Optional[int]:
+    """Máximo de bytes que puede escanear cada query (0 o vacío: sin límite)"""
+    return int(os.environ.get("ATHENA_MAX_BYTES_SCANNED") or 0) or None
+
+
+def _emit_query_metrics(statistics) -> None:
+    for name, stats in statistics.items():
+        emit_metrics(
+            {"Query": name},
+            {
+                "DataScannedBytes": (stats["dataScannedBytes"], "Bytes"),
+                "EngineExecutionTime": (stats["engineExecutionTimeMs"], "Milliseconds"),
+                "QueryQueueTime": (stats["queryQueueTimeMs"], "Milliseconds"),
+                "QueryPlanningTime": (stats["queryPlanningTimeMs"], "Milliseconds"),
+                "TotalExecutionTime": (stats["totalExecutionTimeMs"], "Milliseconds"),
+                "EstimatedCostUsd": (stats["estimatedCostUsd"], "None"),
+            },
+            {"queryExecutionId": stats["queryExecutionId"], "state": stats["state"]},
+        )
 
 
 @authorize(["autoridad"])
 def handler(event, context):
     """
     Ejecuta queries predefinidos en Athena y retorna métricas
-    Query params: ?queries=incidents_by_type,incidents_by_status
+    Query params: ?queries=incidents_by_type,incidents_by_status&from=2025-03-01&to=2025-03-31
+                  &daysBack=30&timeout=20&refresh=true
+    Sin rango se consulta todo el histórico (desde ANALYTICS_HISTORY_START).
+    Los resultados se reutilizan mientras no haya una nueva sincronización.
+    Con ?delivery=link cada resultado se entrega como URL prefirmada al CSV de
+    Athena en lugar de incluir las filas en la respuesta.
+    Los desgloses por tipo/estado/urgencia/ubicación/día/personal se leen de
+    los rollups diarios salvo que se indique ?source=athena.
+    Para conjuntos pesados usar POST /analytics/jobs con analysis=athena.
+    """
+    query_params = event.get("queryStringParameters", {}) or {}
+
+    try:
+        timeout = _query_timeout(query_params, context)
+    except ValueError:
+        return json_response(400, {"message": "timeout debe ser un número de segundos"})
+
+    try:
+        response_data = run_analytics(query_params, timeout)
+    except ValueError as exc:
+        return json_response(400, {"message": str(exc)})
+    except Exception as exc:
+        print(f"Error ejecutando analíticas: {exc}")
+        return json_response(500, {"message": f"Error al ejecutar analíticas: {str(exc)}"})
+
+    return json_response(200, response_data)
+
+
+def run_analytics(query_params, timeout_seconds: float):
+    """
+    Ejecuta las queries solicitadas (también usado por los jobs asíncronos).
+    Lanza ValueError si los parámetros son inválidos.
     """
     database = os.environ["GLUE_DATABASE"]
     results_bucket = os.environ["ANALYTICS_RESULTS_BUCKET"]
     output_location = f"s3://{results_bucket}/query-results/"
 
-    # Obtener queries solicitados
-    query_params = event.get("queryStringParameters", {}) or {}
-    requested_queries = query_params.get("queries", "").split(",")
+    # Obtener queries solicitados (lista o separados por coma)
+    requested_queries = query_params.get("queries") or ""
+    if isinstance(requested_queries, str):
+        requested_queries = requested_queries.split(",")
+    requested_queries = [name.strip() for name in requested_queries if name.strip()]
 
     # Si no se especifica, ejecutar queries principales
-    if not requested_queries or requested_queries == [""]:
+    if not requested_queries:
         requested_queries = [
             "incidents_by_type",
             "incidents_by_status",
@@ -201,28 +292,89 @@ def handler(event, context):
             "incidents_by_day"
         ]
 
-    results = {}
-    errors = {}
+    start, end = resolve_time_range(query_params)
+    start = history_start() if start is None else start
+    # Sin ``to`` el borde superior es el fin del día UTC en curso (no ``now``):
+    # así los parámetros, y la clave de caché, son estables durante el día; la
+    # versión del dataset ya acota el contenido
+    end = start_of_day(int(time())) + SECONDS_PER_DAY if end is None else end
+
+    refresh = str(query_params.get("refresh", "")).lower() in ("1", "true", "yes")
+    delivery = query_params.get("delivery", "inline")
+    if delivery not in ("inline", "link"):
+        raise ValueError("delivery debe ser 'inline' o 'link'")
+    source = query_params.get("source", "auto")
+    if source not in ("auto", "athena"):
+        raise ValueError("source debe ser 'auto' o 'athena'")
 
+    queries = {}
+    errors = {}
     for query_name in requested_queries:
-        query_name = query_name.strip()
         if query_name not in PREDEFINED_QUERIES:
             errors[query_name] = f"Query '{query_name}' no encontrado"
             continue
+        queries[query_name] = PREDEFINED_QUERIES[query_name]
 
-        try:
-            query_sql = PREDEFINED_QUERIES[query_name]
-            result = execute_athena_query(query_sql, database, output_location)
-            results[query_name] = result
-        except Exception as e:
-            errors[query_name] = str(e)
+    # Desgloses pre-materializados: no requieren Athena
+    rollup_results = {}
+    rollup_sources = None
+    rollup_names = [name for name in queries if name in ROLLUP_QUERIES]
+    if rollup_names and source == "auto" and delivery == "inline":
+        daily, rollup_sources = load_daily_rollups(start, end)
+        totals = merge_rollups(daily.values())
+        for name in rollup_names:
+            rollup_results[name] = ROLLUP_QUERIES[name](totals, daily)
+            del queries[name]
+
+    # Las queries sin resultado cacheado se ejecutan en paralelo; las que no
+    # terminan a tiempo se cancelan y se reportan en errors (resultados parciales)
+    results, cache, statistics = {}, None, {}
+    if queries:
+        results, query_errors, cache, statistics = run_cached_queries(
+            queries,
+            database,
+            output_location,
+            cache_bucket=results_bucket,
+            dataset_version=get_dataset_version(),
+            parameters={name: _date_parameters(start, end) for name in queries},
+            refresh=refresh,
+            timeout_seconds=timeout_seconds,
+            fetch=delivery == "inline",
+            max_bytes_scanned=_bytes_budget(),
+        )
+        errors.update(query_errors)
+        _emit_query_metrics(statistics)
+
+    if delivery == "link":
+        results = {
+            name: {
+                "downloadUrl": result_download_url(location, DOWNLOAD_URL_EXPIRATION),
+                "expiresIn": DOWNLOAD_URL_EXPIRATION,
+            }
+            for name, location in results.items()
+        }
+
+    sources = {name: "athena" for name in results}
+    sources.update({name: "rollup" for name in rollup_results})
+    results.update(rollup_results)
 
     response_data = {
         "results": results,
-        "availableQueries": list(PREDEFINED_QUERIES.keys())
+        "availableQueries": list(PREDEFINED_QUERIES.keys()),
+        "sources": sources,
+        "cache": cache,
+        "range": {"from": start, "to": end}
     }
+    if rollup_sources:
+        response_data["rollups"] = rollup_sources
+    if statistics:
+        response_data["statistics"] = {
+            "queries": statistics,
+            "dataScannedBytes": sum(stat["dataScannedBytes"] for stat in statistics.values()),
+            "estimatedCostUsd": round(sum(stat["estimatedCostUsd"] for stat in statistics.values()), 8),
+        }
 
     if errors:
         response_data["errors"] = errors
 
-    return json_response(200, response_data)
+    return response_data
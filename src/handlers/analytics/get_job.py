@@ -0,0 +1,31 @@
+"""
+Handler para consultar el estado y resultado de un job de analítica
+"""
+from typing import Any, Dict
+
+from src.common.dynamodb import get_job
+from src.common.jobs import expire_stale_job, job_view
+from src.common.response import json_response
+from src.common.security import AuthError, get_authenticated_claims
+
+
+def handler(event: Dict[str, Any], _) -> Dict[str, Any]:
+    """
+    GET /analytics/jobs/{jobId}
+    Solo el usuario que lo solicitó puede consultarlo. Un job pendiente o en
+    ejecución por más de JOB_MAX_RUNTIME_SECONDS se reporta como fallido.
+    """
+    try:
+        claims = get_authenticated_claims(event, allowed_roles={"autoridad"})
+    except AuthError as exc:
+        return json_response(401, {"message": str(exc)})
+
+    job_id = (event.get("pathParameters") or {}).get("jobId")
+    if not job_id:
+        return json_response(400, {"message": "jobId requerido"})
+
+    job = get_job(job_id)
+    if not job or job.get("requestedBy") != claims["sub"]:
+        return json_response(404, {"message": "Job no encontrado"})
+
+    return json_response(200, {"job": job_view(expire_stale_job(job))})
@@ -1,17 +1,24 @@
 import json
-import os
-from collections import Counter, defaultdict
-from datetime import datetime, timezone, timedelta
+from datetime import datetime
+from time import time
 from typing import Any, Dict, List, Optional
 
-import boto3
-from botocore.exceptions import BotoCoreError, ClientError
+import numpy as np
 
-from src.common.dynamodb import list_incidents
+from src.common.features import IncidentFeatures
+from src.common.frame import top_k_counts
+from src.common.inference import score_instances
 from src.common.response import json_response
+from src.common.rollups import load_features
 from src.common.security import AuthError, get_authenticated_claims
+from src.common.time_range import SECONDS_PER_DAY, resolve_time_range
 
-_runtime = boto3.client("sagemaker-runtime")
+DAY_NAMES = ["Monday", "Tuesday", "Wednesday",
+             "Thursday", "Friday", "Saturday", "Sunday"]
+# Candidatos por eje cuando no se fija un objetivo (5 x 3 x 3 instancias)
+CANDIDATE_LOCATIONS = 5
+CANDIDATE_HOURS = 3
+CANDIDATE_DAYS = 3
 
 
 def handler(event: Dict[str, Any], _) -> Dict[str, Any]:
@@ -25,50 +32,58 @@ def handler(event: Dict[str, Any], _) -> Dict[str, Any]:
     except json.JSONDecodeError:
         return json_response(400, {"message": "Body must be JSON"})
 
+    try:
+        response_body = compute_predictions(payload)
+    except ValueError as exc:
+        return json_response(400, {"message": str(exc)})
+    return json_response(200, response_body)
+
+
+def compute_predictions(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Calcula el análisis predictivo (también usado por los jobs asíncronos).
+    Lanza ValueError si los parámetros son inválidos.
+    """
     # comprehensive, zones, times, trends
     analysis_type = payload.get("analysisType", "comprehensive")
-    days_back = int(payload.get("daysBack", 90))
+    start, end = resolve_time_range(payload, default_days_back=90)
     target_location = (payload.get("location") or "").strip()
     target_hour = payload.get("hour")
     target_day = payload.get("dayOfWeek")
 
     if target_hour is not None and not (0 <= int(target_hour) <= 23):
-        return json_response(400, {"message": "hour debe estar entre 0 y 23"})
+        raise ValueError("hour debe estar entre 0 y 23")
 
     if target_day is not None and not (0 <= int(target_day) <= 6):
-        return json_response(400, {"message": "dayOfWeek debe estar entre 0 (lunes) y 6 (domingo)"})
-
-    # Obtener incidentes y filtrar por rango de fechas
-    all_incidents = list_incidents()
-    cutoff_timestamp = int(
-        (datetime.now() - timedelta(days=days_back)).timestamp())
-    incidents = [
-        inc for inc in all_incidents
-        if int(inc.get("createdAt", 0)) >= cutoff_timestamp
-    ]
+        raise ValueError("dayOfWeek debe estar entre 0 (lunes) y 6 (domingo)")
+
+    # Features materializadas por día (incidentes crudos solo para los días
+    # aún no materializados); todos los análisis derivan de estos conteos
+    feature_counts, sources = load_features(start, end)
+    days_back = round(((end or time()) - start) / SECONDS_PER_DAY)
 
     # Construir estadísticas históricas
-    historical_stats = _build_historical_stats(incidents)
+    historical_stats = _build_historical_stats(feature_counts)
 
     # Análisis de zonas de riesgo
-    risk_zones = _analyze_risk_zones(incidents) if analysis_type in [
+    risk_zones = _analyze_risk_zones(feature_counts) if analysis_type in [
         "comprehensive", "zones"] else []
 
     # Análisis de horarios críticos
-    critical_times = _analyze_critical_times(incidents) if analysis_type in [
+    critical_times = _analyze_critical_times(feature_counts) if analysis_type in [
         "comprehensive", "times"] else {}
 
     # Análisis de tendencias de recurrencia
-    recurrence_trends = _analyze_recurrence(incidents) if analysis_type in [
+    recurrence_trends = _analyze_recurrence(feature_counts) if analysis_type in [
         "comprehensive", "trends"] else {}
 
     # Predicciones por ubicación
-    location_predictions = _predict_by_location(incidents) if analysis_type in [
+    location_predictions = _predict_by_location(feature_counts) if analysis_type in [
         "comprehensive", "zones"] else []
 
     # Generar recomendaciones
     recommendations = _generate_recommendations(
-        risk_zones, critical_times, incidents)
+        risk_zones, critical_times, feature_counts)
 
     features = {
         "targetLocation": target_location or None,
@@ -77,18 +92,20 @@ def handler(event: Dict[str, Any], _) -> Dict[str, Any]:
         "historicalStats": historical_stats,
     }
 
-    # Intentar usar SageMaker si está configurado
-    ml_prediction = _invoke_sagemaker(features)
+    # Intentar usar SageMaker si está configurado (una invocación para todas
+    # las combinaciones candidatas)
+    ml_prediction = _invoke_sagemaker(features, _candidate_instances(features))
     if ml_prediction is None:
         ml_prediction = _fallback_prediction(features)
 
     response_body = {
         "metadata": {
-            "analyzed_incidents": len(incidents),
+            "analyzed_incidents": feature_counts.total,
             "time_range_days": days_back,
             "generated_at": datetime.now().isoformat(),
-            "ml_model_used": bool(os.environ.get("SAGEMAKER_ENDPOINT_NAME")),
-            "analysis_type": analysis_type
+            "ml_model_used": ml_prediction.get("source") != "heuristic",
+            "analysis_type": analysis_type,
+            "sources": sources,
         },
         "predictions": ml_prediction,
         "risk_zones": risk_zones,
@@ -102,59 +119,66 @@ def handler(event: Dict[str, Any], _) -> Dict[str, Any]:
             "peakHours": historical_stats["countsByHour"][:5],
         },
     }
-    return json_response(200, response_body)
+    return response_body
+
 
+def _build_historical_stats(features: IncidentFeatures) -> Dict[str, List[Dict[str, Any]]]:
+    location_type = features.counts("location", "type")
+    type_labels = features.labels("type", "desconocido")
 
-def _build_historical_stats(incidents: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
-    type_counter = Counter()
-    location_counter = Counter()
-    hour_counter = Counter()
-    day_counter = Counter()
-    location_type_counter = defaultdict(Counter)
-
-    for incident in incidents:
-        incident_type = incident.get("type", "desconocido")
-        location = incident.get("location", "sin_ubicacion")
-        timestamp = incident.get("createdAt") or incident.get("updatedAt")
-        if timestamp:
-            dt = datetime.fromtimestamp(int(timestamp), tz=timezone.utc)
-            hour_counter[dt.hour] += 1
-            day_counter[dt.weekday()] += 1
-        type_counter[incident_type] += 1
-        location_counter[location] += 1
-        location_type_counter[location][incident_type] += 1
-
-    def _format_counter(counter: Counter, key_name: str) -> List[Dict[str, Any]]:
-        return [{key_name: key, "count": count} for key, count in counter.most_common()]
+    def _format_counts(pairs, key_name: str) -> List[Dict[str, Any]]:
+        return [{key_name: key, "count": count} for key, count in pairs]
 
     return {
-        "countsByType": _format_counter(type_counter, "type"),
-        "countsByLocation": _format_counter(location_counter, "location"),
-        "countsByHour": [{"hour": hour, "count": count} for hour, count in hour_counter.most_common()],
-        "countsByDayOfWeek": [{"day": day, "count": count} for day, count in day_counter.most_common()],
+        "countsByType": _format_counts(
+            top_k_counts(location_type.sum(axis=0), type_labels), "type"),
+        "countsByLocation": _format_counts(
+            top_k_counts(location_type.sum(axis=1), features.labels("location", "sin_ubicacion")),
+            "location"),
+        "countsByHour": _format_counts(
+            top_k_counts(features.counts("hour"), list(range(24))), "hour"),
+        "countsByDayOfWeek": _format_counts(
+            top_k_counts(features.counts("weekday"), list(range(7))), "day"),
         "countsByLocationAndType": [
             {"location": location,
-                "topTypes": _format_counter(counter, "type")}
-            for location, counter in location_type_counter.items()
+                "topTypes": _format_counts(top_k_counts(location_type[code], type_labels), "type")}
+            for code, location in enumerate(features.labels("location", "sin_ubicacion"))
+            if location_type[code].any()
         ],
     }
 
 
-def _invoke_sagemaker(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-    endpoint = os.environ.get("SAGEMAKER_ENDPOINT_NAME")
-    if not endpoint:
-        return None
-    try:
-        response = _runtime.invoke_endpoint(
-            EndpointName=endpoint,
-            ContentType="application/json",
-            Body=json.dumps(payload).encode("utf-8"),
-        )
-        raw = response["Body"].read()
-        text = raw.decode("utf-8")
-        return json.loads(text)
-    except (BotoCoreError, ClientError, ValueError, json.JSONDecodeError):
+def _candidate_instances(features: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Combinaciones (ubicación, hora, día) a evaluar: el objetivo o los más frecuentes"""
+    stats = features["historicalStats"]
+
+    def _axis(target: Any, counts: List[Dict[str, Any]], key: str, limit: int) -> List[Any]:
+        return [target] if target is not None else [item[key] for item in counts[:limit]]
+
+    locations = _axis(features.get("targetLocation"), stats["countsByLocation"],
+                      "location", CANDIDATE_LOCATIONS)
+    hours = _axis(features.get("targetHour"), stats["countsByHour"], "hour", CANDIDATE_HOURS)
+    days = _axis(features.get("targetDayOfWeek"), stats["countsByDayOfWeek"],
+                 "day", CANDIDATE_DAYS)
+    return [
+        {"location": location, "hour": int(hour), "dayOfWeek": int(day)}
+        for location in locations for hour in hours for day in days
+    ]
+
+
+def _invoke_sagemaker(features: Dict[str, Any], instances: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    result = score_instances(features, instances)
+    if result is None:
         return None
+    predictions = result.pop("predictions")
+    return {
+        **result,
+        "scores": [
+            {**instance, **(prediction if isinstance(prediction, dict) else {"score": prediction})}
+            for instance, prediction in zip(instances, predictions)
+        ],
+        "source": result.get("source", "sagemaker"),
+    }
 
 
 def _fallback_prediction(features: Dict[str, Any]) -> Dict[str, Any]:
@@ -186,108 +210,81 @@ def _fallback_prediction(features: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
-def _analyze_risk_zones(incidents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def _most_common_by_row(table: np.ndarray, labels: List[Any]) -> List[Any]:
+    """Etiqueta más frecuente de cada fila de una tabla de contingencia"""
+    return [labels[int(code)] for code in table.argmax(axis=1)]
+
+
+def _analyze_risk_zones(features: IncidentFeatures) -> List[Dict[str, Any]]:
     """Identifica zonas de alto riesgo basándose en frecuencia y severidad"""
-    location_stats = defaultdict(lambda: {
-        "incident_count": 0,
-        "high_urgency_count": 0,
-        "high_priority_count": 0,
-        "unresolved_count": 0,
-        "incident_types": Counter()
-    })
-
-    for incident in incidents:
-        location = incident.get("location", "Desconocido")
-        urgency = incident.get("urgency", "baja")
-        priority = incident.get("priority", "baja")
-        status = incident.get("status", "pendiente")
-        inc_type = incident.get("type", "otro")
-
-        location_stats[location]["incident_count"] += 1
-        location_stats[location]["incident_types"][inc_type] += 1
-
-        if urgency == "alta":
-            location_stats[location]["high_urgency_count"] += 1
-        if priority == "alta":
-            location_stats[location]["high_priority_count"] += 1
-        if status != "resuelto":
-            location_stats[location]["unresolved_count"] += 1
+    location_type = features.counts("location", "type")
+    incident_count = location_type.sum(axis=1)
+    high_urgency = features.counts("location", where="high_urgency")
+    high_priority = features.counts("location", where="high_priority")
+    unresolved = features.counts("location", where="unresolved")
+    most_common = _most_common_by_row(location_type, features.labels("type", "otro"))
+
+    risk_score = (
+        incident_count * 1.0 +
+        high_urgency * 2.0 +
+        high_priority * 1.5 +
+        unresolved * 1.2
+    )
+    max_score = max(1, features.total * 2)
+    normalized = np.minimum(100, (risk_score / max_score) * 100)
 
+    locations = features.labels("location", "Desconocido")
     risk_zones = []
-    for location, stats in location_stats.items():
-        risk_score = (
-            stats["incident_count"] * 1.0 +
-            stats["high_urgency_count"] * 2.0 +
-            stats["high_priority_count"] * 1.5 +
-            stats["unresolved_count"] * 1.2
-        )
-        max_score = max(1, len(incidents) * 2)
-        normalized_score = min(100, (risk_score / max_score) * 100)
-
+    for code in np.argsort(-normalized, kind="stable"):
+        if incident_count[code] == 0:
+            continue
+        normalized_score = float(normalized[code])
         risk_level = "critical" if normalized_score >= 70 else \
                      "high" if normalized_score >= 50 else \
                      "medium" if normalized_score >= 30 else "low"
 
-        most_common_type = stats["incident_types"].most_common(
-            1)[0] if stats["incident_types"] else ("otro", 0)
-
         risk_zones.append({
-            "location": location,
+            "location": locations[code],
             "risk_score": round(normalized_score, 2),
             "risk_level": risk_level,
-            "total_incidents": stats["incident_count"],
-            "high_urgency_incidents": stats["high_urgency_count"],
-            "high_priority_incidents": stats["high_priority_count"],
-            "unresolved_incidents": stats["unresolved_count"],
-            "most_common_incident": most_common_type[0],
-            "prediction": f"Se esperan ~{round(stats['incident_count'] / 3)} incidentes en los próximos 30 días"
+            "total_incidents": int(incident_count[code]),
+            "high_urgency_incidents": int(high_urgency[code]),
+            "high_priority_incidents": int(high_priority[code]),
+            "unresolved_incidents": int(unresolved[code]),
+            "most_common_incident": most_common[code],
+            "prediction": f"Se esperan ~{round(int(incident_count[code]) / 3)} incidentes en los próximos 30 días"
         })
+        if len(risk_zones) == 10:
+            break
 
-    risk_zones.sort(key=lambda x: x["risk_score"], reverse=True)
-    return risk_zones[:10]
+    return risk_zones
 
 
-def _analyze_critical_times(incidents: List[Dict[str, Any]]) -> Dict[str, Any]:
+def _analyze_critical_times(features: IncidentFeatures) -> Dict[str, Any]:
     """Identifica horarios críticos para incidentes"""
-    hour_stats = defaultdict(lambda: {"count": 0, "types": Counter()})
-    day_stats = defaultdict(lambda: {"count": 0, "types": Counter()})
-
-    for incident in incidents:
-        timestamp = incident.get("createdAt")
-        inc_type = incident.get("type", "otro")
-
-        if timestamp:
-            try:
-                dt = datetime.fromtimestamp(int(timestamp), tz=timezone.utc)
-                hour = dt.hour
-                day = dt.strftime("%A")
-
-                hour_stats[hour]["count"] += 1
-                hour_stats[hour]["types"][inc_type] += 1
-                day_stats[day]["count"] += 1
-                day_stats[day]["types"][inc_type] += 1
-            except:
-                continue
+    type_labels = features.labels("type", "otro")
+    hour_type = features.counts("hour", "type", where="timed")
+    day_type = features.counts("weekday", "type", where="timed")
+    hour_counts = hour_type.sum(axis=1)
+    day_counts = day_type.sum(axis=1)
+    hour_common = _most_common_by_row(hour_type, type_labels)
+    day_common = _most_common_by_row(day_type, type_labels)
 
     peak_hours = []
-    for hour, stats in sorted(hour_stats.items(), key=lambda x: x[1]["count"], reverse=True)[:5]:
-        most_common = stats["types"].most_common(
-            1)[0] if stats["types"] else ("otro", 0)
+    for hour, count in top_k_counts(hour_counts, list(range(24)), 5):
         peak_hours.append({
             "hour": f"{hour:02d}:00 - {hour:02d}:59",
-            "incident_count": stats["count"],
-            "most_common_type": most_common[0],
-            "risk_level": "high" if stats["count"] > len(incidents) / 24 * 1.5 else "medium"
+            "incident_count": count,
+            "most_common_type": hour_common[hour],
+            "risk_level": "high" if count > features.total / 24 * 1.5 else "medium"
         })
 
     critical_days = []
-    for day, stats in sorted(day_stats.items(), key=lambda x: x[1]["count"], reverse=True):
-        most_common = stats["types"].most_common(
-            1)[0] if stats["types"] else ("otro", 0)
+    for day, count in top_k_counts(day_counts, list(range(7))):
         critical_days.append({
-            "day": day,
-            "incident_count": stats["count"],
-            "most_common_type": most_common[0]
+            "day": DAY_NAMES[day],
+            "incident_count": count,
+            "most_common_type": day_common[day]
         })
 
     return {
@@ -297,29 +294,13 @@ def _analyze_critical_times(incidents: List[Dict[str, Any]]) -> Dict[str, Any]:
     }
 
 
-def _analyze_recurrence(incidents: List[Dict[str, Any]]) -> Dict[str, Any]:
+def _analyze_recurrence(features: IncidentFeatures) -> Dict[str, Any]:
     """Analiza tendencias de recurrencia de incidentes"""
-    weekly_stats = defaultdict(lambda: {"count": 0, "types": Counter()})
-
-    for incident in incidents:
-        timestamp = incident.get("createdAt")
-        inc_type = incident.get("type", "otro")
-
-        if timestamp:
-            try:
-                dt = datetime.fromtimestamp(int(timestamp), tz=timezone.utc)
-                week = dt.strftime("%Y-W%W")
-                weekly_stats[week]["count"] += 1
-                weekly_stats[week]["types"][inc_type] += 1
-            except:
-                continue
-
-    weeks = sorted(weekly_stats.keys())
-    if len(weeks) >= 2:
-        recent_avg = sum(weekly_stats[w]["count"]
-                         for w in weeks[-4:]) / min(4, len(weeks[-4:]))
-        older_avg = sum(weekly_stats[w]["count"]
-                        for w in weeks[:4]) / min(4, len(weeks[:4]))
+    _, week_counts = features.week_counts()
+
+    if len(week_counts) >= 2:
+        recent_avg = week_counts[-4:].sum() / min(4, len(week_counts[-4:]))
+        older_avg = week_counts[:4].sum() / min(4, len(week_counts[:4]))
 
         trend = "increasing" if recent_avg > older_avg * 1.1 else \
                 "decreasing" if recent_avg < older_avg * 0.9 else "stable"
@@ -330,37 +311,33 @@ def _analyze_recurrence(incidents: List[Dict[str, Any]]) -> Dict[str, Any]:
         trend_percentage = 0
         recent_avg = 0
 
-    all_types = Counter()
-    for stats in weekly_stats.values():
-        all_types.update(stats["types"])
-
     return {
         "overall_trend": trend,
-        "trend_percentage": round(trend_percentage, 2),
-        "avg_incidents_per_week": round(recent_avg, 2),
+        "trend_percentage": round(float(trend_percentage), 2),
+        "avg_incidents_per_week": round(float(recent_avg), 2),
         "most_recurrent_types": [
             {"type": t, "count": c}
-            for t, c in all_types.most_common(5)
+            for t, c in top_k_counts(
+                features.counts("type", where="timed"), features.labels("type", "otro"), 5)
         ],
         "prediction": f"Tendencia {trend} - Se espera un promedio de {round(recent_avg)} incidentes por semana"
     }
 
 
-def _predict_by_location(incidents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def _predict_by_location(features: IncidentFeatures) -> List[Dict[str, Any]]:
     """Predice tipos de incidentes más probables por ubicación"""
-    location_type_map = defaultdict(lambda: Counter())
-
-    for incident in incidents:
-        location = incident.get("location", "Desconocido")
-        inc_type = incident.get("type", "otro")
-        location_type_map[location][inc_type] += 1
+    location_type = features.counts("location", "type")
+    type_labels = features.labels("type", "otro")
 
     predictions = []
-    for location, type_counts in location_type_map.items():
-        total = sum(type_counts.values())
-        type_predictions = []
+    for code, location in enumerate(features.labels("location", "Desconocido")):
+        type_counts = location_type[code]
+        total = int(type_counts.sum())
+        if total == 0:
+            continue
 
-        for inc_type, count in type_counts.most_common(3):
+        type_predictions = []
+        for inc_type, count in top_k_counts(type_counts, type_labels, 3):
             probability = (count / total) * 100
             type_predictions.append({
                 "type": inc_type,
@@ -377,7 +354,7 @@ def _predict_by_location(incidents: List[Dict[str, Any]]) -> List[Dict[str, Any]
     return predictions
 
 
-def _generate_recommendations(risk_zones: List[Dict], critical_times: Dict, incidents: List[Dict]) -> List[Dict[str, str]]:
+def _generate_recommendations(risk_zones: List[Dict], critical_times: Dict, features: IncidentFeatures) -> List[Dict[str, str]]:
     """Genera recomendaciones basadas en análisis"""
     recommendations = []
 
@@ -401,9 +378,9 @@ def _generate_recommendations(risk_zones: List[Dict], critical_times: Dict, inci
             "action": "Programar rondas preventivas en este horario"
         })
 
-    type_counts = Counter(inc.get("type") for inc in incidents)
+    type_counts = top_k_counts(features.counts("type"), features.labels("type"), 1)
     if type_counts:
-        most_common = type_counts.most_common(1)[0]
+        most_common = type_counts[0]
         if most_common[0] in ["infraestructura", "mantenimiento"] and most_common[1] > 5:
             recommendations.append({
                 "priority": "medium",
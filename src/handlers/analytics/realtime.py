@@ -1,15 +1,19 @@
 """
 Handler para analíticas en tiempo real desde DynamoDB
 Solo accesible para rol 'autoridad'
-Calcula métricas instantáneas sin depender de Athena
+Calcula métricas instantáneas sin depender de Athena: combina los rollups
+diarios materializados con los incidentes aún no materializados (día en curso)
 """
-import json
-from datetime import datetime, timedelta
-from collections import defaultdict, Counter
-from decimal import Decimal
+from datetime import datetime
+
 from src.common.auth import authorize
-from src.common.response import json_response
-from src.common.dynamodb import list_all_incidents
+from src.common.dynamodb import get_data_version, get_sync_watermark
+from src.common.response import compute_etag, json_response, not_modified
+from src.common.rollups import ROLLUP_WATERMARK, DailyRollup, load_daily_rollups, merge_rollups
+from src.common.stats import CampusSketches, load_campus_sketches, staff_workload
+from src.common.time_range import SECONDS_PER_DAY, history_start, resolve_time_range
+
+URGENCY_ORDER = {"critica": 0, "alta": 1, "media": 2, "baja": 3}
 
 
 @authorize(["autoridad"])
@@ -17,158 +21,123 @@ def handler(event, context):
     """
     Retorna métricas calculadas en tiempo real desde DynamoDB
     GET /analytics/realtime
+    Query params opcionales: ?from=YYYY-MM-DD&to=YYYY-MM-DD o ?daysBack=30
     """
+    params = event.get("queryStringParameters") or {}
     try:
-        # Obtener todos los incidentes
-        incidents = list_all_incidents()
-
-        # Inicializar contadores
-        by_type = Counter()
-        by_status = Counter()
-        by_urgency = Counter()
-        by_location = Counter()
-        by_reporter = Counter()
-        by_day = defaultdict(int)
-
-        staff_workload = defaultdict(lambda: {
-            "assigned_incidents": 0,
-            "resolved": 0,
-            "in_progress": 0,
-            "pending": 0
-        })
-
-        significance_by_type = defaultdict(lambda: {
-            "total_incidents": 0,
-            "total_significance": 0,
-            "max_significance": 0
-        })
+        start, end = resolve_time_range(params)
+    except ValueError as exc:
+        return json_response(400, {"error": str(exc)})
 
-        # Procesar cada incidente
-        for incident in incidents:
-            # Por tipo
-            incident_type = incident.get("type", "unknown")
-            by_type[incident_type] += 1
-
-            # Por estado
-            status = incident.get("status", "unknown")
-            by_status[status] += 1
-
-            # Por urgencia
-            urgency = incident.get("urgency", "unknown")
-            by_urgency[urgency] += 1
-
-            # Por ubicación
-            location = incident.get("location", "unknown")
-            by_location[location] += 1
-
-            # Por reportador
-            reporter = incident.get("reportedBy", "unknown")
-            by_reporter[reporter] += 1
-
-            # Por día (últimos 30 días)
-            created_at = incident.get("createdAt", "")
-            try:
-                dt = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
-                date_key = dt.strftime("%Y-%m-%d")
-                by_day[date_key] += 1
-            except:
-                pass
-
-            # Carga de trabajo del personal
-            assigned_to = incident.get("assignedTo")
-            if assigned_to:
-                staff_workload[assigned_to]["assigned_incidents"] += 1
-                if status == "resuelto":
-                    staff_workload[assigned_to]["resolved"] += 1
-                elif status == "en_atencion":
-                    staff_workload[assigned_to]["in_progress"] += 1
-                elif status == "pendiente":
-                    staff_workload[assigned_to]["pending"] += 1
-
-            # Tendencias de significancia
-            sig_count = incident.get("significanceCount", 0)
-            if isinstance(sig_count, Decimal):
-                sig_count = int(sig_count)
-
-            significance_by_type[incident_type]["total_incidents"] += 1
-            significance_by_type[incident_type]["total_significance"] += sig_count
-            if sig_count > significance_by_type[incident_type]["max_significance"]:
-                significance_by_type[incident_type]["max_significance"] = sig_count
-
-        # Formatear resultados
-        results = {
-            "incidents_by_type": [
-                {"type": k, "count": v}
-                for k, v in sorted(by_type.items(), key=lambda x: x[1], reverse=True)
-            ],
-            "incidents_by_status": [
-                {"status": k, "count": v}
-                for k, v in by_status.items()
-            ],
-            "incidents_by_urgency": [
-                {"urgency": k, "count": v}
-                for k, v in sorted(
-                    by_urgency.items(),
-                    key=lambda x: {"critica": 0, "alta": 1,
-                                   "media": 2, "baja": 3}.get(x[0], 4)
-                )
-            ],
-            "incidents_by_location": [
-                {"location": k, "count": v}
-                for k, v in sorted(by_location.items(), key=lambda x: x[1], reverse=True)[:10]
-            ],
-            "top_reporters": [
-                {"reportedBy": k, "incidents_count": v}
-                for k, v in sorted(by_reporter.items(), key=lambda x: x[1], reverse=True)[:10]
-            ],
-            "incidents_by_day": [
-                {"date": k, "count": v}
-                for k, v in sorted(by_day.items(), reverse=True)[:30]
-            ],
-            "staff_workload": [
-                {
-                    "assignedTo": k,
-                    "assigned_incidents": v["assigned_incidents"],
-                    "resolved": v["resolved"],
-                    "in_progress": v["in_progress"],
-                    "pending": v["pending"]
-                }
-                for k, v in sorted(
-                    staff_workload.items(),
-                    key=lambda x: x[1]["assigned_incidents"],
-                    reverse=True
-                )
-            ],
-            "significance_trends": [
-                {
-                    "type": k,
-                    "total_incidents": v["total_incidents"],
-                    "avg_significance": v["total_significance"] / v["total_incidents"] if v["total_incidents"] > 0 else 0,
-                    "max_significance": v["max_significance"]
-                }
-                for k, v in sorted(
-                    significance_by_type.items(),
-                    key=lambda x: x[1]["total_significance"] /
-                    x[1]["total_incidents"] if x[1]["total_incidents"] > 0 else 0,
-                    reverse=True
-                )
-            ]
-        }
-
-        # Metadata
-        metadata = {
-            "total_incidents": len(incidents),
-            "timestamp": datetime.utcnow().isoformat() + "Z",
-            "source": "DynamoDB (real-time)",
-            "latency_ms": 0  # En tiempo real
-        }
+    try:
+        # Si nada cambió desde la última consulta, evitar el cálculo completo
+        # (los rollups recalculados también cambian la respuesta)
+        etag = compute_etag("realtime", get_data_version(),
+                            get_sync_watermark(ROLLUP_WATERMARK), start, end)
+        cached = not_modified(event, etag)
+        if cached:
+            return cached
 
-        return json_response(200, {
-            "results": results,
-            "metadata": metadata
-        })
+        return json_response(200, build_realtime_analytics(start, end), etag=etag)
 
     except Exception as e:
         return json_response(500, {
             "error": f"Error al calcular analíticas: {str(e)}"
         })
+
+
+def build_realtime_analytics(start, end):
+    """Resultados y metadata del panel para [start, end) (también usado por los jobs)"""
+    range_start = start if start is not None else history_start()
+    daily, sources = load_daily_rollups(range_start, end)
+    totals = merge_rollups(daily.values())
+    results = compute_realtime_results(totals, daily)
+    results.update(compute_sketch_results(load_campus_sketches(range_start, end)))
+    # Carga actual del personal (contadores incrementales, no depende del rango)
+    results["staff_workload"] = staff_workload()
+
+    return {
+        "results": results,
+        "metadata": {
+            "total_incidents": totals.total,
+            "from": start,
+            "to": end,
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "source": "DynamoDB (rollups diarios + tiempo real)",
+            "sources": sources,
+            "latency_ms": 0  # En tiempo real
+        }
+    }
+
+
+def _ranked(counts):
+    """Pares (etiqueta, conteo) por conteo descendente"""
+    return sorted(counts.items(), key=lambda kv: kv[1], reverse=True)
+
+
+def compute_realtime_results(totals: DailyRollup, daily):
+    """Calcula las métricas del panel a partir de los rollups del rango"""
+    # Por urgencia (orden de severidad)
+    by_urgency = _ranked(totals.counts["urgency"])
+    by_urgency.sort(key=lambda x: URGENCY_ORDER.get(x[0], 4))
+
+    # Por día (últimos 30 días con actividad)
+    latest_days = sorted((day for day, rollup in daily.items() if rollup.total), reverse=True)[:30]
+
+    return {
+        "incidents_by_type": [
+            {"type": k, "count": v} for k, v in _ranked(totals.counts["type"])
+        ],
+        "incidents_by_status": [
+            {"status": k, "count": v} for k, v in _ranked(totals.counts["status"])
+        ],
+        "incidents_by_urgency": [
+            {"urgency": k, "count": v} for k, v in by_urgency
+        ],
+        "incidents_by_day": [
+            {
+                "date": datetime.utcfromtimestamp(day * SECONDS_PER_DAY).strftime("%Y-%m-%d"),
+                "count": daily[day].total,
+            }
+            for day in latest_days
+        ],
+        "significance_trends": significance_trends(totals),
+    }
+
+
+def compute_sketch_results(sketches: CampusSketches):
+    """Top-k y conteos distintos aproximados a partir de los sketches diarios"""
+    return {
+        "incidents_by_location": [
+            {"location": k, "count": v}
+            for k, v in sketches.top_locations.top(10)
+        ],
+        "top_reporters": [
+            {"reportedBy": k, "incidents_count": v}
+            for k, v in sketches.top_reporters.top(10)
+        ],
+        "distinct_reporters": sketches.reporters.count(),
+        "distinct_reporters_by_location": sorted(
+            (
+                {"location": location, "distinct_reporters": sketch.count()}
+                for location, sketch in sketches.reporters_by_location.items()
+            ),
+            key=lambda x: x["distinct_reporters"],
+            reverse=True,
+        ),
+    }
+
+
+def significance_trends(totals: DailyRollup):
+    """Promedio y máximo de significancia por tipo"""
+    trends = [
+        {
+            "type": label,
+            "total_incidents": totals.counts["type"].get(label, 0),
+            "avg_significance": total / max(1, totals.counts["type"].get(label, 0)),
+            "max_significance": maximum
+        }
+        for label, (total, maximum) in totals.significance.items()
+    ]
+    trends.sort(key=lambda x: x["avg_significance"], reverse=True)
+    return trends
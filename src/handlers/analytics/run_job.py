@@ -0,0 +1,63 @@
+"""
+Worker de jobs asíncronos de analítica (invocado por POST /analytics/jobs y
+POST /analytics/export)
+Corre fuera del request HTTP con un timeout largo.
+"""
+from src.common.jobs import complete_job, fail_job, job_params, report_progress, start_job
+from src.common.time_range import resolve_time_range
+from src.handlers.analytics.export import run_export
+from src.handlers.analytics.get_analytics import run_analytics
+from src.handlers.analytics.predict import compute_predictions
+from src.handlers.analytics.realtime import build_realtime_analytics
+
+# Margen para guardar el resultado antes de que expire la Lambda
+RESULT_MARGIN_SECONDS = 30
+
+
+def _run_athena(params, context, progress):
+    timeout = max(1.0, context.get_remaining_time_in_millis() / 1000.0 - RESULT_MARGIN_SECONDS)
+    return run_analytics(params, timeout)
+
+
+def _run_predictions(params, context, progress):
+    return compute_predictions(params)
+
+
+def _run_rollup(params, context, progress):
+    start, end = resolve_time_range(params)
+    return build_realtime_analytics(start, end)
+
+
+def _run_export(params, context, progress):
+    return run_export(params, progress)
+
+
+ANALYSES = {
+    "athena": _run_athena,
+    "predictions": _run_predictions,
+    "rollup": _run_rollup,
+    "export": _run_export,
+}
+
+
+def handler(event, context):
+    job = start_job(event["jobId"])
+    if job is None:
+        print(f"Job {event['jobId']} inexistente o ya procesado")
+        return
+
+    try:
+        result = ANALYSES[job["analysis"]](
+            job_params(job), context, lambda progress: report_progress(job, progress))
+    except Exception as exc:
+        print(f"Error en job {job['jobId']}: {exc}")
+        fail_job(job, str(exc))
+        return
+
+    # Las exportaciones guardan la clave del archivo para generar URLs nuevas
+    attributes = {"exportKey": result["exportKey"]} if "exportKey" in result else None
+    try:
+        complete_job(job, result, attributes)
+    except Exception as exc:
+        print(f"Error guardando resultado del job {job['jobId']}: {exc}")
+        fail_job(job, f"Error guardando resultado: {exc}")
@@ -0,0 +1,45 @@
+"""
+Handler para métricas de SLA: tiempo hasta asignación (MTTA) y hasta
+resolución (MTTR) con percentiles p50/p90/p99
+Solo accesible para rol 'autoridad'
+"""
+from datetime import datetime
+
+from src.common.auth import authorize
+from src.common.response import json_response
+from src.common.stats import LATENCY_STAT_KEYS, load_latency_digests, summarize_latency
+from src.common.time_range import resolve_time_range
+
+DEFAULT_WINDOW_DAYS = 30
+
+
+@authorize(["autoridad"])
+def handler(event, context):
+    """
+    Retorna percentiles de latencia por tipo, urgencia, ubicación y personal
+    GET /analytics/sla?daysBack=30 (o ?from=YYYY-MM-DD&to=YYYY-MM-DD)
+    """
+    params = event.get("queryStringParameters") or {}
+    try:
+        start, end = resolve_time_range(params, default_days_back=DEFAULT_WINDOW_DAYS)
+    except ValueError as exc:
+        return json_response(400, {"error": str(exc)})
+
+    try:
+        metrics = {
+            metric: summarize_latency(load_latency_digests(metric, start, end))
+            for metric in LATENCY_STAT_KEYS
+        }
+        return json_response(200, {
+            "metrics": metrics,
+            "metadata": {
+                "from": start,
+                "to": end,
+                "timestamp": datetime.utcnow().isoformat() + "Z",
+                "source": "t-digest diarios (DynamoDB)"
+            }
+        })
+    except Exception as e:
+        return json_response(500, {
+            "error": f"Error al calcular métricas de SLA: {str(e)}"
+        })
@@ -1,93 +1,157 @@
 """
 Handler para sincronizar incidentes de DynamoDB a S3 para análisis con Athena
-Se ejecuta cada hora automáticamente
+Se ejecuta cada hora automáticamente.
+
+La sincronización es incremental: solo se reescriben las particiones diarias
+(por ``createdAt``) de los incidentes modificados desde la última ejecución
+(``updatedAt`` >= watermark). La primera ejecución o ``{"full": true}``
+reconstruye todas las particiones y elimina los ``data.json`` heredados de la
+sincronización anterior a Parquet (que los ubicaba por fecha de sincronización,
+no de creación) en cualquier partición.
 """
 import os
 import json
-from datetime import datetime
-from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from time import time
 import boto3
-from src.common.dynamodb import list_all_incidents
+from src.common.dynamodb import (
+    SECONDS_PER_DAY,
+    created_days_updated_between,
+    get_sync_watermark,
+    list_all_incidents,
+    list_incidents_between,
+    publish_dataset_version,
+    set_sync_watermark,
+)
+from src.common.frame import to_epoch
+from src.common.parquet import incidents_to_parquet
 
 
 s3_client = boto3.client("s3")
 
-
-class DecimalEncoder(json.JSONEncoder):
-    """Encoder personalizado para Decimal"""
-
-    def default(self, obj):
-        if isinstance(obj, Decimal):
-            return int(obj) if obj % 1 == 0 else float(obj)
-        if isinstance(obj, set):
-            return list(obj)
-        return super(DecimalEncoder, self).default(obj)
+UPLOAD_WORKERS = 8
+INCIDENTS_PREFIX = "incidents/"
+LEGACY_DATA_FILE = "data.json"
+# Máximo de claves por delete_objects
+DELETE_BATCH_SIZE = 1000
+# Margen para no perder escrituras que estaban en curso al fijar el watermark
+WATERMARK_OVERLAP_SECONDS = 60
+
+
+def _partition_prefix(day: int) -> str:
+    """Prefijo S3 de la partición de un día (días desde epoch, UTC)"""
+    dt = datetime.fromtimestamp(day * SECONDS_PER_DAY, tz=timezone.utc)
+    return f"incidents/year={dt.year}/month={dt.month:02d}/day={dt.day:02d}"
+
+
+def _upload_partition(bucket_name: str, day: int, incidents) -> int:
+    # Convertir a Parquet (columnas tipadas y comprimidas)
+    body = incidents_to_parquet(incidents)
+    prefix = _partition_prefix(day)
+
+    s3_client.put_object(
+        Bucket=bucket_name,
+        Key=f"{prefix}/data.parquet",
+        Body=body,
+        ContentType='application/vnd.apache.parquet'
+    )
+    # El JSON Lines anterior ya no es legible con el SerDe de Parquet
+    s3_client.delete_object(Bucket=bucket_name, Key=f"{prefix}/{LEGACY_DATA_FILE}")
+    return len(incidents)
+
+
+def _delete_legacy_json(bucket_name: str) -> int:
+    """Elimina todos los ``incidents/**/data.json`` (migración a Parquet)"""
+    paginator = s3_client.get_paginator("list_objects_v2")
+    keys = [
+        obj["Key"]
+        for page in paginator.paginate(Bucket=bucket_name, Prefix=INCIDENTS_PREFIX)
+        for obj in page.get("Contents", [])
+        if obj["Key"].endswith(f"/{LEGACY_DATA_FILE}")
+    ]
+    for offset in range(0, len(keys), DELETE_BATCH_SIZE):
+        response = s3_client.delete_objects(
+            Bucket=bucket_name,
+            Delete={
+                "Objects": [{"Key": key} for key in keys[offset:offset + DELETE_BATCH_SIZE]],
+                "Quiet": True,
+            },
+        )
+        for error in response.get("Errors", []):
+            print(f"Error eliminando {error.get('Key')}: {error.get('Message')}")
+    return len(keys)
+
+
+def _rebuild_day(bucket_name: str, day: int) -> int:
+    """Reescribe una partición completa leyendo el día desde createdDay-index"""
+    start = day * SECONDS_PER_DAY
+    incidents = list(list_incidents_between(start, start + SECONDS_PER_DAY))
+    return _upload_partition(bucket_name, day, incidents)
 
 
 def handler(event, context):
     """
-    Sincroniza todos los incidentes de DynamoDB a S3 particionados por fecha
+    Sincroniza los incidentes de DynamoDB a S3 particionados por fecha
     """
     bucket_name = os.environ["ANALYTICS_DATA_BUCKET"]
+    event = event or {}
 
     try:
-        # Obtener todos los incidentes
-        incidents = list_all_incidents()
-
-        # Agrupar por fecha para particionar
-        partitions = {}
-        for incident in incidents:
-            # Parsear fecha de creación
-            created_at = incident.get("createdAt", "")
-            try:
-                dt = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
-                year = dt.year
-                month = dt.month
-                day = dt.day
-            except:
-                # Si no se puede parsear, usar fecha actual
-                now = datetime.utcnow()
-                year = now.year
-                month = now.month
-                day = now.day
-
-            # Crear clave de partición (NO agregar year/month/day al incidente)
-            partition_key = f"{year}/{month:02d}/{day:02d}"
-            if partition_key not in partitions:
-                partitions[partition_key] = []
-
-            partitions[partition_key].append(incident)
-
-        # Subir cada partición a S3
-        uploaded_count = 0
-        for partition_key, partition_incidents in partitions.items():
-            # Convertir a JSON Lines (cada línea es un JSON)
-            json_lines = "\n".join([
-                json.dumps(incident, cls=DecimalEncoder)
-                for incident in partition_incidents
-            ])
-
-            # Subir a S3
-            s3_key = f"incidents/year={partition_key.split('/')[0]}/month={partition_key.split('/')[1]}/day={partition_key.split('/')[2]}/data.json"
-
-            s3_client.put_object(
-                Bucket=bucket_name,
-                Key=s3_key,
-                Body=json_lines.encode('utf-8'),
-                ContentType='application/json'
-            )
-
-            uploaded_count += len(partition_incidents)
+        started_at = int(time())
+        watermark = get_sync_watermark()
+        full = bool(event.get("full")) or watermark == 0
+        skipped = 0
+        legacy_deleted = 0
+
+        with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor:
+            if full:
+                # Agrupar todos los incidentes por día de creación
+                partitions = {}
+                for incident in list_all_incidents():
+                    created_at = to_epoch(incident.get("createdAt"))
+                    if not created_at:
+                        skipped += 1
+                        continue
+                    partitions.setdefault(created_at // SECONDS_PER_DAY, []).append(incident)
+                days = sorted(partitions)
+                counts = executor.map(
+                    lambda day: _upload_partition(bucket_name, day, partitions[day]),
+                    days,
+                )
+            else:
+                # Solo los días de creación de los incidentes modificados
+                days = created_days_updated_between(
+                    watermark - WATERMARK_OVERLAP_SECONDS, started_at + 1)
+                counts = executor.map(lambda day: _rebuild_day(bucket_name, day), days)
+            uploaded_count = sum(counts)
+
+        # También los días sin incidentes creados, que no se reescriben
+        if full:
+            legacy_deleted = _delete_legacy_json(bucket_name)
+
+        set_sync_watermark(started_at)
+
+        # Nueva versión del dataset: invalida los resultados de Athena cacheados
+        dataset_version = None
+        if days:
+            dataset_version = publish_dataset_version(uploaded_count)
 
         print(
-            f"Sincronizados {uploaded_count} incidentes en {len(partitions)} particiones")
+            f"Sincronizados {uploaded_count} incidentes en {len(days)} particiones "
+            f"({'completa' if full else 'incremental'}, dataset v{dataset_version}, "
+            f"{skipped} sin createdAt, {legacy_deleted} data.json heredados eliminados)")
 
         return {
             "statusCode": 200,
             "body": json.dumps({
                 "message": "Sincronización completada",
+                "mode": "full" if full else "incremental",
                 "incidentsCount": uploaded_count,
-                "partitionsCount": len(partitions)
+                "partitionsCount": len(days),
+                "datasetVersion": dataset_version,
+                "legacyFilesDeleted": legacy_deleted,
+                "watermark": started_at
             })
         }
 
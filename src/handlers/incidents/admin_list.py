@@ -1,9 +1,9 @@
 from collections import Counter
 from typing import Any, Dict, List, Optional
 
-from src.common.dynamodb import list_incidents
+from src.common.dynamodb import get_data_version, list_incidents
 from src.common.incidents import normalize_priority, normalize_status, normalize_urgency
-from src.common.response import json_response
+from src.common.response import compute_etag, json_response, not_modified
 from src.common.security import AuthError, get_authenticated_claims
 
 # Changed to None to get all incidents by default
@@ -24,6 +24,12 @@ def handler(event: Dict[str, Any], _) -> Dict[str, Any]:
     urgencies = _parse_list_param(params.get("urgency"), normalize_urgency)
     priorities = _parse_list_param(params.get("priority"), normalize_priority)
 
+    etag = compute_etag("admin-incidents", get_data_version(),
+                        statuses, urgencies, priorities)
+    cached = not_modified(event, etag)
+    if cached:
+        return cached
+
     incidents = list_incidents(statuses)
     incidents = _apply_filters(incidents, urgencies, priorities)
     incidents.sort(
@@ -50,6 +56,7 @@ def handler(event: Dict[str, Any], _) -> Dict[str, Any]:
             "stats": summary,
             "incidents": incidents,
         },
+        etag=etag,
     )
 
 
@@ -7,6 +7,7 @@ from datetime import datetime
 from src.common.auth import authorize
 from src.common.dynamodb import get_incident, update_incident, get_user
 from src.common.response import json_response
+from src.common.stats import record_assignment, record_workload_transition
 from src.common.websocket import broadcast_to_roles, notify_user
 
 
@@ -75,6 +76,13 @@ def handler(event, context):
         updated_incident = update_incident(incident_id, updates, history_entry)
         print(f"Incident updated successfully")
 
+        # Métrica de tiempo hasta la asignación (MTTA) y carga por personal
+        try:
+            record_assignment(incident, assigned_to, int(updated_incident["updatedAt"]))
+            record_workload_transition(incident, updated_incident)
+        except Exception as e:
+            print(f"Error registrando métricas de asignación: {e}")
+
         # Notificar al personal asignado vía WebSocket
         try:
             notify_user(assigned_to, "incident.assigned", {
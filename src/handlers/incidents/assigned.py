@@ -0,0 +1,66 @@
+import base64
+import json
+from typing import Any, Dict
+
+from src.common.dynamodb import list_incidents_assigned_to
+from src.common.incidents import normalize_status
+from src.common.response import json_response
+from src.common.security import AuthError, get_authenticated_claims
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+
+def handler(event: Dict[str, Any], _) -> Dict[str, Any]:
+    """
+    Lista paginada de incidentes asignados ("mis tareas")
+    GET /incidents/assigned?status=en_atencion&limit=25&nextToken=...
+    Las autoridades pueden consultar a otro miembro del personal con ?staff=
+    """
+    try:
+        claims = get_authenticated_claims(event, allowed_roles={"personal", "autoridad"})
+    except AuthError as exc:
+        return json_response(401, {"message": str(exc)})
+
+    qs = event.get("queryStringParameters") or {}
+    staff = claims["sub"]
+    if claims["role"] == "autoridad" and qs.get("staff"):
+        staff = qs["staff"].strip()
+
+    status = None
+    if qs.get("status"):
+        try:
+            status = normalize_status(qs["status"])
+        except ValueError as exc:
+            return json_response(400, {"message": str(exc)})
+
+    try:
+        limit = min(MAX_PAGE_SIZE, max(1, int(qs.get("limit") or DEFAULT_PAGE_SIZE)))
+    except ValueError:
+        return json_response(400, {"message": "limit debe ser un entero"})
+
+    start_key = None
+    if qs.get("nextToken"):
+        try:
+            start_key = json.loads(base64.urlsafe_b64decode(qs["nextToken"].encode("ascii")))
+        except ValueError:
+            return json_response(400, {"message": "nextToken inválido"})
+        if not isinstance(start_key, dict) or start_key.get("assignedTo") != staff:
+            return json_response(400, {"message": "nextToken inválido"})
+
+    incidents, last_key = list_incidents_assigned_to(staff, status, limit, start_key)
+    next_token = None
+    if last_key:
+        next_token = base64.urlsafe_b64encode(
+            json.dumps(last_key, separators=(",", ":")).encode("utf-8")).decode("ascii")
+
+    return json_response(
+        200,
+        {
+            "assignedTo": staff,
+            "status": status,
+            "incidents": incidents,
+            "count": len(incidents),
+            "nextToken": next_token,
+        },
+    )
@@ -5,6 +5,7 @@ from typing import Any, Dict
 from src.common.dynamodb import get_incident, update_incident
 from src.common.response import json_response
 from src.common.security import AuthError, get_authenticated_claims
+from src.common.stats import record_resolution, record_workload_transition
 from src.common.websocket import broadcast_to_roles, notify_user
 
 
@@ -38,11 +39,17 @@ def handler(event: Dict[str, Any], _) -> Dict[str, Any]:
     if note:
         history_entry["note"] = note
 
-    attributes = {"status": "resuelto", "closedAt": int(time())}
+    closed_at = int(time())
+    attributes = {"status": "resuelto", "closedAt": closed_at}
     if note:
         attributes["lastNote"] = note
 
     updated_incident = update_incident(incident_id, attributes, history_entry)
+    try:
+        record_resolution(incident, closed_at)
+        record_workload_transition(incident, updated_incident)
+    except Exception as exc:
+        print(f"Error registrando métricas de resolución: {exc}")
     broadcast_to_roles({"personal", "autoridad"}, "incident.closed", {"incident": updated_incident})
     reporter = updated_incident.get("reportedBy")
     if reporter:
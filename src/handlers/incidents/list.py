@@ -1,8 +1,8 @@
 from typing import Any, Dict
 
-from src.common.dynamodb import list_incidents
+from src.common.dynamodb import get_data_version, list_incidents
 from src.common.incidents import normalize_status
-from src.common.response import json_response
+from src.common.response import compute_etag, json_response, not_modified
 from src.common.security import AuthError, get_authenticated_claims
 
 
@@ -20,8 +20,14 @@ def handler(event: Dict[str, Any], _) -> Dict[str, Any]:
         except ValueError as exc:
             return json_response(400, {"message": str(exc)})
 
+    owner = claims["sub"] if claims["role"] == "estudiante" else None
+    etag = compute_etag("incidents", get_data_version(), owner, status_filter)
+    cached = not_modified(event, etag)
+    if cached:
+        return cached
+
     incidents = list_incidents([status_filter] if status_filter else None)
-    if claims["role"] == "estudiante":
-        incidents = [item for item in incidents if item.get("reportedBy") == claims["sub"]]
+    if owner:
+        incidents = [item for item in incidents if item.get("reportedBy") == owner]
 
-    return json_response(200, {"incidents": incidents})
+    return json_response(200, {"incidents": incidents}, etag=etag)
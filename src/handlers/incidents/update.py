@@ -6,6 +6,7 @@ from src.common.dynamodb import get_incident, update_incident
 from src.common.incidents import normalize_status
 from src.common.response import json_response
 from src.common.security import AuthError, get_authenticated_claims
+from src.common.stats import record_resolution, record_workload_transition
 from src.common.websocket import broadcast_to_roles, notify_user
 
 
@@ -52,6 +53,12 @@ def handler(event: Dict[str, Any], _) -> Dict[str, Any]:
         attributes["lastNote"] = note
 
     updated_incident = update_incident(incident_id, attributes, history_entry)
+    try:
+        if status == "resuelto":
+            record_resolution(incident, int(updated_incident["updatedAt"]))
+        record_workload_transition(incident, updated_incident)
+    except Exception as exc:
+        print(f"Error registrando métricas del incidente: {exc}")
 
     broadcast_to_roles({"personal", "autoridad"}, "incident.updated", {"incident": updated_incident})
     reporter = updated_incident.get("reportedBy")